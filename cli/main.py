@@ -5,6 +5,10 @@ cli/main.py — lyra コマンドラインインターフェース
   lyra run --ref reference.wav --vocal new_vocal.wav
   lyra run --ref reference.wav --vocal new_vocal.wav --stem --preset light
   lyra run --ref reference.wav --vocal new_vocal.wav --key-shift -2
+  lyra batch --ref reference.wav --takes takes/ --out-dir edited
+  lyra warmup
+  lyra serve --workers 2
+  lyra submit run --ref reference.wav --vocal new_vocal.wav
 """
 
 from __future__ import annotations
@@ -13,6 +17,9 @@ import argparse
 import sys
 import time
 from pathlib import Path
+from typing import Callable
+
+_START = time.perf_counter()   # 起動時間の計測起点（cli.main の import 時点）
 
 
 # ---- プリセット定義 -------------------------------------------------------
@@ -22,18 +29,32 @@ PRESETS = {
         "confidence_low": 0.6,
         "confidence_high": 0.9,
         "band_radius": 0.08,
+        "align_mode": "band",
+        "separation": "standard",
     },
     "standard": {
         "description": "標準 — バランス重視",
         "confidence_low": 0.5,
         "confidence_high": 0.8,
         "band_radius": 0.10,
+        "align_mode": "band",
+        "separation": "standard",
     },
     "strong": {
         "description": "強め — リファレンスへの追従を最大化",
         "confidence_low": 0.4,
         "confidence_high": 0.7,
         "band_radius": 0.12,
+        "align_mode": "band",
+        "separation": "standard",
+    },
+    "long": {
+        "description": "長尺 — 10分を超えるライブテイク向け（マルチスケール DTW）",
+        "confidence_low": 0.5,
+        "confidence_high": 0.8,
+        "band_radius": 0.10,
+        "align_mode": "multiscale",
+        "separation": "fast",
     },
 }
 
@@ -50,6 +71,10 @@ def build_parser() -> argparse.ArgumentParser:
   lyra run --ref mix.wav --vocal vocal.wav
   lyra run --ref stem.wav --vocal vocal.wav --stem
   lyra run --ref mix.wav --vocal vocal.wav --preset strong --key-shift -2
+  lyra batch --ref mix.wav --takes takes/ --out-dir edited --jobs 4
+  lyra warmup --stem
+  lyra serve --workers 4 &
+  lyra submit run --ref mix.wav --vocal vocal.wav
         """,
     )
 
@@ -65,51 +90,205 @@ def build_parser() -> argparse.ArgumentParser:
                      help="出力 WAV パス（デフォルト: edited_vocal.wav）")
     run.add_argument("--out-recipe", default="recipe.json", metavar="FILE",
                      help="出力 recipe.json パス（デフォルト: recipe.json）")
-    run.add_argument("--stem", action="store_true",
-                     help="リファレンスを Vocal Stem として扱う（分離をスキップ）")
-    run.add_argument("--preset", choices=list(PRESETS.keys()), default="standard",
-                     help="補正強度プリセット（デフォルト: standard）")
-    run.add_argument("--key-shift", type=float, default=None, metavar="SEMITONES",
-                     help="キーシフト量（セミトーン）。省略時は自動推定")
+    _add_edit_options(run)
+    run.add_argument("--jobs", type=int, default=1, metavar="N",
+                     help="セグメントレンダリングの並列プロセス数。0 で CPU コア数"
+                          "（デフォルト: 1）")
+
+    # batch サブコマンド
+    batch = sub.add_parser("batch", help="1 つのリファレンスで複数テイクをまとめて補正する")
+    batch.add_argument("--ref", required=True, metavar="FILE",
+                       help="リファレンス音源（2mix または Vocal Stem）")
+    batch.add_argument("--takes", required=True, nargs="+", metavar="PATH",
+                       help="補正するテイク。ファイル・ディレクトリ・glob パターンを複数指定可")
+    batch.add_argument("--out-dir", default="lyra_batch", metavar="DIR",
+                       help="出力ディレクトリ（デフォルト: lyra_batch）")
+    _add_edit_options(batch)
+    batch.add_argument("--jobs", type=int, default=1, metavar="N",
+                       help="並列に処理するテイク数。0 で CPU コア数（デフォルト: 1）")
+
+    # warmup サブコマンド
+    warmup = sub.add_parser("warmup", help="モデルを事前にロードして初回実行の待ち時間をなくす")
+    warmup.add_argument("--stem", action="store_true",
+                        help="Vocal Stem 用（Demucs をロードしない）")
+    warmup.add_argument("--sep-model", default="htdemucs", metavar="NAME",
+                        help="ロードする Demucs モデル名（デフォルト: htdemucs）")
+    _add_runtime_options(warmup)
+
+    # serve サブコマンド
+    serve = sub.add_parser("serve",
+                           help="モデルをロードしたまま常駐し、localhost でジョブを受け付ける")
+    serve.add_argument("--host", default="127.0.0.1", metavar="HOST",
+                       help="待ち受けるアドレス（デフォルト: 127.0.0.1）")
+    serve.add_argument("--port", type=int, default=8765, metavar="PORT",
+                       help="待ち受けるポート（デフォルト: 8765）")
+    serve.add_argument("--workers", type=int, default=1, metavar="N",
+                       help="同時に実行するジョブ数（デフォルト: 1）")
+    serve.add_argument("--stem", action="store_true",
+                       help="Demucs を事前ロードしない（分離が必要なジョブは初回にロードする）")
+    serve.add_argument("--sep-model", default="htdemucs", metavar="NAME",
+                       help="事前ロードする Demucs モデル名（デフォルト: htdemucs）")
+    _add_runtime_options(serve)
+
+    # submit サブコマンド
+    submit = sub.add_parser("submit", help="lyra serve にジョブを送信し、完了まで待つ")
+    submit.add_argument("--server", default="http://127.0.0.1:8765", metavar="URL",
+                        help="送信先のサーバー（デフォルト: http://127.0.0.1:8765）")
+    submit.add_argument("--no-wait", action="store_true",
+                        help="完了を待たずにジョブ ID を表示して終了する")
+    submit.add_argument("job", nargs=argparse.REMAINDER, metavar="{run,batch} ...",
+                        help="lyra run / batch と同じ引数")
 
     return parser
 
 
+def _add_edit_options(p: argparse.ArgumentParser) -> None:
+    """run / batch 共通の補正・レンダリング・キャッシュオプション。"""
+    p.add_argument("--stem", action="store_true",
+                   help="リファレンスを Vocal Stem として扱う（分離をスキップ）")
+    p.add_argument("--preset", choices=list(PRESETS.keys()), default="standard",
+                   help="補正強度プリセット（デフォルト: standard）")
+    p.add_argument("--key-shift", type=float, default=None, metavar="SEMITONES",
+                   help="キーシフト量（セミトーン）。省略時は自動推定")
+    p.add_argument("--renderer", choices=["rubberband", "librosa"], default="rubberband",
+                   help="レンダリングバックエンド。librosa はプロセス内で処理し"
+                        " rubberband CLI を起動しない（デフォルト: rubberband）")
+    p.add_argument("--render-mode", choices=["segment", "continuous"], default="segment",
+                   help="segment: セグメントごとに伸縮して連結 / continuous: レシピ全体の"
+                        "ワープと時変ピッチを 1 パスで適用（デフォルト: segment）")
+    p.add_argument("--separation", choices=["fast", "standard", "high"], default=None,
+                   help="Demucs 分離プロファイル。fast は overlap を小さくしシフトなしで推論する"
+                        "（デフォルト: プリセットの設定）")
+    p.add_argument("--sep-model", default="htdemucs", metavar="NAME",
+                   help="Demucs モデル名。htdemucs_ft などのバッグはボーカル用のサブモデルだけで"
+                        "推論する（デフォルト: htdemucs）")
+    p.add_argument("--sep-segment", type=float, default=None, metavar="SEC",
+                   help="Demucs の 1 回の推論長（秒）。省略時はモデル既定")
+    p.add_argument("--sep-overlap", type=float, default=None, metavar="RATIO",
+                   help="Demucs のセグメント重なり率（0〜1）。省略時はプロファイルの値")
+    p.add_argument("--sep-shifts", type=int, default=None, metavar="N",
+                   help="Demucs のランダムシフト回数。省略時はプロファイルの値")
+    p.add_argument("--sep-no-split", action="store_true",
+                   help="Demucs で曲全体を 1 回で推論する（メモリを大きく使う）")
+    p.add_argument("--stream-separation", action="store_true",
+                   help="リファレンスを 1 分ずつ読み込んで分離し、ボーカルを"
+                        " <リファレンス名>.vocals.wav に逐次書き出す"
+                        "（長尺でもメモリ一定。解析キャッシュは使わない）")
+    p.add_argument("--sep-workers", type=int, default=0, metavar="N",
+                   help="CPU 分離時にセグメントを並列処理するスレッド数（デフォルト: 0 = 逐次）")
+    p.add_argument("--align-mode", choices=["band", "multiscale", "online"], default=None,
+                   help="アライメント方式。multiscale は粗密 2 段階以上の DTW で長尺向け、"
+                        "online は先頭から逐次追従するオンライン DTW"
+                        "（デフォルト: プリセットの設定）")
+    p.add_argument("--dtw-engine", choices=["native", "dtw-python"], default="native",
+                   help="DTW エンジン。native はバンド内だけを保持する（デフォルト: native）")
+    p.add_argument("--segmentation", choices=["fixed", "adaptive"], default="fixed",
+                   help="セグメント分割。adaptive は無声区間で区切ってパススルーにし、"
+                        "長いフレーズをオンセット位置で分割する（デフォルト: fixed）")
+    p.add_argument("--viterbi-f0", action="store_true",
+                   help="F0 のビンをフレームごとの argmax ではなく Viterbi 復号で決める"
+                        "（オクターブ跳びなどの単発の誤検出が減る）")
+    p.add_argument("--full-res-pitch", action="store_true",
+                   help="目標ピッチカーブを間引かず全フレーム分 recipe に保持する")
+    p.add_argument("--recipe-sidecar", action="store_true",
+                   help="recipe のカーブをバイナリサイドカー（<recipe名>.curves.npy）に書き出す")
+    p.add_argument("--no-cache", action="store_true",
+                   help="解析キャッシュ（分離・F0・オンセット）を使わずに毎回計算する")
+    p.add_argument("--clear-cache", action="store_true",
+                   help="実行前に解析キャッシュを削除する")
+    p.add_argument("--cache-dir", default=None, metavar="DIR",
+                   help="解析キャッシュの保存先"
+                        "（デフォルト: $LYRA_CACHE_DIR または ~/.cache/lyra/analysis）")
+    _add_runtime_options(p)
+
+
+def _add_runtime_options(p: argparse.ArgumentParser) -> None:
+    """run / batch / warmup 共通の推論ランタイムオプション（core.runtime）。"""
+    p.add_argument("--device", default="auto", metavar="DEVICE",
+                   help="推論デバイス（auto / cpu / cuda / cuda:N / mps）。"
+                        "auto は CUDA があれば CUDA（デフォルト: auto）")
+    p.add_argument("--threads", type=int, default=0, metavar="N",
+                   help="torch の intra-op スレッド数。ジョブごとのコア数を固定する"
+                        "（デフォルト: 0 = torch 既定）")
+    p.add_argument("--interop-threads", type=int, default=0, metavar="N",
+                   help="torch の inter-op スレッド数（デフォルト: 0 = torch 既定）")
+    p.add_argument("--precision", choices=["fp32", "bf16", "int8"], default="fp32",
+                   help="RMVPE の推論精度。bf16 は autocast、int8 は BiGRU / 全結合層の動的量子化"
+                        "（CPU のみ）（デフォルト: fp32）")
+    p.add_argument("--torchscript", action="store_true",
+                   help="RMVPE を TorchScript で推論する（事前に scripts/download_models.py"
+                        " --prepare が必要。--precision int8 では量子化版を使う）")
+    p.add_argument("--f0-batch-seconds", type=float, default=0.0, metavar="SEC",
+                   help="F0 のバッチ推論で 1 回の forward にまとめる音声の合計長（秒）。"
+                        "小さくするとメモリが減り、大きくすると forward 回数が減る"
+                        "（デフォルト: 0 = 32 秒のウィンドウ 8 本分）")
+
+
 def main() -> None:
     parser = build_parser()
     args = parser.parse_args()
 
+    if args.command == "submit":
+        from cli.server import submit
+        submit(args)
+        return
+
+    try:
+        _configure_runtime(args)
+    except ValueError as e:
+        parser.error(str(e))
+
     if args.command == "run":
         _cmd_run(args)
+    elif args.command == "batch":
+        _cmd_batch(args)
+    elif args.command == "warmup":
+        _cmd_warmup(args)
+    elif args.command == "serve":
+        from cli.server import serve
+        serve(args)
 
 
 # ---- run コマンド実装 -------------------------------------------------------
 
 def _cmd_run(args: argparse.Namespace) -> None:
-    from core.audio_io import load, save
-    from core.separation.demucs_wrapper import separate_vocal
-    from core.pitch.rmvpe_wrapper import estimate_f0
-    from core.onset.onset_detector import detect_onsets
-    from core.onset.voiced_detector import detect_voiced
-    from core.key_detector import detect_key_shift
-    from core.alignment.dtw_aligner import align
-    from core.recipe.generator import generate
-    from core.renderer.rubberband_renderer import render
+    # 各ステージのモジュールは使う直前に import する（--stem では demucs を import しない）
+    from core.analysis_cache import AnalysisCache
+    from core.recipe.schema import SIDECAR_SUFFIX
 
     preset = PRESETS[args.preset]
     TARGET_SR = 44100
-    out_files = [Path(args.out_wav), Path(args.out_recipe)]
+    out_recipe = Path(args.out_recipe)
+    out_files = [
+        Path(args.out_wav), out_recipe, out_recipe.with_name(out_recipe.stem + SIDECAR_SUFFIX),
+    ]
 
     _print_header(args, preset)
 
+    # torch の import とモデルのロードを音声の読み込みと並行して進める
+    preloader = _start_preloader(args)
     total_start = time.perf_counter()
+    startup = total_start - getattr(args, "started", _START)   # lyra serve のジョブは開始時点から
+
+    cache = None if args.no_cache else AnalysisCache(args.cache_dir)
+    if args.clear_cache:
+        (cache or AnalysisCache(args.cache_dir)).clear()
 
     try:
         # --- Step 1: 読み込み ---
+        from core.audio_io import duration, load, load_with_analysis, save
+
         _step(1, 7, "読み込み中")
-        ref_audio, _ = load(args.ref, target_sr=TARGET_SR)
-        new_audio, _ = load(args.vocal, target_sr=TARGET_SR)
-        ref_dur = len(ref_audio) / TARGET_SR
+        stream = args.stream_separation and not args.stem
+        # F0 解析用の 16kHz 信号は元ファイルから直接作る（44.1kHz を経由しない）
+        ref_audio = ref_16k = None
+        if args.stem:
+            ref_audio, ref_16k = load_with_analysis(args.ref, TARGET_SR)
+        elif not stream:
+            # ストリーミング分離ではリファレンス全体をメモリに読み込まない
+            ref_audio, _ = load(args.ref, target_sr=TARGET_SR)
+        new_audio, new_16k = load_with_analysis(args.vocal, TARGET_SR)
+        ref_dur = duration(args.ref)
         new_dur = len(new_audio) / TARGET_SR
         _info(f"リファレンス: {ref_dur:.1f}s  新規ボーカル: {new_dur:.1f}s")
 
@@ -117,26 +296,44 @@ def _cmd_run(args: argparse.Namespace) -> None:
         if args.stem:
             _step(2, 7, "Stem 入力 — 分離をスキップ")
             ref_vocal = ref_audio
+        elif stream:
+            _step(2, 7, f"ボーカル分離中 (Demucs {args.sep_model}, ストリーミング)")
+            ref_vocal_path = Path(args.out_wav).with_name(f"{Path(args.ref).stem}.vocals.wav")
+            out_files.append(ref_vocal_path)
+            ref_vocal = _stream_separate(args, preset, ref_vocal_path, TARGET_SR)
         else:
-            _step(2, 7, "ボーカル分離中 (Demucs htdemucs)")
-            ref_vocal = separate_vocal(ref_audio, TARGET_SR)
+            from core.analysis_cache import cached_separate_vocal
+
+            _step(2, 7, f"ボーカル分離中 (Demucs {args.sep_model})")
+            ref_vocal = cached_separate_vocal(cache, ref_audio, TARGET_SR,
+                                              **_separation_kwargs(args, preset))
 
         # --- Step 3: F0 解析 ---
+        from core.analysis_cache import cached_estimate_f0_batch
+        from core.resample import ANALYSIS_SR, to_analysis
+
         _step(3, 7, "F0 解析中 (RMVPE)")
-        ref_f0, ref_times = estimate_f0(ref_vocal, TARGET_SR)
-        new_f0, new_times = estimate_f0(new_audio, TARGET_SR)
+        if ref_16k is None:
+            ref_16k = to_analysis(ref_vocal, TARGET_SR)
+        (ref_f0, ref_times), (new_f0, new_times) = cached_estimate_f0_batch(
+            cache, [ref_16k, new_16k], ANALYSIS_SR, use_viterbi=args.viterbi_f0,
+        )
         _info(
             f"有声フレーム — ref: {(ref_f0 > 0).sum()}  new: {(new_f0 > 0).sum()}"
         )
 
         # --- Step 4: オンセット・有声区間検出 ---
+        from core.analysis_cache import cached_detect_onsets, cached_detect_voiced
+
         _step(4, 7, "オンセット・有声区間検出中")
-        ref_onsets = detect_onsets(ref_vocal, TARGET_SR)
-        new_onsets = detect_onsets(new_audio, TARGET_SR)
-        voiced_mask = detect_voiced(new_audio, TARGET_SR)
+        ref_onsets = cached_detect_onsets(cache, ref_vocal, TARGET_SR)
+        new_onsets = cached_detect_onsets(cache, new_audio, TARGET_SR)
+        voiced_mask = cached_detect_voiced(cache, new_audio, TARGET_SR)
         _info(f"オンセット — ref: {len(ref_onsets)}点  new: {len(new_onsets)}点")
 
         # --- Step 5: キーシフト推定 ---
+        from core.key_detector import detect_key_shift
+
         _step(5, 7, "キーシフト推定中")
         if args.key_shift is not None:
             key_shift = float(args.key_shift)
@@ -146,14 +343,21 @@ def _cmd_run(args: argparse.Namespace) -> None:
             _info(f"自動推定: {key_shift:+.1f} semitones")
 
         # --- Step 6: アライメント ---
+        from core.alignment.dtw_aligner import align
+
         _step(6, 7, "DTW アライメント中")
         alignment = align(
             ref_f0=ref_f0, ref_times=ref_times, ref_onsets=ref_onsets,
             new_f0=new_f0, new_times=new_times, new_onsets=new_onsets,
             band_radius=preset["band_radius"],
+            engine=args.dtw_engine,
+            mode=args.align_mode or preset["align_mode"],
         )
 
         # --- Step 7: レンダリング ---
+        from core.recipe.generator import generate
+        from core.renderer.rubberband_renderer import render
+
         _step(7, 7, "レシピ生成・レンダリング中")
 
         recipe = generate(
@@ -166,19 +370,26 @@ def _cmd_run(args: argparse.Namespace) -> None:
             voiced_mask=voiced_mask,
             confidence_low=preset["confidence_low"],
             confidence_high=preset["confidence_high"],
+            full_resolution_pitch=args.full_res_pitch,
+            segmentation=args.segmentation, onsets=new_onsets,
         )
 
-        recipe.save(args.out_recipe)
+        recipe.save(args.out_recipe, sidecar=args.recipe_sidecar)
         _info(f"recipe.json → {args.out_recipe}")
 
         n_warn = len(recipe.warnings)
         if n_warn:
             _warn(f"低信頼区間: {n_warn} セグメント（warnings に記録済み）")
 
-        output = render(new_audio, TARGET_SR, recipe, new_f0=new_f0, new_times=new_times)
+        output = render(new_audio, TARGET_SR, recipe, new_f0=new_f0, new_times=new_times,
+                        backend=args.renderer, mode=args.render_mode, workers=args.jobs)
         save(args.out_wav, output, TARGET_SR)
         _info(f"WAV → {args.out_wav}")
 
+        if cache is not None:
+            _info(f"解析キャッシュ — hit: {cache.hits}  miss: {cache.misses}")
+        _info(_startup_summary(startup, preloader))
+
         elapsed = time.perf_counter() - total_start
         print(f"\n完了 ({elapsed:.1f}s)")
 
@@ -190,6 +401,356 @@ def _cmd_run(args: argparse.Namespace) -> None:
         sys.exit(1)
 
 
+# ---- batch コマンド実装 -----------------------------------------------------
+
+def _collect_takes(patterns: list[str]) -> list[Path]:
+    """ファイル・ディレクトリ・glob から対応形式のテイクを列挙する（重複除去・順序維持）。"""
+    import glob
+    from core.audio_io import SUPPORTED_EXTENSIONS
+
+    found: list[Path] = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            candidates = sorted(path.iterdir())
+        elif path.exists():
+            candidates = [path]
+        else:
+            candidates = sorted(Path(p) for p in glob.glob(pattern, recursive=True))
+        found.extend(
+            p for p in candidates
+            if p.is_file() and p.suffix.lower() in SUPPORTED_EXTENSIONS
+        )
+    return list(dict.fromkeys(found))
+
+
+def _duplicate_stems(takes: list[Path]) -> list[list[Path]]:
+    """拡張子を除いた名前（大文字小文字は区別しない）が同じテイクの組を返す。"""
+    groups: dict[str, list[Path]] = {}
+    for take in takes:
+        groups.setdefault(take.stem.casefold(), []).append(take)
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+
+def _cmd_batch(args: argparse.Namespace) -> None:
+    import json
+    import os
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # 各ステージのモジュールは使う直前に import する（--stem では demucs を import しない）
+    from core.analysis_cache import AnalysisCache
+    from core.recipe.schema import SIDECAR_SUFFIX
+
+    preset = PRESETS[args.preset]
+    TARGET_SR = 44100
+
+    takes = _collect_takes(args.takes)
+    if not takes:
+        print(f"[エラー] テイクが見つかりません: {' '.join(args.takes)}", file=sys.stderr)
+        sys.exit(1)
+    # 出力はテイク名で --out-dir に並べるので、同名のテイクは互いに上書きしてしまう
+    duplicates = _duplicate_stems(takes)
+    if duplicates:
+        print("[エラー] 同じ名前のテイクがあります（出力ファイル名が衝突します）:", file=sys.stderr)
+        for paths in duplicates:
+            print(f"  {'  '.join(str(p) for p in paths)}", file=sys.stderr)
+        sys.exit(1)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+
+    _print_header(args, preset)
+
+    # torch の import とモデルのロードをリファレンスの読み込みと並行して進める
+    preloader = _start_preloader(args)
+    total_start = time.perf_counter()
+    startup = total_start - getattr(args, "started", _START)   # lyra serve のジョブは開始時点から
+
+    cache = None if args.no_cache else AnalysisCache(args.cache_dir)
+    if args.clear_cache:
+        (cache or AnalysisCache(args.cache_dir)).clear()
+
+    # --- リファレンス解析（1 回だけ） ---
+    try:
+        from core.audio_io import load, load_with_analysis, save
+        from core.analysis_cache import (
+            cached_detect_onsets,
+            cached_detect_voiced,
+            cached_estimate_f0_batch,
+            cached_separate_vocal,
+        )
+        from core.resample import ANALYSIS_SR, to_analysis
+
+        _step(1, 3, "リファレンス解析中")
+        ref_16k = None
+        if args.stem:
+            ref_vocal, ref_16k = load_with_analysis(args.ref, TARGET_SR)
+        elif args.stream_separation:
+            ref_vocal = _stream_separate(
+                args, preset, out_dir / f"{Path(args.ref).stem}.vocals.wav", TARGET_SR,
+            )
+        else:
+            ref_audio, _ = load(args.ref, target_sr=TARGET_SR)
+            ref_vocal = cached_separate_vocal(
+                cache, ref_audio, TARGET_SR, **_separation_kwargs(args, preset),
+            )
+            del ref_audio
+        if ref_16k is None:
+            ref_16k = to_analysis(ref_vocal, TARGET_SR)
+        [(ref_f0, ref_times)] = cached_estimate_f0_batch(
+            cache, [ref_16k], ANALYSIS_SR, use_viterbi=args.viterbi_f0,
+        )
+        del ref_16k
+        ref_onsets = cached_detect_onsets(cache, ref_vocal, TARGET_SR)
+        _info(f"リファレンス: {len(ref_vocal) / TARGET_SR:.1f}s  "
+              f"有声フレーム: {(ref_f0 > 0).sum()}  オンセット: {len(ref_onsets)}点")
+    except Exception as e:
+        print(f"\n[エラー] {type(e).__name__}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    from core.key_detector import detect_key_shift
+    from core.alignment.dtw_aligner import align
+    from core.recipe.generator import generate
+    from core.renderer.rubberband_renderer import render
+
+    # --- テイクの F0 解析（--jobs 件ずつまとめてバッチ推論） ---
+    _step(2, 3, f"テイク F0 解析中 ({len(takes)} 件, {jobs} 件ずつ)")
+
+    def load_analysis(take: Path):
+        native, sr = load(take)
+        return to_analysis(native, sr)
+
+    def estimate(audios: list) -> list:
+        return cached_estimate_f0_batch(cache, audios, ANALYSIS_SR, use_viterbi=args.viterbi_f0)
+
+    take_f0, take_errors = _estimate_takes_f0(takes, jobs, load_analysis, estimate)
+    _info(f"解析済み: {len(take_f0)} 件  失敗: {len(take_errors)} 件")
+
+    def process(take: Path) -> dict:
+        start = time.perf_counter()
+        out_wav = out_dir / f"{take.stem}.wav"
+        out_recipe = out_dir / f"{take.stem}.recipe.json"
+        entry = {"take": str(take), "out_wav": str(out_wav), "out_recipe": str(out_recipe)}
+        try:
+            if take in take_errors:
+                raise take_errors[take]
+            new_audio, _ = load(take, target_sr=TARGET_SR)
+            new_f0, new_times = take_f0[take]
+            new_onsets = cached_detect_onsets(cache, new_audio, TARGET_SR)
+            voiced_mask = cached_detect_voiced(cache, new_audio, TARGET_SR)
+
+            if args.key_shift is not None:
+                key_shift = float(args.key_shift)
+            else:
+                key_shift = detect_key_shift(ref_f0, new_f0)
+
+            alignment = align(
+                ref_f0=ref_f0, ref_times=ref_times, ref_onsets=ref_onsets,
+                new_f0=new_f0, new_times=new_times, new_onsets=new_onsets,
+                band_radius=preset["band_radius"],
+                engine=args.dtw_engine,
+                mode=args.align_mode or preset["align_mode"],
+            )
+            recipe = generate(
+                new_audio_duration=len(new_audio) / TARGET_SR,
+                sample_rate=TARGET_SR,
+                global_key_shift_semitones=key_shift,
+                alignment=alignment,
+                ref_f0=ref_f0, ref_times=ref_times,
+                new_f0=new_f0, new_times=new_times,
+                voiced_mask=voiced_mask,
+                confidence_low=preset["confidence_low"],
+                confidence_high=preset["confidence_high"],
+                full_resolution_pitch=args.full_res_pitch,
+                segmentation=args.segmentation, onsets=new_onsets,
+            )
+            recipe.save(out_recipe, sidecar=args.recipe_sidecar)
+            output = render(new_audio, TARGET_SR, recipe, new_f0=new_f0, new_times=new_times,
+                            backend=args.renderer, mode=args.render_mode)
+            save(out_wav, output, TARGET_SR)
+            entry.update(
+                status="ok",
+                duration=round(len(new_audio) / TARGET_SR, 3),
+                key_shift=key_shift,
+                segments=len(recipe.segments),
+                warnings=len(recipe.warnings),
+            )
+        except Exception as e:
+            for f in (out_wav, out_recipe, out_recipe.with_name(out_recipe.stem + SIDECAR_SUFFIX)):
+                f.unlink(missing_ok=True)
+            entry.update(status="error", error=f"{type(e).__name__}: {e}")
+        entry["elapsed"] = round(time.perf_counter() - start, 2)
+        return entry
+
+    # --- テイクごとの補正（並列） ---
+    _step(3, 3, f"テイク補正中 ({len(takes)} 件, 並列 {jobs})")
+    results: dict[Path, dict] = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(process, take): take for take in takes}
+        for future in as_completed(futures):
+            entry = future.result()
+            results[futures[future]] = entry
+            if entry["status"] == "ok":
+                _info(f"{futures[future].name}: key {entry['key_shift']:+.1f}  "
+                      f"warnings {entry['warnings']}  ({entry['elapsed']:.1f}s)")
+            else:
+                _warn(f"{futures[future].name}: {entry['error']}")
+
+    elapsed = time.perf_counter() - total_start
+    entries = [results[t] for t in takes]
+    n_failed = sum(e["status"] != "ok" for e in entries)
+    summary = {
+        "ref": args.ref,
+        "preset": args.preset,
+        "renderer": args.renderer,
+        "render_mode": args.render_mode,
+        "elapsed": round(elapsed, 2),
+        "startup": round(startup, 2),
+        "preload": {stage: round(t, 2) for stage, t in preloader.timings.items()},
+        "n_takes": len(takes),
+        "n_failed": n_failed,
+        "takes": entries,
+    }
+    summary_path = out_dir / "batch_summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    _info(f"サマリー → {summary_path}")
+    if cache is not None:
+        _info(f"解析キャッシュ — hit: {cache.hits}  miss: {cache.misses}")
+    _info(_startup_summary(startup, preloader))
+
+    print(f"\n完了 ({elapsed:.1f}s)  成功: {len(takes) - n_failed}  失敗: {n_failed}")
+    if n_failed:
+        sys.exit(1)
+
+
+def _estimate_takes_f0(
+    takes: list[Path],
+    jobs: int,
+    load_analysis: Callable[[Path], object],
+    estimate: Callable[[list], list],
+) -> tuple[dict[Path, tuple], dict[Path, Exception]]:
+    """
+    テイクを jobs 件ずつ読み込み、グループごとに 1 回のバッチ推論で F0 を求める。
+
+    解析用の信号を保持するのは 1 グループ分だけなので、ピークメモリはテイク数に依存しない。
+    グループの推論が失敗したらそのグループを 1 件ずつやり直し、読み込み・推論に失敗した
+    テイクは例外を記録して残りの処理を続ける。
+
+    Returns
+    -------
+    take_f0 : dict[Path, tuple]
+        テイク → estimate の結果
+    take_errors : dict[Path, Exception]
+        失敗したテイク → 例外
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    take_f0: dict[Path, tuple] = {}
+    take_errors: dict[Path, Exception] = {}
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        for g in range(0, len(takes), jobs):
+            group = takes[g:g + jobs]
+            signals = {}
+            for take, future in [(t, pool.submit(load_analysis, t)) for t in group]:
+                try:
+                    signals[take] = future.result()
+                except Exception as e:
+                    take_errors[take] = e
+            if not signals:
+                continue
+            try:
+                take_f0.update(zip(signals, estimate(list(signals.values()))))
+            except Exception:
+                # どのテイクで失敗したか分からないので 1 件ずつやり直す
+                for take, signal in signals.items():
+                    try:
+                        [take_f0[take]] = estimate([signal])
+                    except Exception as e:
+                        take_errors[take] = e
+            del signals
+    return take_f0, take_errors
+
+
+def _separation_kwargs(args: argparse.Namespace, preset: dict) -> dict:
+    """CLI 引数とプリセットから cached_separate_vocal に渡す分離パラメータを作る。"""
+    return {
+        "model_name": args.sep_model,
+        "profile": args.separation or preset["separation"],
+        "num_workers": args.sep_workers,
+        "segment": args.sep_segment,
+        "overlap": args.sep_overlap,
+        "shifts": args.sep_shifts,
+        "split": False if args.sep_no_split else None,
+    }
+
+
+def _stream_separate(args: argparse.Namespace, preset: dict, out_path: Path, target_sr: int):
+    """リファレンスをストリーミング分離して out_path に書き出し、ボーカルを読み込んで返す。"""
+    from core.audio_io import load
+    from core.separation.demucs_wrapper import separate_vocal_to_file
+
+    separate_vocal_to_file(args.ref, out_path, **_separation_kwargs(args, preset))
+    _info(f"分離済みボーカル: {out_path}")
+    return load(out_path, target_sr=target_sr)[0]
+
+
+def _preload_stages(args: argparse.Namespace) -> list[str]:
+    """コマンドで使うウォームアップステージ（--stem のときは Demucs を除く）。"""
+    stages = ["torch", "rmvpe", "librosa"]
+    if not args.stem:
+        stages.append("demucs")
+    return stages
+
+
+def _start_preloader(args: argparse.Namespace):
+    """このコマンドで使うモデルのバックグラウンドロードを開始する。"""
+    from core.warmup import Preloader
+
+    return Preloader(_preload_stages(args), sep_model=args.sep_model).start()
+
+
+def _startup_summary(startup: float, preloader) -> str:
+    """起動時間と、バックグラウンドで済ませたロードの所要時間を 1 行にまとめる。"""
+    loads = [f"{stage} {t:.1f}s" for stage, t in preloader.timings.items()]
+    pending = [
+        s for s in preloader.stages if s not in preloader.timings and s not in preloader.errors
+    ]
+    loads += [f"{stage} ロード中" for stage in pending]
+    return f"起動: {startup:.2f}s  事前ロード: {' / '.join(loads) or 'なし'}"
+
+
+def _cmd_warmup(args: argparse.Namespace) -> None:
+    from core.warmup import warmup
+
+    stages = _preload_stages(args)
+
+    print("=" * 56)
+    print("  lyra — モデルの事前ロード")
+    print("=" * 56)
+    start = time.perf_counter()
+    try:
+        timings = warmup(stages, sep_model=args.sep_model)
+    except Exception as e:
+        print(f"\n[エラー] {type(e).__name__}: {e}", file=sys.stderr)
+        sys.exit(1)
+    for stage, t in timings.items():
+        _info(f"{stage}: {t:.2f}s")
+    print(f"\n完了 ({time.perf_counter() - start:.1f}s)")
+
+
+def _configure_runtime(args: argparse.Namespace) -> None:
+    """CLI の推論ランタイムオプション（--device / --precision など）を core.runtime に反映する。"""
+    from core import runtime
+
+    runtime.configure(
+        device=args.device, threads=args.threads, interop_threads=args.interop_threads,
+        precision=args.precision, torchscript=args.torchscript,
+        f0_batch_seconds=args.f0_batch_seconds,
+    )
+
+
 # ---- 表示ヘルパー -----------------------------------------------------------
 
 def _print_header(args: argparse.Namespace, preset: dict) -> None:
@@ -197,9 +758,18 @@ def _print_header(args: argparse.Namespace, preset: dict) -> None:
     print("  lyra — ボーカルエディット自動化ツール")
     print("=" * 56)
     print(f"  ref    : {args.ref}")
-    print(f"  vocal  : {args.vocal}")
+    if args.command == "batch":
+        print(f"  takes  : {' '.join(args.takes)}")
+    else:
+        print(f"  vocal  : {args.vocal}")
     print(f"  preset : {args.preset} — {preset['description']}")
     print(f"  stem   : {'yes' if args.stem else 'no'}")
+    if not args.stem:
+        print(f"  sep    : {args.separation or preset['separation']}")
+    print(f"  render : {args.renderer} ({args.render_mode})")
+    threads = f"threads {args.threads}" if args.threads else "threads auto"
+    engine = "torchscript" if args.torchscript else "eager"
+    print(f"  infer  : {args.device} / {args.precision} / {engine} / {threads}")
     print("=" * 56)
 
 
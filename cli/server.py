@@ -0,0 +1,407 @@
+"""
+cli/server.py — 常駐ジョブサーバー（lyra serve）とクライアント（lyra submit）
+
+lyra run / batch を 1 回ずつ起動すると、そのたびにインタプリタの起動・torch の import・
+モデルのロード（RMVPE 約 181 MB、Demucs はそれ以上）が発生する。lyra serve は 1 つのプロセスで
+これらを保持したまま、localhost の HTTP でジョブを受け付ける。各ラッパーのモデルキャッシュ
+（rmvpe_wrapper / demucs_wrapper / beat_tracker）はプロセス内で共有され、2 件目以降の
+ジョブはロードなしで始まる。
+
+API（JSON）:
+  GET  /health               サーバーの状態（推論プロファイル・事前ロード・キュー長）
+  POST /jobs                 {"command": "run" | "batch", "args": [...], "cwd": "..."}
+                             → 202 + ジョブ
+  GET  /jobs                 ジョブ一覧（ログなし）
+  GET  /jobs/<id>[?wait=秒]  ジョブの状態とログ。wait を付けると完了まで最大その秒数待つ
+
+ジョブの引数は lyra run / batch と同じ。相対パスは cwd（クライアントの作業ディレクトリ）を
+基準に解決する。推論ランタイム（--device / --threads / --precision など）はプロセス全体で
+1 つなので、サーバー起動時の設定と異なる値を指定したジョブは受け付けない。
+
+同時に実行するジョブ数は lyra serve --workers で指定する。ジョブの標準出力・標準エラーは
+ジョブごとのログに取り込み、GET /jobs/<id> で返す。
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+JOB_COMMANDS = ("run", "batch")
+PATH_OPTIONS = ("ref", "vocal", "out_wav", "out_recipe", "out_dir", "cache_dir")
+MAX_FINISHED_JOBS = 1000   # 保持する完了済みジョブ数（古いものから削除）
+MAX_WAIT = 60.0            # GET /jobs/<id>?wait= の上限（秒）
+
+
+# ---- ジョブ出力の取り込み ---------------------------------------------------
+
+class _ThreadOutput:
+    """
+    sys.stdout / sys.stderr の代わりに置くストリーム。
+
+    capture() を呼んだスレッドの書き込みだけをそのバッファに送り、
+    それ以外（サーバー自身のログ）は元のストリームに書く。
+    """
+
+    def __init__(self, stream) -> None:
+        self._stream = stream
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def capture(self, buffer: io.StringIO) -> Iterator[None]:
+        self._local.buffer = buffer
+        try:
+            yield
+        finally:
+            self._local.buffer = None
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, "buffer", None)
+        return (buffer or self._stream).write(text)
+
+    def flush(self) -> None:
+        buffer = getattr(self._local, "buffer", None)
+        (buffer or self._stream).flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self._stream, name)
+
+
+def _install_output() -> tuple[_ThreadOutput, _ThreadOutput]:
+    """sys.stdout / sys.stderr をスレッドごとに取り込めるストリームに置き換える。"""
+    if not isinstance(sys.stdout, _ThreadOutput):
+        sys.stdout = _ThreadOutput(sys.stdout)
+    if not isinstance(sys.stderr, _ThreadOutput):
+        sys.stderr = _ThreadOutput(sys.stderr)
+    return sys.stdout, sys.stderr
+
+
+@contextlib.contextmanager
+def _captured(buffer: io.StringIO) -> Iterator[None]:
+    stdout, stderr = _install_output()
+    with stdout.capture(buffer), stderr.capture(buffer):
+        yield
+
+
+# ---- ジョブキュー -----------------------------------------------------------
+
+@dataclass
+class Job:
+    id: str
+    command: str
+    args: list[str]
+    status: str = "queued"   # queued / running / done / failed
+    created: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    exit_code: int | None = None
+    log: io.StringIO = field(default_factory=io.StringIO, repr=False)
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self, with_log: bool = False) -> dict:
+        d = {
+            "id": self.id,
+            "command": self.command,
+            "args": self.args,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "exit_code": self.exit_code,
+        }
+        if self.started is not None:
+            d["elapsed"] = round((self.finished or time.time()) - self.started, 3)
+        if with_log:
+            d["log"] = self.log.getvalue()
+        return d
+
+
+def parse_job(command: str, args: list[str], cwd: str | None = None) -> argparse.Namespace:
+    """
+    ジョブの引数を lyra run / batch のパーサーで解釈し、相対パスを cwd 基準に解決する。
+
+    Raises
+    ------
+    ValueError
+        コマンド・引数が不正な場合、または推論ランタイムの指定がサーバーと異なる場合
+    """
+    from cli.main import build_parser
+    from core import runtime
+
+    if command not in JOB_COMMANDS:
+        raise ValueError(f"未対応のジョブ: {command!r}。対応: {JOB_COMMANDS}")
+    if not isinstance(args, list) or not all(isinstance(a, str) for a in args):
+        raise ValueError("args は文字列のリストで指定してください")
+
+    errors = io.StringIO()
+    try:
+        with _captured(errors):
+            ns = build_parser().parse_args([command, *args])
+    except SystemExit:
+        raise ValueError(errors.getvalue().strip().splitlines()[-1]) from None
+
+    # 推論ランタイムはプロセスで共有するため、既定値以外はサーバーの設定と一致している必要がある
+    default, profile = runtime.InferenceProfile(), runtime.get_profile()
+    for f in fields(runtime.InferenceProfile):
+        value = getattr(ns, f.name)
+        if value != getattr(default, f.name) and value != getattr(profile, f.name):
+            raise ValueError(
+                f"--{f.name.replace('_', '-')} {value} はサーバーの設定"
+                f"（{getattr(profile, f.name)}）と異なります。lyra serve の起動オプションで"
+                "指定してください"
+            )
+        setattr(ns, f.name, getattr(profile, f.name))   # ヘッダーにはサーバーの設定を表示する
+
+    cwd = cwd or os.getcwd()
+    for name in PATH_OPTIONS:
+        value = getattr(ns, name, None)
+        if value is not None:
+            setattr(ns, name, os.path.join(cwd, value))
+    if command == "batch":
+        ns.takes = [os.path.join(cwd, t) for t in ns.takes]
+    return ns
+
+
+class JobQueue:
+    """ジョブを受け付け、workers 件ずつスレッドで実行する。"""
+
+    def __init__(self, workers: int = 1) -> None:
+        if workers < 1:
+            raise ValueError(f"workers は 1 以上を指定してください: {workers}")
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lyra-job")
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, command: str, args: list[str], cwd: str | None = None) -> Job:
+        ns = parse_job(command, args, cwd)
+        job = Job(id=uuid.uuid4().hex[:12], command=command, args=list(args))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._pool.submit(self._run, job, ns)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def counts(self) -> dict[str, int]:
+        counts = dict.fromkeys(("queued", "running", "done", "failed"), 0)
+        for job in self.list():
+            counts[job.status] += 1
+        return counts
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _evict(self) -> None:
+        finished = [j.id for j in self._jobs.values() if j.done.is_set()]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def _run(self, job: Job, ns: argparse.Namespace) -> None:
+        from cli import main as cli
+
+        job.status, job.started = "running", time.time()
+        ns.started = time.perf_counter()   # 起動時間はジョブの開始から測る
+        try:
+            with _captured(job.log):
+                {"run": cli._cmd_run, "batch": cli._cmd_batch}[job.command](ns)
+            job.exit_code = 0
+        except SystemExit as e:
+            job.exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            job.log.write(traceback.format_exc())
+            job.exit_code = 1
+        job.finished = time.time()
+        job.status = "done" if job.exit_code == 0 else "failed"
+        job.done.set()
+        print(f"[{job.id}] {job.command} {job.status} ({job.finished - job.started:.1f}s)")
+
+
+# ---- HTTP サーバー ----------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _JobServer
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        queue = self.server.queue
+        if parts == ["health"]:
+            self._send(200, self.server.health())
+        elif parts == ["jobs"]:
+            self._send(200, {"jobs": [job.to_dict() for job in queue.list()]})
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = queue.get(parts[1])
+            if job is None:
+                self._send(404, {"error": f"ジョブが見つかりません: {parts[1]}"})
+                return
+            wait = parse_qs(url.query).get("wait")
+            if wait:
+                try:
+                    job.done.wait(min(float(wait[0]), MAX_WAIT))
+                except ValueError:
+                    self._send(400, {"error": f"wait は秒数で指定してください: {wait[0]!r}"})
+                    return
+            self._send(200, job.to_dict(with_log=True))
+        else:
+            self._send(404, {"error": f"不明なパス: {url.path}"})
+
+    def do_POST(self) -> None:
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            self._send(404, {"error": f"不明なパス: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            job = self.server.queue.submit(
+                body.get("command"), body.get("args", []), body.get("cwd"),
+            )
+        except (ValueError, AttributeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        self._send(202, job.to_dict())
+
+    def _send(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        pass   # アクセスログは出さない（ジョブの完了はキュー側で表示する）
+
+
+class _JobServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], queue: JobQueue, preloader=None) -> None:
+        super().__init__(address, _Handler)
+        self.queue = queue
+        self.preloader = preloader
+
+    def health(self) -> dict:
+        from core import runtime
+
+        preloader = self.preloader
+        return {
+            "status": "ok",
+            "profile": asdict(runtime.get_profile()),
+            "workers": self.queue.workers,
+            "jobs": self.queue.counts(),
+            "preload": {
+                "done": preloader is None or preloader.done(),
+                "timings": dict(preloader.timings) if preloader else {},
+                "errors": {k: f"{type(e).__name__}: {e}" for k, e in preloader.errors.items()}
+                          if preloader else {},
+            },
+        }
+
+
+def make_server(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    workers: int = 1,
+    preloader=None,
+) -> _JobServer:
+    """ジョブサーバーを作る（serve_forever() で受け付けを始める。port=0 は空きポート）。"""
+    return _JobServer((host, port), JobQueue(workers), preloader)
+
+
+# ---- lyra serve / lyra submit ---------------------------------------------
+
+def serve(args: argparse.Namespace) -> None:
+    """lyra serve — モデルを事前ロードしてジョブを受け付ける。"""
+    from cli.main import _start_preloader
+
+    _install_output()
+    preloader = _start_preloader(args)
+    server = make_server(args.host, args.port, args.workers, preloader)
+    host, port = server.server_address[:2]
+    print("=" * 56)
+    print("  lyra — ジョブサーバー")
+    print("=" * 56)
+    print(f"  listen : http://{host}:{port}")
+    print(f"  workers: {args.workers}")
+    print(f"  preload: {' / '.join(preloader.stages)}（バックグラウンド）")
+    print("\n停止するには Ctrl+C")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n停止中...")
+    finally:
+        server.server_close()
+        server.queue.shutdown()
+
+
+def _request(
+    url: str,
+    method: str = "GET",
+    payload: dict | None = None,
+    timeout: float = 90.0,
+) -> dict:
+    import urllib.error
+    import urllib.request
+
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(url, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as res:
+            return json.loads(res.read())
+    except urllib.error.HTTPError as e:
+        raise ValueError(json.loads(e.read()).get("error", str(e))) from None
+    except urllib.error.URLError as e:
+        raise ConnectionError(
+            f"サーバーに接続できません: {url}（lyra serve を起動してください）"
+        ) from e
+
+
+def submit(args: argparse.Namespace) -> None:
+    """lyra submit — ジョブを送信し、完了を待ってログと終了コードを返す。"""
+    if not args.job or args.job[0] not in JOB_COMMANDS:
+        print(f"[エラー] ジョブのコマンドを指定してください: {' | '.join(JOB_COMMANDS)}",
+              file=sys.stderr)
+        sys.exit(2)
+
+    base = args.server.rstrip("/")
+    try:
+        job = _request(f"{base}/jobs", "POST",
+                       {"command": args.job[0], "args": args.job[1:], "cwd": os.getcwd()})
+        if args.no_wait:
+            print(job["id"])
+            return
+        url = f"{base}/jobs/{job['id']}?wait={MAX_WAIT:g}"
+        job = _request(url)
+        while job["status"] in ("queued", "running"):
+            job = _request(url)
+    except (ValueError, ConnectionError) as e:
+        print(f"[エラー] {e}", file=sys.stderr)
+        sys.exit(1)
+
+    sys.stdout.write(job["log"])
+    sys.exit(job["exit_code"])
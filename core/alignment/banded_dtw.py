@@ -0,0 +1,286 @@
+"""
+alignment/banded_dtw.py — 制約領域内だけを保持する DTW
+
+dtw-python は制約付きでも n×m の密行列（局所コスト・累積コスト・方向）を確保する。
+ここでは行 i ごとの列範囲 [lo_i, hi_i]（コリドー）だけを (n, W) 配列に詰めて持つ。
+行 i・列 j のセルは band[i, j - lo_i] に入り、W は最大の行幅。
+累積コストは直前の 1 行分しか保持しない。
+
+- banded_dtw     : Sakoe-Chiba バンド（lo_i = i - w, hi_i = i + w）。メモリ O(n·w)
+- multiscale_dtw : FastDTW 方式。1/2 ずつ間引いた特徴で粗く合わせ、
+                   投影したパスの周囲 radius フレームだけを細かい解像度で解き直す。
+                   時間・メモリともほぼ線形
+
+ステップパターンは dtw-python の既定 symmetric2 と同じで、
+斜め移動は重み 2、縦横の移動は重み 1。同コストのときは斜め → 横 → 縦の順に優先する。
+局所コストはユークリッド距離。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# 方向コード（backtrack 用）
+_DIAG, _HORIZ, _VERT = 0, 1, 2
+
+
+@dataclass
+class BandedDTWResult:
+    index1: np.ndarray          # x 側のフレーム番号（パス順）
+    index2: np.ndarray          # y 側のフレーム番号（パス順）
+    local_costs: np.ndarray     # パス上の各ステップの局所コスト
+    distance: float             # 累積コスト（symmetric2 の重み込み）
+
+    @property
+    def normalized_distance(self) -> float:
+        """symmetric2 の正規化距離 distance / (n + m)。"""
+        return self.distance / (int(self.index1[-1]) + int(self.index2[-1]) + 2)
+
+
+def _as_features(a: np.ndarray) -> np.ndarray:
+    a = np.asarray(a, dtype=np.float64)
+    return a[:, None] if a.ndim == 1 else a
+
+
+def banded_dtw(x: np.ndarray, y: np.ndarray, window_size: int) -> BandedDTWResult:
+    """
+    Sakoe-Chiba バンド付き DTW（symmetric2, ユークリッド距離）。
+
+    Parameters
+    ----------
+    x : np.ndarray
+        クエリ特徴 (n, d)
+    y : np.ndarray
+        リファレンス特徴 (m, d)
+    window_size : int
+        バンド半径 w（|i - j| <= w のセルだけを計算する）
+
+    Returns
+    -------
+    BandedDTWResult
+    """
+    n, m = len(x), len(y)
+    w = int(window_size)
+    if n == 0 or m == 0:
+        raise ValueError("DTW の入力が空です")
+    if abs((n - 1) - (m - 1)) > w:
+        raise ValueError(
+            f"バンド幅 {w} では終点 ({n - 1}, {m - 1}) に到達できません"
+        )
+    rows = np.arange(n)
+    lo = np.clip(rows - w, 0, m - 1)
+    hi = np.clip(rows + w, 0, m - 1)
+    return corridor_dtw(x, y, lo, hi)
+
+
+def dp_row(
+    prev: np.ndarray | None,
+    shift: int,
+    cost: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    symmetric2 の 1 行分の累積コストと方向を計算する。
+
+    Parameters
+    ----------
+    prev : np.ndarray | None
+        前行の累積コスト。位置 1..幅 に値を置き、その外側を inf で埋めたバッファ。
+        None の場合は先頭行（始点 (0, 0) から横移動のみ）。
+    shift : int
+        この行の先頭列 − 前行の先頭列
+    cost : np.ndarray
+        この行の局所コスト (width,)
+
+    Returns
+    -------
+    cur : np.ndarray
+        累積コスト (width,)
+    direction : np.ndarray
+        各セルへの移動方向 (width,) int8
+    """
+    width = len(cost)
+    if prev is None:
+        diag = np.full(width, np.inf)
+        vert = np.full(width, np.inf)
+        diag[0] = cost[0]       # 始点 (0, 0) の累積コストは局所コストそのもの
+    else:
+        # (i-1, j-1) と (i-1, j) の前行バッファ上の位置
+        pos = np.arange(width) + shift
+        diag = np.take(prev, pos, mode="clip") + 2.0 * cost
+        vert = np.take(prev, pos + 1, mode="clip") + cost
+    best = np.minimum(diag, vert)
+
+    # 横移動 D[j] = min(best[j], D[j-1] + c[j]) を累積和 + 累積 min で一括計算
+    csum = np.cumsum(cost)
+    cur = csum + np.minimum.accumulate(best - csum)
+
+    horiz = np.empty(width)
+    horiz[0] = np.inf
+    horiz[1:] = cur[:-1] + cost[1:]
+    direction = np.where(
+        (diag <= horiz) & (diag <= vert), _DIAG,
+        np.where(horiz <= vert, _HORIZ, _VERT),
+    ).astype(np.int8)
+    return cur, direction
+
+
+def corridor_dtw(
+    x: np.ndarray,
+    y: np.ndarray,
+    lo: np.ndarray,
+    hi: np.ndarray,
+) -> BandedDTWResult:
+    """
+    行ごとの列範囲 [lo[i], hi[i]] に制約した DTW（symmetric2, ユークリッド距離）。
+
+    Parameters
+    ----------
+    x : np.ndarray
+        クエリ特徴 (n, d)
+    y : np.ndarray
+        リファレンス特徴 (m, d)
+    lo, hi : np.ndarray
+        各行で計算する列の範囲（両端を含む）、shape (n,)
+
+    Returns
+    -------
+    BandedDTWResult
+    """
+    x = _as_features(x)
+    y = _as_features(y)
+    n, m = len(x), len(y)
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+    if n == 0 or m == 0:
+        raise ValueError("DTW の入力が空です")
+    if lo[0] != 0 or hi[-1] != m - 1 or (hi < lo).any():
+        raise ValueError("コリドーが始点・終点を含んでいません")
+
+    widths = hi - lo + 1
+    W = int(widths.max())
+    directions = np.empty((n, W), dtype=np.int8)
+    # 前行の累積コスト。位置 1..幅 に値を置き、両端の外側は inf（範囲外参照の番兵）
+    prev = np.full(W + 2, np.inf)
+    prev_lo = 0
+
+    for i in range(n):
+        lo_i, width = int(lo[i]), int(widths[i])
+        cost = np.sqrt(((y[lo_i:lo_i + width] - x[i]) ** 2).sum(axis=1))
+        cur, directions[i, :width] = dp_row(prev if i else None, lo_i - prev_lo, cost)
+
+        prev[1:width + 1] = cur
+        prev[width + 1:] = np.inf
+        prev_lo = lo_i
+
+    distance = float(prev[widths[-1]])
+    if not np.isfinite(distance):
+        raise ValueError("制約領域内にワーピングパスが見つかりません")
+
+    # ---- backtrack ----
+    path_i: list[int] = []
+    path_j: list[int] = []
+    i, j = n - 1, m - 1
+    while True:
+        path_i.append(i)
+        path_j.append(j)
+        if i == 0 and j == 0:
+            break
+        step = directions[i, j - lo[i]]
+        if i == 0:
+            step = _HORIZ
+        elif j == 0:
+            step = _VERT
+        if step == _DIAG:
+            i, j = i - 1, j - 1
+        elif step == _HORIZ:
+            j -= 1
+        else:
+            i -= 1
+
+    index1 = np.array(path_i[::-1], dtype=np.int64)
+    index2 = np.array(path_j[::-1], dtype=np.int64)
+    local_costs = np.sqrt(((x[index1] - y[index2]) ** 2).sum(axis=1))
+    return BandedDTWResult(index1, index2, local_costs, distance)
+
+
+# ---- マルチスケール ------------------------------------------------------
+
+def _downsample(a: np.ndarray) -> np.ndarray:
+    """隣接 2 フレームの平均で 1/2 に間引く（奇数長の末尾はそのまま残す）。"""
+    n = len(a)
+    half = a[: n - n % 2].reshape(n // 2, 2, -1).mean(axis=1)
+    return np.concatenate([half, a[n - n % 2:]]) if n % 2 else half
+
+
+def _project_corridor(
+    path_i: np.ndarray,
+    path_j: np.ndarray,
+    n: int,
+    m: int,
+    radius: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """粗い解像度のパスを 2 倍の解像度に投影し、radius フレーム広げた列範囲を返す。"""
+    from scipy.ndimage import maximum_filter1d, minimum_filter1d
+
+    lo = np.full(n, m, dtype=np.int64)
+    hi = np.full(n, -1, dtype=np.int64)
+    for di in (0, 1):
+        rows = np.minimum(2 * path_i + di, n - 1)
+        np.minimum.at(lo, rows, np.minimum(2 * path_j, m - 1))
+        np.maximum.at(hi, rows, np.minimum(2 * path_j + 1, m - 1))
+
+    size = 2 * radius + 1
+    lo = minimum_filter1d(lo, size, mode="nearest") - radius
+    hi = maximum_filter1d(hi, size, mode="nearest") + radius
+    return np.clip(lo, 0, m - 1), np.clip(hi, 0, m - 1)
+
+
+def multiscale_dtw(
+    x: np.ndarray,
+    y: np.ndarray,
+    radius: int = 20,
+    window_size: int | None = None,
+    min_size: int = 256,
+) -> BandedDTWResult:
+    """
+    粗密 2 段階以上の DTW（FastDTW 方式）。
+
+    特徴を 1/2 ずつ間引いて min_size 以下になるまで下り、最も粗い解像度で
+    バンド付き DTW を解く。その後 1 段ずつ解像度を戻しながら、
+    投影したパスの周囲 radius フレームのコリドー内で解き直す。
+
+    Parameters
+    ----------
+    x, y : np.ndarray
+        クエリ / リファレンス特徴 (n, d), (m, d)
+    radius : int
+        各解像度でパスの周りに確保するフレーム数
+    window_size : int | None
+        元の解像度での Sakoe-Chiba バンド半径。最も粗い解像度では
+        同じ比率に縮めて適用する。None の場合は制約なし。
+    min_size : int
+        これ以下の長さになったら直接解く
+
+    Returns
+    -------
+    BandedDTWResult
+        元の解像度でのパス・局所コスト・累積コスト
+    """
+    x = _as_features(x)
+    y = _as_features(y)
+    n, m = len(x), len(y)
+    if n == 0 or m == 0:
+        raise ValueError("DTW の入力が空です")
+
+    if min(n, m) <= max(min_size, 2 * (radius + 1)):
+        w = max(n, m) if window_size is None else max(int(window_size), abs(n - m))
+        return banded_dtw(x, y, w)
+
+    coarse_window = None if window_size is None else -(-int(window_size) // 2)
+    coarse = multiscale_dtw(
+        _downsample(x), _downsample(y), radius, coarse_window, min_size,
+    )
+    lo, hi = _project_corridor(coarse.index1, coarse.index2, n, m, radius)
+    return corridor_dtw(x, y, lo, hi)
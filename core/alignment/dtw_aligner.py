@@ -1,15 +1,58 @@
 """
 alignment/dtw_aligner.py — DTW によるリファレンス↔新規ボーカルのアライメント
 
-dtw-python + Sakoe-Chiba バンド制約でメモリ使用量を抑制する。
-5分曲 (100fps) で約 3.6GB になる制約なしの DTW に対し、
-バンド幅 10% で約 360MB に削減する。
+Sakoe-Chiba バンド制約付き DTW。既定のエンジン (engine="native") は
+バンド内のセルだけを保持する banded_dtw で、メモリは O(n·w)。
+dtw-python (engine="dtw-python") はバンド制約があっても n×m の密行列を確保するため、
+5分曲 (100fps) では GB 単位になる。互換確認用に残している。
+
+mode="multiscale" は FastDTW 方式の粗密アライメントで、時間・メモリともほぼ線形。
+10分を超えるライブテイクなど、単一解像度では重すぎる長尺向け。
+mode="online" は online_aligner.OnlineAligner で新規側を先頭から逐次処理する
+（録音中の追従表示などに使うものと同じ結果をオフラインで得る）。
 """
 
 from __future__ import annotations
 
+from collections.abc import Sequence
+
 import numpy as np
-from dtw import dtw
+
+from core.alignment.banded_dtw import banded_dtw, multiscale_dtw
+
+ENGINES = ("native", "dtw-python")
+MODES = ("band", "multiscale", "online")
+ONLINE_CHUNK_FRAMES = 100   # mode="online" で一度に push するフレーム数
+MULTISCALE_RADIUS = 20   # 各解像度でパスの周りに確保するフレーム数（100fps で 0.2 秒）
+
+
+class WarpPoints(Sequence):
+    """
+    (N, 2) のワープマップ配列を list[tuple[float, float]] として見せる読み取り専用ビュー。
+
+    warp_map がタプルのリストだった頃の呼び出し側向け（コピーは作らない）。
+    """
+
+    def __init__(self, array: np.ndarray) -> None:
+        self._array = array
+
+    def __len__(self) -> int:
+        return len(self._array)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [tuple(p) for p in self._array[index].tolist()]
+        return tuple(self._array[index].tolist())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, WarpPoints):
+            return np.array_equal(self._array, other._array)
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"WarpPoints({len(self)} points)"
 
 
 # ---- 特徴量計算 --------------------------------------------------------
@@ -62,6 +105,8 @@ def align(
     new_times: np.ndarray,
     new_onsets: np.ndarray,
     band_radius: float = 0.1,
+    engine: str = "native",
+    mode: str = "band",
 ) -> dict:
     """
     新規ボーカルをリファレンスに DTW でアライメントする。
@@ -76,17 +121,35 @@ def align(
         オンセット時刻（秒）
     band_radius : float
         Sakoe-Chiba バンド幅（全フレーム数に対する比率）
+    engine : str
+        "native"     : バンドだけを保持する banded_dtw（デフォルト）
+        "dtw-python" : dtw-python（密行列を確保する）
+    mode : str
+        "band"       : 元の解像度でバンド全体を解く（デフォルト）
+        "multiscale" : 粗い解像度から順にパス周辺だけを解き直す（native のみ）
+        "online"     : OnlineAligner で逐次アライメントする（native のみ）
 
     Returns
     -------
     dict with keys:
-        warp_map : list[tuple[float, float]]
-            (new_time, ref_time) の対応点リスト
+        warp_map : np.ndarray
+            (new_time, ref_time) の対応点、shape (N, 2) float32
+        warp_points : WarpPoints
+            warp_map をタプルのリストとして見せるビュー（旧形式の呼び出し側向け）
         confidence_per_frame : np.ndarray
             新規ボーカルの各フレームの信頼度 (0〜1)
         new_times : np.ndarray
             新規ボーカルのフレーム時刻
     """
+    if engine not in ENGINES:
+        raise ValueError(f"未対応の DTW エンジンです: {engine!r}（{' / '.join(ENGINES)}）")
+    if mode not in MODES:
+        raise ValueError(f"未対応のアライメントモードです: {mode!r}（{' / '.join(MODES)}）")
+    if mode != "band" and engine != "native":
+        raise ValueError(f"{mode} モードは engine=\"native\" でのみ使用できます")
+    if mode == "online":
+        return _align_online(ref_f0, ref_times, ref_onsets, new_f0, new_times, new_onsets)
+
     ref_feat = _build_features(ref_f0, ref_onsets, ref_times)
     new_feat = _build_features(new_f0, new_onsets, new_times)
 
@@ -105,43 +168,79 @@ def align(
 
     window_size = max(10, int(band_radius * max(n_ref, n_new)))
 
-    alignment = dtw(
-        new_feat,
-        ref_feat,
-        window_type="sakoechiba",
-        window_args={"window_size": window_size},
-        keep_internals=True,
-    )
-
-    # ワープマップ: (new_time, ref_time) の対応点
-    warp_map: list[tuple[float, float]] = []
-    seen_new = set()
-    for i, j in zip(alignment.index1, alignment.index2):
-        if i not in seen_new and i < n_new and j < n_ref:
-            warp_map.append((float(new_times[i]), float(ref_times[j])))
-            seen_new.add(i)
+    if mode == "multiscale":
+        result = multiscale_dtw(new_feat, ref_feat, MULTISCALE_RADIUS, window_size)
+        index1, index2, costs = result.index1, result.index2, result.local_costs
+    elif engine == "native":
+        result = banded_dtw(new_feat, ref_feat, window_size)
+        index1, index2, costs = result.index1, result.index2, result.local_costs
+    else:
+        from dtw import dtw
+        alignment = dtw(
+            new_feat,
+            ref_feat,
+            window_type="sakoechiba",
+            window_args={"window_size": window_size},
+        )
+        index1, index2 = alignment.index1, alignment.index2
+        costs = np.linalg.norm(new_feat[index1] - ref_feat[index2], axis=1)
+
+    return _path_to_result(index1, index2, costs, new_times, ref_times)
+
+
+def _align_online(
+    ref_f0: np.ndarray,
+    ref_times: np.ndarray,
+    ref_onsets: np.ndarray,
+    new_f0: np.ndarray,
+    new_times: np.ndarray,
+    new_onsets: np.ndarray,
+) -> dict:
+    """新規側を ONLINE_CHUNK_FRAMES ずつ OnlineAligner に流して align と同じ形式で返す。"""
+    from core.alignment.online_aligner import OnlineAligner
+
+    aligner = OnlineAligner(ref_f0, ref_times, ref_onsets)
+    new_onsets = np.sort(np.asarray(new_onsets, dtype=np.float64))
+    starts = np.arange(0, len(new_f0), ONLINE_CHUNK_FRAMES)
+    # 各チャンクに属するオンセット（次チャンクの先頭時刻まで）
+    bounds = np.searchsorted(new_onsets, new_times[starts[1:]])
+    for start, onsets in zip(starts, np.split(new_onsets, bounds)):
+        stop = start + ONLINE_CHUNK_FRAMES
+        aligner.push(new_f0[start:stop], new_times[start:stop], onsets)
+    aligner.flush()
+
+    index1, index2, costs = aligner.path()
+    return _path_to_result(index1, index2, costs, new_times, ref_times)
+
+
+def _path_to_result(
+    index1: np.ndarray,
+    index2: np.ndarray,
+    costs: np.ndarray,
+    new_times: np.ndarray,
+    ref_times: np.ndarray,
+) -> dict:
+    """DTW パスから align() の返値を組み立てる。"""
+    n_new = len(new_times)
+    costs = costs.astype(np.float32)
 
-    # 信頼度: DTW ローカルコストの逆数（コストが低い = 一致度が高い）
-    cost_matrix = alignment.localCostMatrix
-    costs = np.array([
-        cost_matrix[i, j]
-        for i, j in zip(alignment.index1, alignment.index2)
-        if i < cost_matrix.shape[0] and j < cost_matrix.shape[1]
-    ], dtype=np.float32)
+    # ワープマップ: new の各フレームがパス上で最初に現れる点の (new_time, ref_time)
+    _, first = np.unique(index1, return_index=True)
+    warp_map = np.column_stack(
+        [new_times[index1[first]], ref_times[index2[first]]]
+    ).astype(np.float32)
 
+    # 信頼度: DTW ローカルコストの逆数（コストが低い = 一致度が高い）
     max_cost = costs.max() if costs.size > 0 else 1.0
     raw_confidence = 1.0 - (costs / (max_cost + 1e-8))
 
-    # new_times の全フレームに confidence を割り当て
+    # new_times の全フレームに confidence を割り当て（同じフレームに複数ステップあれば最大値）
     confidence_per_frame = np.zeros(n_new, dtype=np.float32)
-    for k, i in enumerate(alignment.index1):
-        if i < n_new and k < len(raw_confidence):
-            confidence_per_frame[i] = max(
-                confidence_per_frame[i], raw_confidence[k]
-            )
+    np.maximum.at(confidence_per_frame, index1, raw_confidence)
 
     return {
         "warp_map": warp_map,
+        "warp_points": WarpPoints(warp_map),
         "confidence_per_frame": confidence_per_frame,
         "new_times": new_times,
     }
@@ -0,0 +1,219 @@
+"""
+alignment/online_aligner.py — 逐次入力に追従するオンライン DTW（OLTW 方式）
+
+リファレンスの特徴は事前に全体を計算しておき、新規ボーカルの F0・オンセットを
+届いた分だけ push() で渡す。各フレームについて、直前の最良位置の周囲
+±search_radius フレームだけを symmetric2 で更新する。lag フレーム前の行を
+現在の最良セルからの backtrack で確定し、ワープ点として返す（先読みは lag フレームまで）。
+
+作業メモリは (lag, 2·search_radius+1) の方向バッファと 1 行分の累積コストだけで、
+入力長に依存しない（確定済みの出力だけが入力長に比例して増える）。
+"""
+
+from __future__ import annotations
+
+from collections import deque
+
+import numpy as np
+
+from .banded_dtw import _DIAG, _HORIZ, dp_row
+from .dtw_aligner import _build_features, _f0_to_cents
+
+DEFAULT_SEARCH_RADIUS = 200   # 探索幅（フレーム）。100fps で ±2 秒
+DEFAULT_LAG = 50              # 確定までの遅延（フレーム）。100fps で 0.5 秒
+
+
+class OnlineAligner:
+    """
+    新規ボーカルをリファレンスに逐次アライメントする。
+
+    使い方:
+        aligner = OnlineAligner(ref_f0, ref_times, ref_onsets)
+        for f0, times, onsets in stream:
+            points = aligner.push(f0, times, onsets)   # (k, 2) の確定済みワープ点
+        points = aligner.flush()
+
+    Parameters
+    ----------
+    ref_f0, ref_times, ref_onsets : np.ndarray
+        リファレンスの F0 (Hz)・フレーム時刻・オンセット時刻（全体）
+    search_radius : int
+        各フレームで更新するリファレンス側の範囲（最良位置 ± search_radius）
+    lag : int
+        ワープ点を確定するまでに待つフレーム数
+    """
+
+    def __init__(
+        self,
+        ref_f0: np.ndarray,
+        ref_times: np.ndarray,
+        ref_onsets: np.ndarray,
+        search_radius: int = DEFAULT_SEARCH_RADIUS,
+        lag: int = DEFAULT_LAG,
+    ) -> None:
+        if lag < 1:
+            raise ValueError(f"lag は 1 以上を指定してください: {lag}")
+        self._ref = _build_features(ref_f0, ref_onsets, ref_times).astype(np.float64)
+        self._ref_times = np.asarray(ref_times, dtype=np.float32)
+        self._width = min(2 * int(search_radius) + 1, len(self._ref))
+        self._radius = int(search_radius)
+        self._lag = int(lag)
+
+        # 新規側の有声 cents の逐次統計（件数・平均・偏差平方和）
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._onset_carry = False   # 直前チャンク末尾のオンセットを次フレームにも立てる
+
+        # DP 状態
+        self._n = 0                                   # 処理済みフレーム数
+        self._prev = np.full(self._width + 2, np.inf)
+        self._prev_lo = 0
+        self._rows: deque = deque()   # 未確定行: (frame, time, lo, directions, feature)
+
+        # 確定済みの出力
+        self._last_j = 0
+        self._index1: list[int] = []
+        self._index2: list[int] = []
+        self._times: list[float] = []
+        self._costs: list[float] = []
+
+    # ---- 入力 -----------------------------------------------------------
+
+    def push(
+        self,
+        f0: np.ndarray,
+        times: np.ndarray,
+        onsets: np.ndarray = (),
+    ) -> np.ndarray:
+        """
+        新規ボーカルのフレームを追加し、新たに確定したワープ点を返す。
+
+        Parameters
+        ----------
+        f0 : np.ndarray
+            このチャンクの F0 (Hz)、0 は無声
+        times : np.ndarray
+            このチャンクのフレーム時刻（秒）
+        onsets : np.ndarray
+            このチャンクの範囲で検出されたオンセット時刻（秒）
+
+        Returns
+        -------
+        np.ndarray
+            (new_time, ref_time) の対応点、shape (k, 2) float32
+        """
+        f0 = np.asarray(f0, dtype=np.float32)
+        times = np.asarray(times, dtype=np.float32)
+        start = len(self._index1)
+        for feature, t in zip(self._features(f0, times, onsets), times):
+            self._step(feature, float(t))
+            if len(self._rows) > self._lag:
+                self._emit_oldest()
+        return self._points_since(start)
+
+    def flush(self) -> np.ndarray:
+        """未確定のフレームを現在の最良パスで確定し、そのワープ点を返す。"""
+        start = len(self._index1)
+        while self._rows:
+            self._emit_oldest()
+        return self._points_since(start)
+
+    # ---- 出力 -----------------------------------------------------------
+
+    def path(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """確定済みの (新規フレーム番号, リファレンスフレーム番号, 局所コスト)。"""
+        return (
+            np.asarray(self._index1, dtype=np.int64),
+            np.asarray(self._index2, dtype=np.int64),
+            np.asarray(self._costs, dtype=np.float32),
+        )
+
+    @property
+    def n_frames(self) -> int:
+        """push 済みのフレーム数。"""
+        return self._n
+
+    # ---- 内部処理 -------------------------------------------------------
+
+    def _features(self, f0: np.ndarray, times: np.ndarray, onsets) -> np.ndarray:
+        """_build_features と同じ特徴を、有声 cents の逐次統計で正規化して作る。"""
+        cents = _f0_to_cents(f0)
+        voiced = f0 > 0
+        chunk = cents[voiced].astype(np.float64)
+        if chunk.size:
+            # チャンク単位の統計を既存の統計に合成する（Chan らの並列版 Welford）
+            n_a, n_b = self._count, chunk.size
+            mean_b = float(chunk.mean())
+            delta = mean_b - self._mean
+            self._count = n_a + n_b
+            self._mean += delta * n_b / self._count
+            self._m2 += float(((chunk - mean_b) ** 2).sum()) + delta ** 2 * n_a * n_b / self._count
+        std = np.sqrt(self._m2 / self._count) if self._count > 1 else 0.0
+        if std > 0:
+            cents[voiced] = (cents[voiced] - self._mean) / std
+
+        indicator = np.zeros(len(times), dtype=np.float32)
+        if self._onset_carry and len(indicator):
+            indicator[0] = 1.0
+        self._onset_carry = False
+        for t in np.asarray(onsets, dtype=np.float64):
+            idx = int(np.searchsorted(times, t))
+            indicator[max(0, idx - 1):idx + 2] = 1.0
+            if idx + 1 >= len(indicator):
+                self._onset_carry = True
+        return np.column_stack([cents, indicator]).astype(np.float64)
+
+    def _step(self, feature: np.ndarray, t: float) -> None:
+        m = len(self._ref)
+        width = self._width
+        if self._n == 0:
+            lo = 0
+        else:
+            # 直前行の最良セル（symmetric2 の正規化コスト）の 1 つ先を中心にする
+            cols = self._prev_lo + np.arange(width)
+            norm = self._prev[1:width + 1] / (self._n + cols + 1)
+            center = self._prev_lo + int(np.argmin(norm)) + 1
+            lo = int(np.clip(center - self._radius, self._prev_lo, m - width))
+
+        cost = np.sqrt(((self._ref[lo:lo + width] - feature) ** 2).sum(axis=1))
+        cur, direction = dp_row(self._prev if self._n else None, lo - self._prev_lo, cost)
+
+        self._prev[1:width + 1] = cur
+        self._prev_lo = lo
+        self._rows.append((self._n, t, lo, direction, feature))
+        self._n += 1
+
+    def _emit_oldest(self) -> None:
+        """現在の最良セルから backtrack し、最も古い未確定行の対応位置を確定する。"""
+        width = self._width
+        cols = self._prev_lo + np.arange(width)
+        norm = self._prev[1:width + 1] / (self._n + cols + 1)
+        j = self._prev_lo + int(np.argmin(norm))
+
+        target = self._rows[0][0]
+        k = len(self._rows) - 1
+        while True:
+            frame, _, lo, direction, _ = self._rows[k]
+            step = direction[j - lo] if 0 <= j - lo < width else _DIAG
+            if step == _HORIZ and j > lo:
+                j -= 1          # 同じ行の中を左へ（その行で最初に現れるセルまで戻る）
+                continue
+            if frame == target:
+                break
+            if step == _DIAG:
+                j = max(j - 1, 0)
+            k -= 1
+
+        frame, t, _, _, feature = self._rows.popleft()
+        j = max(j, self._last_j)   # 確定済みの点より戻らない
+        self._last_j = j
+        self._index1.append(frame)
+        self._index2.append(j)
+        self._times.append(t)
+        self._costs.append(float(np.sqrt(((self._ref[j] - feature) ** 2).sum())))
+
+    def _points_since(self, start: int) -> np.ndarray:
+        new_t = np.asarray(self._times[start:], dtype=np.float32)
+        ref_t = self._ref_times[np.asarray(self._index2[start:], dtype=np.int64)]
+        return np.column_stack([new_t, ref_t]).astype(np.float32)
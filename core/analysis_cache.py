@@ -0,0 +1,291 @@
+"""
+analysis_cache.py — 解析結果（ボーカル分離・F0・オンセット・有声区間）のディスクキャッシュ
+
+同じリファレンスを何十テイクにも使う運用では、分離や F0 解析を毎回やり直す必要がない。
+エントリのキーは「音声データの内容ハッシュ + 解析名 + モデル名/バージョン + パラメータ」で、
+1 エントリ = 1 つの .npz として保存する。合計サイズが上限を超えたら最終アクセスの古い順に
+削除する（LRU）。
+
+保存先: 環境変数 LYRA_CACHE_DIR、なければ ~/.cache/lyra/analysis
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from importlib import metadata
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_MAX_BYTES = 4 * 1024 ** 3   # 4 GB
+
+
+def default_cache_dir() -> Path:
+    env = os.environ.get("LYRA_CACHE_DIR")
+    if env:
+        return Path(env)
+    return Path.home() / ".cache" / "lyra" / "analysis"
+
+
+def package_version(name: str) -> str:
+    """インストール済みパッケージのバージョン（import せずに取得）。不明なら "unknown"。"""
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def audio_digest(audio: np.ndarray, sr: int) -> str:
+    """音声データの内容ハッシュ（dtype・shape・サンプルレートを含む）。"""
+    data = np.ascontiguousarray(audio)
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{data.dtype.str}|{data.shape}|{sr}|".encode())
+    h.update(memoryview(data).cast("B"))
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """
+    解析結果のディスクキャッシュ。
+
+    使い方:
+        cache = AnalysisCache()
+        f0, times = cache.fetch("f0", audio, sr, lambda: estimate_f0(audio, sr),
+                                version="rmvpe:...", threshold=0.03)
+    """
+
+    def __init__(
+        self,
+        root: str | Path | None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.root = Path(root) if root else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # batch --jobs・lyra serve --workers・GUI の再実行でスレッドから同時に使われる
+        self._lock = threading.Lock()
+
+    # ---- キー -----------------------------------------------------------
+
+    def key(self, name: str, audio: np.ndarray, sr: int, version: str, **params) -> str:
+        payload = json.dumps(
+            {
+                "format": CACHE_FORMAT_VERSION,
+                "name": name,
+                "version": version,
+                "audio": audio_digest(audio, sr),
+                "params": params,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.npz"
+
+    # ---- 読み書き -------------------------------------------------------
+
+    def get(self, key: str) -> tuple[np.ndarray, ...] | None:
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = tuple(data[f"arr_{i}"] for i in range(len(data.files)))
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path)   # LRU 用に最終アクセス時刻を更新
+        except OSError:
+            pass   # 読み込んだ直後に別スレッド・別プロセスが削除した
+        return arrays
+
+    def put(self, key: str, arrays: tuple[np.ndarray, ...]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 一時ファイル名はスレッド・プロセスごとに一意にする（同じキーを同時に書いても衝突しない）
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{path.stem}.", suffix=".tmp.npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, *arrays)
+            os.replace(tmp, path)   # 途中で落ちても壊れたエントリを残さない
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        self.evict()
+
+    def fetch(
+        self,
+        name: str,
+        audio: np.ndarray,
+        sr: int,
+        compute: Callable[[], np.ndarray | tuple[np.ndarray, ...]],
+        version: str,
+        **params,
+    ):
+        """
+        キャッシュにあればそれを返し、なければ compute() を実行して保存する。
+
+        compute の返値が配列 1 つなら配列を、タプルならタプルを返す。
+        """
+        key = self.key(name, audio, sr, version, **params)
+        cached = self.get(key)
+        with self._lock:
+            if cached is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached is not None:
+            return cached[0] if len(cached) == 1 else cached
+
+        result = compute()
+        arrays = result if isinstance(result, tuple) else (result,)
+        self.put(key, tuple(np.asarray(a) for a in arrays))
+        return result
+
+    def fetch_many(
+        self,
+        name: str,
+        audios: list[np.ndarray],
+        sr: int,
+        compute_many: Callable[[list[np.ndarray]], list],
+        version: str,
+        **params,
+    ) -> list:
+        """
+        fetch の複数入力版。キャッシュにない入力だけをまとめて compute_many に渡す
+        （estimate_f0_batch のようなバッチ処理向け）。
+        """
+        keys = [self.key(name, a, sr, version, **params) for a in audios]
+        results: list = [self.get(k) for k in keys]
+        results = [r[0] if r is not None and len(r) == 1 else r for r in results]
+
+        missing = [i for i, r in enumerate(results) if r is None]
+        with self._lock:
+            self.hits += len(audios) - len(missing)
+            self.misses += len(missing)
+        if missing:
+            computed = compute_many([audios[i] for i in missing])
+            for i, result in zip(missing, computed):
+                arrays = result if isinstance(result, tuple) else (result,)
+                self.put(keys[i], tuple(np.asarray(a) for a in arrays))
+                results[i] = result
+        return results
+
+    # ---- 管理 -----------------------------------------------------------
+
+    def _entries(self) -> list[Path]:
+        if not self.root.exists():
+            return []
+        return [p for p in self.root.glob("*/*.npz") if not p.name.endswith(".tmp.npz")]
+
+    def _stats(self) -> list[tuple[Path, os.stat_result]]:
+        stats = []
+        for path in self._entries():
+            try:
+                stats.append((path, path.stat()))
+            except FileNotFoundError:
+                pass   # 列挙した後に別のプロセスが削除した
+        return stats
+
+    def size_bytes(self) -> int:
+        return sum(st.st_size for _, st in self._stats())
+
+    def evict(self) -> None:
+        """合計サイズが max_bytes 以下になるまで、最終アクセスの古いエントリから削除する。"""
+        with self._lock:
+            entries = self._stats()
+            total = sum(st.st_size for _, st in entries)
+            if total <= self.max_bytes:
+                return
+            for path, st in sorted(entries, key=lambda e: e[1].st_mtime):
+                path.unlink(missing_ok=True)
+                total -= st.st_size
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self) -> None:
+        for path in self._entries():
+            path.unlink(missing_ok=True)
+
+
+# ---- パイプライン用ラッパー -------------------------------------------------
+# cache=None のときは素の解析関数をそのまま呼ぶ。
+
+def cached_separate_vocal(
+    cache: AnalysisCache | None,
+    audio: np.ndarray,
+    sr: int,
+    model_name: str = "htdemucs",
+    profile: str = "standard",
+    num_workers: int = 0,
+    **overrides,
+) -> np.ndarray:
+    from core.separation.demucs_wrapper import separate_vocal, separation_params
+
+    def compute() -> np.ndarray:
+        return separate_vocal(audio, sr, model_name=model_name, profile=profile,
+                              num_workers=num_workers, **overrides)
+
+    if cache is None:
+        return compute()
+    return cache.fetch(
+        "separate_vocal", audio, sr, compute,
+        version=f"demucs-{package_version('demucs')}:{model_name}",
+        # プロファイル名ではなく実際のパラメータをキーにする（num_workers は結果に影響しない）
+        **separation_params(profile, **overrides),
+    )
+
+
+def cached_estimate_f0_batch(
+    cache: AnalysisCache | None,
+    audios: list[np.ndarray],
+    sr: int,
+    **kwargs,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    from core import runtime
+    from core.pitch.rmvpe_wrapper import estimate_f0_batch, model_id
+
+    if cache is None:
+        return estimate_f0_batch(audios, sr, **kwargs)
+    version = model_id(kwargs.get("model_path"))
+    profile = runtime.get_profile()
+    if profile.precision != "fp32":
+        version += f":{profile.precision}"   # bf16 / int8 の結果は fp32 と別のエントリにする
+    if profile.torchscript:
+        version += ":torchscript"
+    return cache.fetch_many(
+        "estimate_f0", audios, sr,
+        lambda missing: estimate_f0_batch(missing, sr, **kwargs),
+        version=version,
+        # バッチの大きさは結果に影響しないのでキーに含めない
+        **{k: v for k, v in kwargs.items() if k not in ("batch_size", "max_batch_seconds")},
+    )
+
+
+def cached_detect_onsets(cache: AnalysisCache | None, audio: np.ndarray, sr: int) -> np.ndarray:
+    from core.onset.onset_detector import detect_onsets
+
+    if cache is None:
+        return detect_onsets(audio, sr)
+    return cache.fetch(
+        "detect_onsets", audio, sr, lambda: detect_onsets(audio, sr),
+        version=f"librosa-{package_version('librosa')}",
+    )
+
+
+def cached_detect_voiced(cache: AnalysisCache | None, audio: np.ndarray, sr: int) -> np.ndarray:
+    from core.onset.voiced_detector import detect_voiced
+
+    if cache is None:
+        return detect_voiced(audio, sr)
+    return cache.fetch(
+        "detect_voiced", audio, sr, lambda: detect_voiced(audio, sr),
+        version=f"librosa-{package_version('librosa')}",
+    )
@@ -5,8 +5,8 @@ audio_io.py — WAV/AIFF の読み書きとサンプルレート正規化
 from pathlib import Path
 import numpy as np
 import soundfile as sf
-import torch
-import torchaudio
+
+from core.resample import resample, to_analysis
 
 SUPPORTED_EXTENSIONS = {".wav", ".aiff", ".aif", ".flac"}
 
@@ -39,14 +39,38 @@ def load(
         audio = audio.mean(axis=0, keepdims=True)    # (1, samples)
 
     if target_sr is not None and sr != target_sr:
-        tensor = torch.from_numpy(audio)
-        tensor = torchaudio.functional.resample(tensor, sr, target_sr)
-        audio = tensor.numpy()
+        audio = resample(audio, sr, target_sr)
         sr = target_sr
 
     return (audio[0], sr) if mono else (audio, sr)
 
 
+def load_with_analysis(
+    path: str | Path,
+    target_sr: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    モノラル音声を target_sr と F0 解析用 16kHz の 2 つのレートで読み込む。
+
+    どちらも元ファイルのサンプルレートから 1 回の変換で作る
+    （target_sr を経由して 16kHz に落とす二重変換をしない）。
+
+    Returns
+    -------
+    audio : np.ndarray
+        target_sr のモノラル音声 (samples,)
+    analysis : np.ndarray
+        ANALYSIS_SR (16kHz) のモノラル音声 (samples,)
+    """
+    native, sr = load(path)
+    return resample(native, sr, target_sr), to_analysis(native, sr)
+
+
+def duration(path: str | Path) -> float:
+    """音声ファイルの長さ（秒）をヘッダから取得する（サンプルは読み込まない）。"""
+    return sf.info(str(path)).duration
+
+
 def save(
     path: str | Path,
     audio: np.ndarray,
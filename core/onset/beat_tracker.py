@@ -6,20 +6,24 @@ onset/beat_tracker.py — beat_this によるニューラルビート追跡
 
 from __future__ import annotations
 
+import threading
+
 import numpy as np
 
 # モデルキャッシュ: device → Audio2Beats インスタンス
 _predictor_cache: dict[str, object] = {}
+_predictor_lock = threading.Lock()   # lyra serve のジョブが同時にロードしないように
 
 
 def _get_predictor(device: str) -> object:
     """キャッシュ済み Audio2Beats を返す。なければロードしてキャッシュする。"""
-    if device not in _predictor_cache:
-        from beat_this.inference import Audio2Beats
-        _predictor_cache[device] = Audio2Beats(
-            checkpoint_path="final0", device=device, dbn=False
-        )
-    return _predictor_cache[device]
+    with _predictor_lock:
+        if device not in _predictor_cache:
+            from beat_this.inference import Audio2Beats
+            _predictor_cache[device] = Audio2Beats(
+                checkpoint_path="final0", device=device, dbn=False
+            )
+        return _predictor_cache[device]
 
 
 def track_beats(audio: np.ndarray, sr: int) -> tuple[np.ndarray, np.ndarray]:
@@ -40,9 +44,10 @@ def track_beats(audio: np.ndarray, sr: int) -> tuple[np.ndarray, np.ndarray]:
     downbeat_times : np.ndarray
         ダウンビート時刻（秒）
     """
-    import torch
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    predictor = _get_predictor(device)
-    beat_times, downbeat_times = predictor(audio, sr)
+    from core import runtime
+
+    predictor = _get_predictor(runtime.resolve_device())
+    with runtime.inference():
+        beat_times, downbeat_times = predictor(audio, sr)
 
     return np.array(beat_times, dtype=np.float32), np.array(downbeat_times, dtype=np.float32)
@@ -8,14 +8,16 @@ from .spec import MelSpectrogram
 from .utils import to_local_average_f0, to_viterbi_f0
 
 class RMVPE:
-    def __init__(self, model_path, hop_length=160):
+    def __init__(self, model_path=None, hop_length=160, model=None):
+        # model を渡した場合（TorchScript など）はチェックポイントを読まずにそれを使う
         self.resample_kernel = {}
-        model = E2E0(4, 1, (2, 2))
-        ckpt = torch.load(model_path, map_location='cpu')
-        if isinstance(ckpt, dict) and 'model' in ckpt:
-            model.load_state_dict(ckpt['model'], strict=False)
-        else:
-            model.load_state_dict(ckpt, strict=False)
+        if model is None:
+            model = E2E0(4, 1, (2, 2))
+            ckpt = torch.load(model_path, map_location='cpu')
+            if isinstance(ckpt, dict) and 'model' in ckpt:
+                model.load_state_dict(ckpt['model'], strict=False)
+            else:
+                model.load_state_dict(ckpt, strict=False)
         model.eval()
         self.hop_length = hop_length
         self.seg_length = 32 * hop_length
@@ -26,7 +28,11 @@ class RMVPE:
     def mel2hidden(self, mel):
         with torch.no_grad():
             n_frames = mel.shape[-1]
-            mel = F.pad(mel, (0, 32 * ((n_frames - 1) // 32 + 1) - n_frames), mode='reflect')
+            pad = 32 * ((n_frames - 1) // 32 + 1) - n_frames
+            # チャンク推論の最終ウィンドウは overlap + 1 フレームまで短くなり得る。
+            # reflect はパディング幅が入力より短い必要があるので、その場合は replicate で埋める
+            mode = 'reflect' if pad < n_frames else 'replicate'
+            mel = F.pad(mel, (0, pad), mode=mode)
             hidden = self.model(mel)
             return hidden[:, :n_frames]
             
@@ -37,18 +43,23 @@ class RMVPE:
             f0 = to_local_average_f0(hidden, thred=thred)  
         return f0
 
+    def _resample(self, audio, sample_rate, device):
+        audio = torch.from_numpy(audio).float().unsqueeze(0).to(device)
+        if sample_rate == 16000:
+            return audio
+        key_str = str(sample_rate)
+        if key_str not in self.resample_kernel:
+            self.resample_kernel[key_str] = Resample(sample_rate, 16000, lowpass_filter_width=128)
+        self.resample_kernel[key_str] = self.resample_kernel[key_str].to(device)
+        return self.resample_kernel[key_str](audio)
+
     def infer_from_audio(self, audio, sample_rate=16000, device=None, thred=0.03, use_viterbi=False):
         if device is None:
             device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        audio = torch.from_numpy(audio).float().unsqueeze(0).to(device)
-        if sample_rate == 16000:
-            audio_res = audio
-        else:
-            key_str = str(sample_rate)
-            if key_str not in self.resample_kernel:
-                self.resample_kernel[key_str] = Resample(sample_rate, 16000, lowpass_filter_width=128)
-            self.resample_kernel[key_str] = self.resample_kernel[key_str].to(device)
-            audio_res = self.resample_kernel[key_str](audio)    
+        audio_res = self._resample(audio, sample_rate, device)
+        return self._infer_resampled(audio_res, device, thred, use_viterbi)
+
+    def _infer_resampled(self, audio_res, device, thred, use_viterbi):
         B, T = audio_res.shape
         n_frames = T // self.hop_length + 1 
         T1 = T + self.hop_length
@@ -60,4 +71,156 @@ class RMVPE:
         with torch.no_grad():
             hidden = self.model(mel)
         f0 = self.decode(hidden[:, :n_frames], thred=thred, use_viterbi=use_viterbi)
-        return f0
\ No newline at end of file
+        return f0
+
+    def _pad_for_windows(self, audio_res):
+        # 全体を center=True で STFT したときと同じフレーム位置になるよう、
+        # 先頭を一度だけ reflect パディングし、末尾は 0 で埋めておく。
+        # フレーム k は padded[:, k * hop_length:k * hop_length + WINDOW_LENGTH] に対応する
+        half = WINDOW_LENGTH // 2
+        head = audio_res[:, 1:half + 1].flip(-1)
+        head = F.pad(head, (half - head.shape[-1], 0))  # 入力が極端に短い場合は 0 で補う
+        return torch.cat([head, audio_res, audio_res.new_zeros((1, WINDOW_LENGTH))], dim=-1)
+
+    def infer_from_audio_chunked(self, audio, sample_rate=16000, device=None, thred=0.03,
+                                 use_viterbi=False, chunk_frames=3200, overlap_frames=100):
+        """
+        固定長ウィンドウ（chunk_frames フレーム）をオーバーラップさせながら推論し、
+        重なり区間の salience (hidden) を線形クロスフェードしてから decode する。
+
+        DeepUnet0 / BiGRU の中間テンソルはウィンドウ長に比例するため、
+        入力の長さに関係なくピークメモリが一定に収まる。
+        use_viterbi=False のときは確定した区間から順に decode し、hidden 全体も保持しない。
+        """
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        chunk_frames = 32 * max(1, chunk_frames // 32)
+        overlap_frames = max(1, min(overlap_frames, chunk_frames // 2))
+
+        audio_res = self._resample(audio, sample_rate, device)
+        T = audio_res.shape[-1]
+        n_frames = T // self.hop_length + 1
+        if n_frames <= chunk_frames:
+            return self._infer_resampled(audio_res, device, thred, use_viterbi)
+
+        mel_extractor = self.mel_extractor.to(device)
+        self.model = self.model.to(device)
+
+        padded = self._pad_for_windows(audio_res)
+
+        ramp = (torch.arange(overlap_frames, device=device, dtype=torch.float32) + 0.5) / overlap_frames
+        ramp = ramp[None, :, None]  # [1, overlap, 1]
+
+        step = chunk_frames - overlap_frames
+        f0_parts, hidden_parts = [], []
+        prev_tail = None
+        for start in range(0, n_frames, step):
+            end = min(start + chunk_frames, n_frames)
+            window = padded[:, start * self.hop_length:(end - 1) * self.hop_length + WINDOW_LENGTH]
+            mel = mel_extractor(window, center=False)
+            hidden = self.mel2hidden(mel)  # [1, end - start, N_CLASS]
+            if prev_tail is not None:
+                hidden[:, :overlap_frames] = prev_tail * (1 - ramp) + hidden[:, :overlap_frames] * ramp
+            if end == n_frames:
+                body, prev_tail = hidden, None
+            else:
+                body, prev_tail = hidden[:, :-overlap_frames], hidden[:, -overlap_frames:]
+            if use_viterbi:
+                hidden_parts.append(body)
+            else:
+                f0_parts.append(self.decode(body, thred=thred))
+            if end == n_frames:
+                break
+
+        if use_viterbi:
+            return self.decode(torch.cat(hidden_parts, dim=1), thred=thred, use_viterbi=True)
+        return np.concatenate(f0_parts)
+
+    def infer_batch(self, audios, sample_rate=16000, device=None, thred=0.03, use_viterbi=False,
+                    chunk_frames=3200, overlap_frames=100, batch_size=8, max_batch_frames=None):
+        """
+        複数の音声をまとめて推論し、ファイルごとの F0 のリストを返す。
+
+        各ファイルを chunk_frames 以下のウィンドウに分割し、32 の倍数に切り上げた長さごとに
+        バケットしてパディングする。バケット内のウィンドウは 1 回の forward にまとめるが、
+        その数は batch_size 個まで、かつ合計フレーム数が max_batch_frames（既定は
+        batch_size * chunk_frames、つまり batch_size ウィンドウ分）以下になるように制限する。
+        ピークメモリは入力の本数・長さではなく max_batch_frames で決まる。
+
+        メルはバッチごとに作り、forward の出力はウィンドウの重なり区間だけを保持する
+        （重なり以外は use_viterbi=False ならその場で decode する）。重なり区間は
+        infer_from_audio_chunked と同じくクロスフェードして結合する。
+        """
+        if device is None:
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        chunk_frames = 32 * max(1, chunk_frames // 32)
+        overlap_frames = max(1, min(overlap_frames, chunk_frames // 2))
+        max_batch_frames = max_batch_frames or batch_size * chunk_frames
+        step = chunk_frames - overlap_frames
+
+        mel_extractor = self.mel_extractor.to(device)
+        self.model = self.model.to(device)
+
+        # ---- ウィンドウ分割（メルはまだ作らない） ----
+        padded_audios, file_frames = [], []
+        windows = []   # (file_idx, start, end)
+        for file_idx, audio in enumerate(audios):
+            audio_res = self._resample(audio, sample_rate, device)
+            n_frames = audio_res.shape[-1] // self.hop_length + 1
+            file_frames.append(n_frames)
+            padded_audios.append(self._pad_for_windows(audio_res))
+            for start in range(0, n_frames, step):
+                end = min(start + chunk_frames, n_frames)
+                windows.append((file_idx, start, end))
+                if end == n_frames:
+                    break
+
+        # ---- 長さでバケットしてバッチ推論 ----
+        buckets = {}
+        for win_idx, (_, start, end) in enumerate(windows):
+            buckets.setdefault(32 * ((end - start - 1) // 32 + 1), []).append(win_idx)
+
+        # ウィンドウごとに (先頭の重なり, 本体, 末尾の重なり) を保持する。
+        # 本体は use_viterbi=False なら decode 済みの F0、True なら hidden
+        heads, bodies, tails = {}, {}, {}
+        for length, members in buckets.items():
+            n_batch = max(1, min(batch_size, max_batch_frames // length))
+            for b in range(0, len(members), n_batch):
+                batch = members[b:b + n_batch]
+                mels = []
+                for win_idx in batch:
+                    file_idx, start, end = windows[win_idx]
+                    window = padded_audios[file_idx][
+                        :, start * self.hop_length:(end - 1) * self.hop_length + WINDOW_LENGTH]
+                    mel = mel_extractor(window, center=False)
+                    pad = length - mel.shape[-1]
+                    mode = 'reflect' if pad < mel.shape[-1] else 'replicate'
+                    mels.append(F.pad(mel, (0, pad), mode=mode) if pad else mel)
+                with torch.no_grad():
+                    out = self.model(torch.cat(mels, dim=0))
+                del mels
+                for k, win_idx in enumerate(batch):
+                    file_idx, start, end = windows[win_idx]
+                    hidden = out[k:k + 1, :end - start]
+                    head = overlap_frames if start > 0 else 0
+                    tail = overlap_frames if end < file_frames[file_idx] else 0
+                    heads[win_idx] = hidden[:, :head].clone()
+                    tails[win_idx] = hidden[:, hidden.shape[1] - tail:].clone()
+                    body = hidden[:, head:hidden.shape[1] - tail]
+                    bodies[win_idx] = body.clone() if use_viterbi else self.decode(body, thred=thred)
+                del out
+
+        # ---- ファイルごとに結合 + decode ----
+        ramp = (torch.arange(overlap_frames, device=device, dtype=torch.float32) + 0.5) / overlap_frames
+        ramp = ramp[None, :, None]
+
+        results = [[] for _ in audios]
+        for win_idx, (file_idx, start, end) in enumerate(windows):
+            if start > 0:
+                blend = tails.pop(win_idx - 1) * (1 - ramp) + heads[win_idx] * ramp
+                results[file_idx].append(blend if use_viterbi else self.decode(blend, thred=thred))
+            results[file_idx].append(bodies.pop(win_idx))
+
+        if use_viterbi:
+            return [self.decode(torch.cat(parts, dim=1), thred=thred, use_viterbi=True) for parts in results]
+        return [np.concatenate(parts) for parts in results]
@@ -1,6 +1,5 @@
 import sys
 import numpy as np
-import librosa
 import torch
 from functools import reduce
 from .constants import *
@@ -80,28 +79,100 @@ def to_local_average_cents(salience, center=None, thred=0.03):
         weight_sum = np.sum(salience)
         return product_sum / weight_sum if np.max(salience) > thred else 0
     if salience.ndim == 2:
-        return np.array([to_local_average_cents(salience[i, :], None, thred) for i in
-                         range(salience.shape[0])])
+        # 全フレームをまとめて処理する（center は None か、フレームごとの中心ビン (T,)）
+        if center is None:
+            center = np.argmax(salience, axis=1)
+        center = np.asarray(center, dtype=np.int64)[:, None]                 # [T, 1]
+        idx = np.arange(salience.shape[1])[None, :]                          # [1, N]
+        window = (idx >= center - 4) & (idx < center + 5)                    # [T, N]
+        weights = np.where(window, salience, 0)
+        product_sum = np.sum(weights * to_local_average_cents.cents_mapping[:salience.shape[1]], axis=1)
+        weight_sum = np.sum(weights, axis=1)
+        voiced = np.max(weights, axis=1, initial=-np.inf, where=window) > thred
+        return np.where(voiced, product_sum / np.where(voiced, weight_sum, 1), 0)
 
     raise Exception("label should be either 1d or 2d ndarray")
-    
-def to_viterbi_cents(salience, thred=0.03):
-    # Create viterbi transition matrix
-    if not hasattr(to_viterbi_cents, 'transition'):
-        xx, yy = np.meshgrid(range(N_CLASS), range(N_CLASS))
-        transition = np.maximum(30 - abs(xx - yy), 0)
-        transition = transition / transition.sum(axis=1, keepdims=True)
-        to_viterbi_cents.transition = transition
 
+
+VITERBI_WIDTH = 29   # 遷移確率 max(30 - |i - j|, 0) が 0 でないビン差の上限
+VITERBI_PTR_CHUNK = 256   # バックポインタをデバイスから CPU に移すフレーム数
+_viterbi_band = {}   # device → (src, log_trans)
+
+
+def _band_transition(device):
+    """
+    遷移行列の帯部分を [N, 2W+1] で返す（行 j は遷移先、列 k は遷移元 j + k - W）。
+
+    遷移行列 max(30 - |i - j|, 0) を行（遷移元）ごとに正規化したものと同じ値で、
+    librosa.sequence.viterbi と同じく tiny を足してから log を取る。範囲外の遷移元は -inf。
+    """
+    key = str(device)
+    if key not in _viterbi_band:
+        d = torch.arange(-VITERBI_WIDTH, VITERBI_WIDTH + 1, device=device)
+        weight = (VITERBI_WIDTH + 1 - d.abs()).double()                      # [2W+1]
+        src = torch.arange(N_CLASS, device=device)[:, None] + d[None, :]     # [N, 2W+1]
+        valid = (src >= 0) & (src < N_CLASS)
+        src = src.clamp(0, N_CLASS - 1)
+        # 遷移元 i の行和 = 帯のうち i + d が範囲内のものの重みの合計
+        row_sum = (valid * weight).sum(dim=1)                                # 遷移元 i = 行 i
+        trans = weight[None, :] / row_sum[src]
+        log_trans = torch.log(trans + np.finfo(np.float32).tiny)
+        log_trans = log_trans.masked_fill(~valid, -np.inf)
+        _viterbi_band[key] = (src, log_trans)
+    return _viterbi_band[key]
+
+
+def viterbi_band(prob):
+    """
+    帯行列の遷移で Viterbi 復号し、各フレームのビン [T] を返す。
+
+    prob は [T, N] の各フレームを確率に正規化した salience（torch.Tensor, float32）。
+    librosa.sequence.viterbi(prob.T, transition) と同じ経路を返す。librosa では帯の外の遷移も
+    log(tiny) の値を持つため、帯の外からの候補は「前フレームの最大値 + log(tiny)」1 つで代表させる
+    （帯の外で最大になるのはこの値だけ）。1 フレームの計算量は N×N ではなく N×(2W+1)。
+
+    バックポインタ [T, N] はビン番号（N 未満）なので int16 で CPU に置き、デバイス上には
+    VITERBI_PTR_CHUNK フレーム分のバッファだけを持つ。
+    """
+    device = prob.device
+    src, log_trans = _band_transition(device)
+    eps = np.finfo(np.float32).tiny
+    floor = float(np.log(eps))                                               # 帯の外の log 遷移確率
+    n_frames = prob.shape[0]
+    dest = torch.arange(N_CLASS, device=device)
+
+    log_prob = torch.log(prob + eps).double()
+    value = log_prob[0] + float(np.log(1.0 / N_CLASS + eps))
+    ptr = np.zeros((n_frames, N_CLASS), dtype=np.int16)
+    buf = torch.zeros((VITERBI_PTR_CHUNK, N_CLASS), dtype=torch.int16, device=device)
+    for t in range(1, n_frames):
+        best, arg = (value[src] + log_trans).max(dim=1)
+        arg = src.gather(1, arg[:, None])[:, 0]
+        # 帯の外の遷移元 k（前フレームで最大の状態）からの候補。同値なら番号の小さい方
+        k = torch.argmax(value)
+        far = value[k] + floor
+        use_far = ((far > best) | ((far == best) & (k < arg))) & ((k - dest).abs() > VITERBI_WIDTH)
+        best = torch.where(use_far, far, best)
+        buf[t % VITERBI_PTR_CHUNK] = torch.where(use_far, k, arg)
+        value = log_prob[t] + best
+        if (t + 1) % VITERBI_PTR_CHUNK == 0 or t == n_frames - 1:
+            lo = t - t % VITERBI_PTR_CHUNK
+            ptr[lo:t + 1] = buf[:t + 1 - lo].cpu().numpy()
+    path = np.zeros(n_frames, dtype=np.int64)
+    path[-1] = int(torch.argmax(value))
+    for t in range(n_frames - 1, 0, -1):
+        path[t - 1] = ptr[t, path[t]]
+    return path
+
+
+def to_viterbi_cents(salience, thred=0.03):
     # Convert to probability
-    prob = salience.T
-    prob = prob / prob.sum(axis=0)    
+    prob = salience / salience.sum(axis=1, keepdims=True)
 
     # Perform viterbi decoding
-    path = librosa.sequence.viterbi(prob, to_viterbi_cents.transition).astype(np.int64)
+    path = viterbi_band(torch.from_numpy(np.ascontiguousarray(prob, dtype=np.float32)))
 
-    return np.array([to_local_average_cents(salience[i, :], path[i], thred) for i in
-                     range(len(path))])
+    return to_local_average_cents(salience, path, thred)
 
 def to_local_average_f0(hidden, center=None, thred=0.03):
     idx = torch.arange(N_CLASS, device=hidden.device)[None, None, :]  # [B=1, T=1, N]
@@ -121,22 +192,12 @@ def to_local_average_f0(hidden, center=None, thred=0.03):
     return f0.squeeze(0).cpu().numpy()
 
 def to_viterbi_f0(hidden, thred=0.03):
-    # Create viterbi transition matrix
-    if not hasattr(to_viterbi_cents, 'transition'):
-        xx, yy = np.meshgrid(range(N_CLASS), range(N_CLASS))
-        transition = np.maximum(30 - abs(xx - yy), 0)
-        transition = transition / transition.sum(axis=1, keepdims=True)
-        to_viterbi_cents.transition = transition
-    
-    # Convert to probability
-    prob = hidden.squeeze(0).cpu().numpy()
-    prob = prob.T
-    prob = prob / prob.sum(axis=0) 
-    
+    # Convert to probability（デバイス上のまま復号する）
+    prob = hidden.squeeze(0)
+    prob = prob / prob.sum(dim=1, keepdim=True)
+
     # Perform viterbi decoding
-    path = librosa.sequence.viterbi(prob, to_viterbi_cents.transition).astype(np.int64)
+    path = viterbi_band(prob.float())
     center = torch.from_numpy(path).unsqueeze(0).unsqueeze(-1).to(hidden.device)
-    
+
     return to_local_average_f0(hidden, center=center, thred=thred)
-    
-        
\ No newline at end of file
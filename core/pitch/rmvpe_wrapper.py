@@ -3,14 +3,22 @@ pitch/rmvpe_wrapper.py — RMVPE による F0 推定（第一候補）
 
 ソース: yxlllc/RMVPE (core/pitch/rmvpe_src/ にベンダリング)
 モデル: models/rmvpe.pt — scripts/download_models.py で取得
+
+scripts/download_models.py --prepare はネットワークを TorchScript（trace + freeze）に書き出す
+（models/rmvpe.ts.pt、--quantize で int8 の models/rmvpe.int8.ts.pt も）。
+core.runtime の torchscript を有効にすると _get_model はチェックポイントの代わりにこれを読み込む。
 """
 
 from __future__ import annotations
 
 import sys
+import threading
+import warnings
 from pathlib import Path
 import numpy as np
-import torch
+
+from core import runtime
+from core.resample import ANALYSIS_SR, to_analysis
 
 # ベンダリングした RMVPE ソースへのパス（モジュールロード時に一度だけ設定）
 _SRC_DIR = Path(__file__).parent / "rmvpe_src"
@@ -20,19 +28,175 @@ if str(_SRC_DIR) not in sys.path:
     sys.path.insert(0, str(_SRC_DIR))
 
 HOP_LENGTH = 160   # 16kHz で 10ms/frame
-RMVPE_SR = 16000
+RMVPE_SR = ANALYSIS_SR
+DEFAULT_CHUNK_SECONDS = 32.0    # チャンク推論のウィンドウ長（秒）
+DEFAULT_OVERLAP_SECONDS = 1.0   # 隣接ウィンドウの重なり（秒）
+TRACE_FRAMES = 128              # TorchScript の trace に使うメルフレーム数（32 の倍数）
+CHECK_FREQS = (110.0, 220.0, 440.0, 880.0)   # check_torchscript の合成音の基本周波数
+CHECK_MAX_CENTS = 10.0          # check_torchscript の合格基準（有声フレームの 99%点誤差）
+CHECK_MIN_VOICING = 0.99        # check_torchscript の合格基準（有声/無声判定の一致率）
 
-# モデルキャッシュ: (model_path_str, device) → RMVPE インスタンス
-_model_cache: dict[tuple[str, str], object] = {}
+# モデルキャッシュ: (model_path_str, device, precision, torchscript) → RMVPE インスタンス
+_model_cache: dict[tuple[str, str, str, bool], object] = {}
+_model_lock = threading.Lock()   # core.warmup のバックグラウンドロードと二重に読まないようにする
 
 
 def _get_model(path: Path, device: str) -> object:
-    """キャッシュ済みモデルを返す。なければロードしてキャッシュする。"""
-    key = (str(path), device)
-    if key not in _model_cache:
-        from src.inference import RMVPE
-        _model_cache[key] = RMVPE(model_path=str(path), hop_length=HOP_LENGTH)
-    return _model_cache[key]
+    """
+    キャッシュ済みモデルを返す。なければロードしてキャッシュする。
+
+    ネットワーク（DeepUnet + BiGRU）は core.runtime の precision（bf16 / int8）に合わせて変換する。
+    runtime の torchscript が有効な場合は書き出し済みの TorchScript を読み込む
+    （int8 は CPU のときだけ量子化版を使う）。
+    """
+    profile = runtime.get_profile()
+    key = (str(path), device, profile.precision, profile.torchscript)
+    with _model_lock:
+        if key not in _model_cache:
+            from src.inference import RMVPE
+            if profile.torchscript:
+                quantized = profile.precision == "int8" and device == "cpu"
+                network = _load_torchscript(torchscript_path(path, quantized), device)
+                if not quantized:
+                    network = runtime.prepare_model(network, device)
+                model = RMVPE(hop_length=HOP_LENGTH, model=network)
+            else:
+                model = RMVPE(model_path=str(path), hop_length=HOP_LENGTH)
+                model.model = runtime.prepare_model(model.model, device)
+            _model_cache[key] = model
+        return _model_cache[key]
+
+
+def _resolve_model_path(model_path: str | Path | None) -> Path:
+    """モデルパスを解決し、存在しなければ FileNotFoundError を送出する。"""
+    path = Path(model_path) if model_path else _DEFAULT_MODEL_PATH
+    if not path.exists():
+        raise FileNotFoundError(
+            f"RMVPE モデルが見つかりません: {path}\n"
+            "  → python scripts/download_models.py を実行してください"
+        )
+    return path
+
+
+def model_id(model_path: str | Path | None = None) -> str:
+    """
+    モデルファイルを識別する文字列（解析キャッシュのキー用）。
+
+    重みを読まずにファイル名・サイズ・更新時刻から作るので、モデルを差し替えると値が変わる。
+    """
+    path = _resolve_model_path(model_path)
+    st = path.stat()
+    return f"rmvpe:{path.name}:{st.st_size}:{int(st.st_mtime)}"
+
+
+def torchscript_path(model_path: str | Path | None = None, quantized: bool = False) -> Path:
+    """
+    チェックポイントに対応する TorchScript の保存先（rmvpe.pt → rmvpe.ts.pt / rmvpe.int8.ts.pt）。
+    """
+    path = Path(model_path) if model_path else _DEFAULT_MODEL_PATH
+    return path.with_name(f"{path.stem}{'.int8' if quantized else ''}.ts.pt")
+
+
+def _load_torchscript(path: Path, device: str) -> object:
+    import torch
+
+    if not path.exists():
+        raise FileNotFoundError(
+            f"RMVPE の TorchScript が見つかりません: {path}\n"
+            "  → python scripts/download_models.py --prepare を実行してください"
+        )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)   # torch.jit の非推奨警告
+        network = torch.jit.load(str(path), map_location=device)
+        if device == "cpu":
+            network = torch.jit.optimize_for_inference(network)   # Conv + BatchNorm の畳み込みなど
+    return network
+
+
+def export_torchscript(model_path: str | Path | None = None, quantize: bool = False) -> Path:
+    """
+    チェックポイントのネットワークを TorchScript（trace + freeze）に書き出す。
+
+    Parameters
+    ----------
+    model_path : str | Path | None
+        チェックポイントのパス。None の場合は models/rmvpe.pt。
+    quantize : bool
+        True の場合、BiGRU と全結合層を int8 に動的量子化してから書き出す（CPU 推論用）。
+
+    Returns
+    -------
+    Path
+        書き出した TorchScript のパス（torchscript_path と同じ）
+    """
+    import torch
+    from src.constants import N_MELS
+    from src.inference import RMVPE
+
+    path = _resolve_model_path(model_path)
+    network = RMVPE(model_path=str(path), hop_length=HOP_LENGTH).model
+    if quantize:
+        network = runtime.quantize_dynamic(network)
+
+    # メルフレーム数とバッチ数は可変のまま trace できる（形状に依存する分岐がない）
+    example = torch.zeros(1, N_MELS, TRACE_FRAMES)
+    out = torchscript_path(path, quantize)
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)   # torch.jit の非推奨警告
+        # GRU の重み確認の警告（結果に影響しない）
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        scripted = torch.jit.freeze(torch.jit.trace(network, example, check_trace=False))
+        torch.jit.save(scripted, str(out))
+    return out
+
+
+def check_torchscript(model_path: str | Path | None = None, quantized: bool = False) -> dict:
+    """
+    書き出した TorchScript の F0 を fp32 のチェックポイントと合成音で比べる。
+
+    CHECK_FREQS の各周波数のビブラート付きサイン波（2 秒）を CPU で推論し、
+    両方で有声のフレームの誤差（セント）と、有声/無声判定の一致率を返す。
+
+    Returns
+    -------
+    dict
+        max_cents / p99_cents / voicing_agreement と、基準を満たすかどうかの passed
+    """
+    from src.inference import RMVPE
+
+    path = _resolve_model_path(model_path)
+    reference = RMVPE(model_path=str(path), hop_length=HOP_LENGTH)
+    candidate = RMVPE(
+        hop_length=HOP_LENGTH,
+        model=_load_torchscript(torchscript_path(path, quantized), "cpu"),
+    )
+
+    t = np.arange(2 * RMVPE_SR) / RMVPE_SR
+    cents, agree = [], []
+    with runtime.inference():
+        for freq in CHECK_FREQS:
+            phase = 2 * np.pi * freq * (t - 0.03 / (2 * np.pi * 5.0) * np.cos(2 * np.pi * 5.0 * t))
+            tone = (0.5 * np.sin(phase)).astype(np.float32)
+            f0_ref = reference.infer_from_audio(tone, RMVPE_SR, device="cpu")
+            f0_new = candidate.infer_from_audio(tone, RMVPE_SR, device="cpu")
+            voiced = (f0_ref > 0) & (f0_new > 0)
+            cents.append(np.abs(1200.0 * np.log2(f0_new[voiced] / f0_ref[voiced])))
+            agree.append((f0_ref > 0) == (f0_new > 0))
+
+    cents = np.concatenate(cents)
+    p99 = float(np.percentile(cents, 99)) if len(cents) else 0.0
+    voicing = float(np.concatenate(agree).mean())
+    return {
+        "max_cents": float(cents.max()) if len(cents) else 0.0,
+        "p99_cents": p99,
+        "voicing_agreement": voicing,
+        "passed": p99 <= CHECK_MAX_CENTS and voicing >= CHECK_MIN_VOICING,
+    }
+
+
+def _frame_times(n_frames: int) -> np.ndarray:
+    frame_period = HOP_LENGTH / RMVPE_SR  # 秒/フレーム
+    return np.arange(n_frames, dtype=np.float32) * frame_period
 
 
 def estimate_f0(
@@ -40,20 +204,34 @@ def estimate_f0(
     sr: int,
     threshold: float = 0.03,
     model_path: str | Path | None = None,
+    chunk_seconds: float | None = DEFAULT_CHUNK_SECONDS,
+    overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+    use_viterbi: bool = False,
 ) -> tuple[np.ndarray, np.ndarray]:
     """
     RMVPE で F0 カーブを推定する。
 
+    長い入力は chunk_seconds ごとのウィンドウに分けて推論し、
+    重なり区間の salience をクロスフェードして結合する（ピークメモリは入力長に依存しない）。
+
     Parameters
     ----------
     audio : np.ndarray
         モノラル音声 (samples,) — サンプルレートは任意
     sr : int
-        入力サンプルレート（RMVPE 内部で 16kHz にリサンプル）
+        入力サンプルレート（16kHz 以外は core.resample の共有カーネルで変換する。
+        load_with_analysis の 16kHz 信号を渡せば変換しない）
     threshold : float
         有声判定の閾値
     model_path : str | Path | None
         モデルファイルのパス。None の場合は models/rmvpe.pt を使用。
+    chunk_seconds : float | None
+        チャンク推論のウィンドウ長（秒）。None の場合は全体を一括で推論する。
+    overlap_seconds : float
+        隣接ウィンドウの重なり（秒）。この区間の salience をクロスフェードする。
+    use_viterbi : bool
+        True の場合、フレームごとの argmax ではなく Viterbi 復号でビンの経路を決める
+        （オクターブ跳びなどの単発の誤検出が減る。遷移は ±29 ビンの帯行列で計算する）。
 
     Returns
     -------
@@ -62,21 +240,85 @@ def estimate_f0(
     times : np.ndarray
         各フレームの時刻（秒）、shape (frames,)。
     """
-    path = Path(model_path) if model_path else _DEFAULT_MODEL_PATH
-    if not path.exists():
-        raise FileNotFoundError(
-            f"RMVPE モデルが見つかりません: {path}\n"
-            "  → python scripts/download_models.py を実行してください"
-        )
-
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    model = _get_model(path, device)
+    device = runtime.resolve_device()
+    model = _get_model(_resolve_model_path(model_path), device)
 
-    audio_f32 = audio.astype(np.float32)
-    f0 = model.infer_from_audio(audio_f32, sample_rate=sr, device=device, thred=threshold)
+    # 16kHz への変換は共有リサンプラで行う（RMVPE 内部のリサンプルは通らない）
+    audio_16k = to_analysis(audio, sr)
+    with runtime.inference():
+        if chunk_seconds is None:
+            f0 = model.infer_from_audio(
+                audio_16k, sample_rate=RMVPE_SR, device=device, thred=threshold,
+                use_viterbi=use_viterbi,
+            )
+        else:
+            frames_per_sec = RMVPE_SR / HOP_LENGTH
+            f0 = model.infer_from_audio_chunked(
+                audio_16k, sample_rate=RMVPE_SR, device=device, thred=threshold,
+                use_viterbi=use_viterbi,
+                chunk_frames=int(chunk_seconds * frames_per_sec),
+                overlap_frames=int(overlap_seconds * frames_per_sec),
+            )
     # f0 shape: (frames,), Hz, 0 = unvoiced
 
-    frame_period = HOP_LENGTH / RMVPE_SR  # 秒/フレーム
-    times = np.arange(len(f0), dtype=np.float32) * frame_period
+    return f0.astype(np.float32), _frame_times(len(f0))
+
+
+def estimate_f0_batch(
+    audios: list[np.ndarray],
+    sr: int,
+    threshold: float = 0.03,
+    model_path: str | Path | None = None,
+    chunk_seconds: float = DEFAULT_CHUNK_SECONDS,
+    overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+    batch_size: int = 8,
+    use_viterbi: bool = False,
+    max_batch_seconds: float | None = None,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    複数の音声の F0 カーブをまとめて推論する。
+
+    各音声を chunk_seconds 以下のウィンドウに分割し、長さの揃ったウィンドウを
+    1 回の forward にまとめる（短いテイクが多いときは estimate_f0 を呼ぶより
+    forward 回数が大幅に減る）。1 回の forward の合計長は max_batch_seconds までなので、
+    ピークメモリは入力の長さ・本数に依存しない。
+    結果はファイルごとに分割して返す。
 
-    return f0.astype(np.float32), times
+    Parameters
+    ----------
+    audios : list[np.ndarray]
+        モノラル音声 (samples,) のリスト。長さは揃っていなくてよい。
+    sr : int
+        入力サンプルレート（全音声で共通）
+    threshold, model_path, chunk_seconds, overlap_seconds, use_viterbi
+        estimate_f0 と同じ
+    batch_size : int
+        1 回の forward にまとめるウィンドウ数の上限
+    max_batch_seconds : float | None
+        1 回の forward にまとめるウィンドウの合計長（秒）。None はランタイムプロファイルの
+        f0_batch_seconds、それも 0 なら batch_size * chunk_seconds
+
+    Returns
+    -------
+    list[tuple[np.ndarray, np.ndarray]]
+        audios と同じ順の (f0, times) のリスト
+    """
+    if not audios:
+        return []
+
+    device = runtime.resolve_device()
+    model = _get_model(_resolve_model_path(model_path), device)
+    if max_batch_seconds is None:
+        max_batch_seconds = runtime.get_profile().f0_batch_seconds
+
+    frames_per_sec = RMVPE_SR / HOP_LENGTH
+    audios_16k = [to_analysis(a, sr) for a in audios]
+    with runtime.inference():
+        f0_list = model.infer_batch(
+            audios_16k, sample_rate=RMVPE_SR, device=device, thred=threshold,
+            chunk_frames=int(chunk_seconds * frames_per_sec),
+            overlap_frames=int(overlap_seconds * frames_per_sec),
+            batch_size=batch_size, use_viterbi=use_viterbi,
+            max_batch_frames=int(max_batch_seconds * frames_per_sec) if max_batch_seconds else None,
+        )
+    return [(f0.astype(np.float32), _frame_times(len(f0))) for f0 in f0_list]
@@ -9,9 +9,11 @@ from __future__ import annotations
 
 import numpy as np
 import torch
-import torchaudio
 
-CREPE_SR = 16000
+from core import runtime
+from core.resample import ANALYSIS_SR, resample
+
+CREPE_SR = ANALYSIS_SR
 HOP_LENGTH = 160
 
 
@@ -45,30 +47,24 @@ def estimate_f0(
     """
     import torchcrepe
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-
-    if sr != CREPE_SR:
-        tensor = torch.from_numpy(audio).float().unsqueeze(0)
-        tensor = torchaudio.functional.resample(tensor, sr, CREPE_SR)
-        audio_tensor = tensor
-    else:
-        audio_tensor = torch.from_numpy(audio).float().unsqueeze(0)
-
-    audio_tensor = audio_tensor.to(device)
-
-    frequency, confidence = torchcrepe.predict(
-        audio_tensor,
-        CREPE_SR,
-        hop_length=HOP_LENGTH,
-        fmin=fmin,
-        fmax=fmax,
-        model=model_capacity,
-        return_periodicity=True,
-        device=device,
-    )
-
-    # 有声判定: メディアンフィルタ後の periodicity > 0.1
-    voiced = torchcrepe.filter.median(confidence, 3) > 0.1
+    device = runtime.resolve_device()
+
+    audio_tensor = torch.from_numpy(resample(audio, sr, CREPE_SR)).unsqueeze(0).to(device)
+
+    with runtime.inference():
+        frequency, confidence = torchcrepe.predict(
+            audio_tensor,
+            CREPE_SR,
+            hop_length=HOP_LENGTH,
+            fmin=fmin,
+            fmax=fmax,
+            model=model_capacity,
+            return_periodicity=True,
+            device=device,
+        )
+
+        # 有声判定: メディアンフィルタ後の periodicity > 0.1
+        voiced = torchcrepe.filter.median(confidence, 3) > 0.1
 
     f0 = frequency.squeeze(0).cpu().numpy().astype(np.float32)
     voiced_mask = voiced.squeeze(0).cpu().numpy()
@@ -1,5 +1,16 @@
 """
 recipe/generator.py — アライメント結果から recipe.json を生成する
+
+セグメント境界は np.searchsorted でフレーム・ワープ点のインデックスに変換し、
+区間ごとの平均は np.bincount でまとめて求める。目標ピッチはワープマップ全体を通した
+1 回の np.interp でリファレンス F0 を新規ボーカルの時間軸に写して作る。
+セグメントごとの処理はスライスの切り出しだけで、全体の計算量は O(frames + segments)。
+
+segmentation="adaptive" では、MIN_SILENCE_SEC 以上続く無声区間をパススルーセグメント
+（レンダラが DSP を通さずコピーする）として切り出す。パススルーセグメントのワープ点は
+区間の両端をワープマップで写したもので、レンダラは無声区間を足す・削ることでその長さに
+合わせる（無声区間をまたぐタイミング補正を落とさない）。残りのフレーズのうち
+MAX_PHRASE_SEC を超えるものは、SEGMENT_DURATION ごとの位置に最も近いオンセットで分割する。
 """
 
 from __future__ import annotations
@@ -12,6 +23,11 @@ _DEFAULT_CONFIDENCE_LOW = 0.5
 _DEFAULT_CONFIDENCE_HIGH = 0.8
 SEGMENT_DURATION = 2.0   # セグメント長（秒）
 MAX_WARP_POINTS = 20     # セグメントあたりの最大ワープ点数
+SEGMENTATION_MODES = ("fixed", "adaptive")
+MIN_SILENCE_SEC = 0.3    # adaptive: これ以上続く無声区間をパススルーにする
+SILENCE_PAD_SEC = 0.05   # adaptive: フレーズの立ち上がり・余韻を削らないよう無声区間を縮める幅
+MAX_PHRASE_SEC = 4.0     # adaptive: これより長いフレーズは分割する
+ONSET_SNAP_SEC = 0.5     # adaptive: 分割位置をオンセットに寄せる最大距離
 
 
 def _strength_from_confidence(
@@ -35,16 +51,93 @@ def _strength_from_confidence(
         return 0.0, 0.1
 
 
-def _subsample(points: list, max_n: int) -> list:
+def _subsample(points: np.ndarray, max_n: int) -> np.ndarray:
     """等間隔にサブサンプリングする。"""
     if len(points) <= max_n:
         return points
     indices = np.round(np.linspace(0, len(points) - 1, max_n)).astype(int)
-    return [points[i] for i in indices]
+    return points[indices]
+
+
+def _fixed_boundaries(duration: float) -> tuple[np.ndarray, np.ndarray]:
+    """SEGMENT_DURATION ごとの固定境界。"""
+    num_segments = max(1, int(np.ceil(duration / SEGMENT_DURATION)))
+    boundaries = np.linspace(0.0, duration, num_segments + 1)
+    return boundaries, np.zeros(num_segments, dtype=bool)
+
+
+def _adaptive_boundaries(
+    duration: float,
+    new_times: np.ndarray,
+    voiced_mask: np.ndarray,
+    onsets: np.ndarray | None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    無声区間とフレーズ境界に合わせたセグメント境界を求める。
+
+    Returns
+    -------
+    boundaries : np.ndarray
+        セグメント境界（秒）、shape (segments + 1,)
+    passthrough : np.ndarray
+        各セグメントがパススルー（無声区間）かどうか、shape (segments,)
+    """
+    n = len(new_times)
+    if n == 0:
+        return _fixed_boundaries(duration)
+
+    # 有声/無声の連続区間（ラン）に分ける
+    voiced = np.asarray(voiced_mask, dtype=bool)
+    change = np.flatnonzero(np.diff(voiced.astype(np.int8))) + 1
+    run_starts = np.concatenate([[0], change])
+    run_ends = np.concatenate([change, [n]])
+    edge_times = np.append(new_times, duration)
+    t_start = np.where(run_starts == 0, 0.0, edge_times[run_starts])
+    t_end = edge_times[run_ends]
+
+    # 十分長い無声ランをパススルー区間にする（内側のフレーズ側へ余白を残す）
+    silent = ~voiced[run_starts] & (t_end - t_start >= MIN_SILENCE_SEC)
+    sil_start = np.where(t_start[silent] > 0.0, t_start[silent] + SILENCE_PAD_SEC, 0.0)
+    sil_end = np.where(t_end[silent] < duration, t_end[silent] - SILENCE_PAD_SEC, duration)
+
+    onsets = np.sort(np.asarray(onsets if onsets is not None else [], dtype=np.float64))
+    edges: list[float] = [0.0]
+    flags: list[bool] = []
+
+    def add_phrase(t0: float, t1: float) -> None:
+        # 長いフレーズは SEGMENT_DURATION ごとの位置に最も近いオンセットで分割する
+        if t1 - t0 > MAX_PHRASE_SEC:
+            n_parts = int(np.ceil((t1 - t0) / SEGMENT_DURATION))
+            targets = np.linspace(t0, t1, n_parts + 1)[1:-1]
+            for target in targets:
+                cut = target
+                if onsets.size:
+                    nearest = onsets[np.argmin(np.abs(onsets - target))]
+                    if abs(nearest - target) <= ONSET_SNAP_SEC:
+                        cut = float(nearest)
+                if edges[-1] < cut < t1:
+                    edges.append(cut)
+                    flags.append(False)
+        edges.append(t1)
+        flags.append(False)
+
+    cursor = 0.0
+    for a, b in zip(sil_start, sil_end):
+        if b <= a:
+            continue
+        if a > cursor:
+            add_phrase(cursor, float(a))
+        edges.append(float(b))
+        flags.append(True)
+        cursor = float(b)
+    if cursor < duration:
+        add_phrase(cursor, duration)
+
+    return np.asarray(edges), np.asarray(flags, dtype=bool)
 
 
 def _ref_f0_at_new_times(
-    warp_map: list[tuple[float, float]],
+    warp_map: np.ndarray | list[tuple[float, float]],
     ref_times: np.ndarray,
     ref_f0: np.ndarray,
     query_times: np.ndarray,
@@ -55,8 +148,8 @@ def _ref_f0_at_new_times(
     if len(query_times) == 0 or len(warp_map) == 0:
         return np.zeros(len(query_times), dtype=np.float32)
 
-    new_t = np.array([w[0] for w in warp_map], dtype=np.float32)
-    ref_t = np.array([w[1] for w in warp_map], dtype=np.float32)
+    warp_map = np.asarray(warp_map, dtype=np.float32).reshape(-1, 2)
+    new_t, ref_t = warp_map[:, 0], warp_map[:, 1]
 
     # query_times → 対応する ref_times へ補間
     ref_t_interp = np.interp(query_times, new_t, ref_t)
@@ -78,6 +171,9 @@ def generate(
     voiced_mask: np.ndarray,
     confidence_low: float = _DEFAULT_CONFIDENCE_LOW,
     confidence_high: float = _DEFAULT_CONFIDENCE_HIGH,
+    full_resolution_pitch: bool = False,
+    segmentation: str = "fixed",
+    onsets: np.ndarray | None = None,
 ) -> Recipe:
     """
     アライメント結果と解析結果から Recipe を生成する。
@@ -102,12 +198,26 @@ def generate(
         低信頼度の閾値（デフォルト 0.5）
     confidence_high : float
         高信頼度の閾値（デフォルト 0.8）
+    full_resolution_pitch : bool
+        True の場合、pitch_target_curve を MAX_WARP_POINTS に間引かず
+        新規ボーカルの全フレーム分保持する
+    segmentation : str
+        "fixed"    : SEGMENT_DURATION ごとの固定長セグメント（デフォルト）
+        "adaptive" : 無声区間をパススルーにし、フレーズをオンセット位置で分割する
+    onsets : np.ndarray | None
+        新規ボーカルのオンセット時刻（秒）。adaptive で長いフレーズの分割位置に使う
 
     Returns
     -------
     Recipe
     """
-    warp_map = alignment["warp_map"]
+    if segmentation not in SEGMENTATION_MODES:
+        raise ValueError(
+            f"未対応のセグメント分割: {segmentation!r}。対応: {SEGMENTATION_MODES}"
+        )
+
+    # (N, 2) 配列・タプルのリストのどちらも受け付ける
+    warp_map = np.asarray(alignment["warp_map"], dtype=np.float32).reshape(-1, 2)
     confidence_per_frame = alignment["confidence_per_frame"]
 
     # voiced_mask が new_times と異なるフレーム数の場合にリサンプリングする
@@ -115,8 +225,34 @@ def generate(
         voiced_times = np.linspace(0.0, new_audio_duration, len(voiced_mask))
         voiced_mask = np.interp(new_times, voiced_times, voiced_mask.astype(np.float32)) > 0.5
 
-    num_segments = max(1, int(np.ceil(new_audio_duration / SEGMENT_DURATION)))
-    boundaries = np.linspace(0.0, new_audio_duration, num_segments + 1)
+    if segmentation == "adaptive":
+        boundaries, passthrough = _adaptive_boundaries(
+            new_audio_duration, new_times, voiced_mask, onsets
+        )
+    else:
+        boundaries, passthrough = _fixed_boundaries(new_audio_duration)
+    num_segments = len(boundaries) - 1
+
+    # セグメント k のフレームは [frame_bounds[k], frame_bounds[k+1])、ワープ点も同様
+    frame_bounds = np.searchsorted(new_times, boundaries, side="left")
+    warp_bounds = np.searchsorted(warp_map[:, 0], boundaries, side="left")
+
+    # 区間ごとのフレーム数・平均 confidence・有声率
+    seg_ids = np.repeat(np.arange(num_segments), np.diff(frame_bounds))
+    framed = slice(frame_bounds[0], frame_bounds[-1])
+    counts = np.bincount(seg_ids, minlength=num_segments)
+    conf_sums = np.bincount(seg_ids, weights=confidence_per_frame[framed], minlength=num_segments)
+    voiced_sums = np.bincount(seg_ids, weights=voiced_mask[framed].astype(np.float64),
+                              minlength=num_segments)
+    has_frames = counts > 0
+    safe_counts = np.maximum(counts, 1)
+    confidences = np.where(has_frames, conf_sums / safe_counts, 0.5)
+    voiced_ratios = voiced_sums / safe_counts
+
+    # 目標ピッチ（リファレンス F0 をワープマップ経由で new_times 全体に一括マッピング）
+    # （アライメントが空なら等倍とみなす）
+    global_warp = warp_map if len(warp_map) else np.array([(0.0, 0.0), (new_audio_duration,) * 2])
+    target_f0 = _ref_f0_at_new_times(global_warp, ref_times, ref_f0, new_times)
 
     segments: list[Segment] = []
     warnings: list[Warning] = []
@@ -124,44 +260,47 @@ def generate(
     for idx in range(num_segments):
         t0 = float(boundaries[idx])
         t1 = float(boundaries[idx + 1])
+        f_lo, f_hi = frame_bounds[idx], frame_bounds[idx + 1]
+        confidence = float(confidences[idx])
 
-        # このセグメントのフレームインデックス
-        frame_mask = (new_times >= t0) & (new_times < t1)
-
-        # 平均 confidence
-        seg_conf = confidence_per_frame[frame_mask]
-        confidence = float(np.mean(seg_conf)) if seg_conf.size > 0 else 0.5
+        if passthrough[idx]:
+            # 無声区間: DSP は通さず、出力長だけワープマップに合わせる
+            ref_t0, ref_t1 = np.interp([t0, t1], global_warp[:, 0], global_warp[:, 1])
+            segments.append(Segment(
+                t0=t0,
+                t1=t1,
+                time_warp_points=[(t0, ref_t0), (t1, ref_t1)],
+                pitch_target_curve=[(t0, 0.0), (t1, 0.0)],
+                confidence=confidence,
+                pitch_strength=0.0,
+                time_strength=1.0,
+                protect_unvoiced=True,
+                passthrough=True,
+            ))
+            continue
 
         pitch_strength, time_strength = _strength_from_confidence(
             confidence, confidence_low, confidence_high
         )
 
         # ワープ点（このセグメント範囲に絞り込み・サブサンプル）
-        seg_warp = [(nt, rt) for nt, rt in warp_map if t0 <= nt < t1]
-        if not seg_warp:
-            seg_warp = [(t0, t0), (t1, t1)]   # アライメントなし → 等倍
+        seg_warp = warp_map[warp_bounds[idx]:warp_bounds[idx + 1]]
+        if len(seg_warp) == 0:
+            seg_warp = np.array([(t0, t0), (t1, t1)])   # アライメントなし → 等倍
         else:
             seg_warp = _subsample(seg_warp, MAX_WARP_POINTS)
 
-        # 目標ピッチカーブ（リファレンス F0 をワープマップ経由でマッピング）
-        seg_new_times = new_times[frame_mask]
-        seg_ref_f0 = _ref_f0_at_new_times(seg_warp, ref_times, ref_f0, seg_new_times)
-        pitch_curve = [
-            (float(t), float(hz))
-            for t, hz in zip(seg_new_times, seg_ref_f0)
-        ]
-        if not pitch_curve:
-            pitch_curve = [(t0, 0.0), (t1, 0.0)]
+        # 目標ピッチカーブ
+        if f_hi > f_lo:
+            pitch_curve = np.column_stack([new_times[f_lo:f_hi], target_f0[f_lo:f_hi]])
+            if not full_resolution_pitch:
+                pitch_curve = _subsample(pitch_curve, MAX_WARP_POINTS)
         else:
-            pitch_curve = _subsample(pitch_curve, MAX_WARP_POINTS)
+            pitch_curve = np.array([(t0, 0.0), (t1, 0.0)])
 
         # 無声保護フラグ: 有声フレームが 30% 未満のセグメントはピッチシフト対象外
         # （子音・ブレスなど主に無声の区間を保護する。混在セグメントは補正を継続）
-        if frame_mask.any():
-            voiced_ratio = float(voiced_mask[frame_mask].mean())
-            protect = voiced_ratio < 0.3
-        else:
-            protect = True
+        protect = bool(voiced_ratios[idx] < 0.3) if has_frames[idx] else True
 
         segments.append(Segment(
             t0=t0,
@@ -1,5 +1,17 @@
 """
 recipe/schema.py — recipe.json のデータクラス定義・読み書き
+
+Segment の time_warp_points / pitch_target_curve は (N, 2) float64 配列で保持する
+（タプルのリストを渡しても配列に正規化する）。
+
+Recipe.save(sidecar=True) はカーブを 1 本の (N, 2) 配列に連結して
+recipe.json の隣の .npy（バイナリサイドカー）に書き出し、JSON にはセグメントごとの
+オフセットだけを残す。Recipe.load(mmap=True) はサイドカーをメモリマップし、
+各セグメントのカーブはそのビューになる（コピーしない）。
+
+サイドカー付きの JSON はカーブが空なので、トップレベルの "version" を SIDECAR_VERSION にして
+サイドカーを知らない読み手には未対応バージョンとして拒否させる
+（recipe 自体のバージョンは "sidecar" の "recipe_version" に残す）。
 """
 
 from __future__ import annotations
@@ -8,28 +20,56 @@ import json
 from dataclasses import dataclass, field
 from pathlib import Path
 
+import numpy as np
 
-@dataclass
+SIDECAR_SUFFIX = ".curves.npy"
+SIDECAR_VERSION = "0.1+sidecar"
+
+
+def _as_curve(points) -> np.ndarray:
+    """[(x, y), ...] または (N, 2) 配列を (N, 2) float64 配列にする（可能ならコピーしない）。"""
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+
+@dataclass(eq=False)
 class Segment:
     t0: float
     t1: float
-    time_warp_points: list[tuple[float, float]]
-    pitch_target_curve: list[tuple[float, float]]  # [(時刻秒, Hz), ...]
+    time_warp_points: np.ndarray     # (N, 2) [new_vocal_時刻, reference_時刻]
+    pitch_target_curve: np.ndarray   # (N, 2) [時刻秒, Hz]
     confidence: float
     pitch_strength: float
     time_strength: float
     protect_unvoiced: bool = True
+    passthrough: bool = False        # True: 無声区間。レンダラは DSP を通さずコピーする
+
+    def __post_init__(self) -> None:
+        self.time_warp_points = _as_curve(self.time_warp_points)
+        self.pitch_target_curve = _as_curve(self.pitch_target_curve)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Segment):
+            return NotImplemented
+        return (
+            (self.t0, self.t1, self.confidence, self.pitch_strength,
+             self.time_strength, self.protect_unvoiced, self.passthrough)
+            == (other.t0, other.t1, other.confidence, other.pitch_strength,
+                other.time_strength, other.protect_unvoiced, other.passthrough)
+            and np.array_equal(self.time_warp_points, other.time_warp_points)
+            and np.array_equal(self.pitch_target_curve, other.pitch_target_curve)
+        )
 
-    def to_dict(self) -> dict:
+    def to_dict(self, curves: bool = True) -> dict:
         return {
             "t0": self.t0,
             "t1": self.t1,
-            "time_warp_points": [list(p) for p in self.time_warp_points],
-            "pitch_target_curve": [list(p) for p in self.pitch_target_curve],
+            "time_warp_points": self.time_warp_points.tolist() if curves else [],
+            "pitch_target_curve": self.pitch_target_curve.tolist() if curves else [],
             "confidence": self.confidence,
             "pitch_strength": self.pitch_strength,
             "time_strength": self.time_strength,
             "protect_unvoiced": self.protect_unvoiced,
+            "passthrough": self.passthrough,
         }
 
     @classmethod
@@ -37,12 +77,13 @@ class Segment:
         return cls(
             t0=d["t0"],
             t1=d["t1"],
-            time_warp_points=[tuple(p) for p in d["time_warp_points"]],
-            pitch_target_curve=[tuple(p) for p in d["pitch_target_curve"]],
+            time_warp_points=d["time_warp_points"],
+            pitch_target_curve=d["pitch_target_curve"],
             confidence=d["confidence"],
             pitch_strength=d["pitch_strength"],
             time_strength=d["time_strength"],
             protect_unvoiced=d.get("protect_unvoiced", True),
+            passthrough=d.get("passthrough", False),
         )
 
 
@@ -78,16 +119,70 @@ class Recipe:
             "warnings": [w.to_dict() for w in self.warnings],
         }
 
-    def save(self, path: str | Path) -> None:
+    def to_columns(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        全セグメントのカーブを列指向の 1 本の配列にまとめる。
+
+        Returns
+        -------
+        curves : np.ndarray
+            全セグメントの time_warp_points を連結し、その後ろに
+            pitch_target_curve を連結した (N, 2) float64 配列
+        warp_offsets, pitch_offsets : np.ndarray
+            セグメント k のカーブは curves[offsets[k]:offsets[k + 1]]、shape (segments + 1,)
+        """
+        warp = [s.time_warp_points for s in self.segments]
+        pitch = [s.pitch_target_curve for s in self.segments]
+        warp_offsets = np.concatenate([[0], np.cumsum([len(c) for c in warp])]).astype(np.int64)
+        pitch_offsets = warp_offsets[-1] + np.concatenate(
+            [[0], np.cumsum([len(c) for c in pitch])]
+        ).astype(np.int64)
+        curves = np.concatenate(warp + pitch) if self.segments else np.empty((0, 2))
+        return curves.reshape(-1, 2), warp_offsets, pitch_offsets
+
+    def save(self, path: str | Path, sidecar: bool = False) -> None:
+        """
+        recipe.json を書き出す。
+
+        sidecar=True のときはカーブを <stem>.curves.npy に書き出し、JSON の各セグメントの
+        カーブは空配列、トップレベルの "sidecar" にファイル名とオフセットを記録する。
+        sidecar=False のときは、以前の保存で残った <stem>.curves.npy を削除する。
+        """
         path = Path(path)
         path.parent.mkdir(parents=True, exist_ok=True)
+        sidecar_path = path.with_name(path.stem + SIDECAR_SUFFIX)
+        if not sidecar:
+            data = self.to_dict()
+            sidecar_path.unlink(missing_ok=True)
+        else:
+            curves, warp_offsets, pitch_offsets = self.to_columns()
+            np.save(sidecar_path, curves)
+            data = {
+                "version": SIDECAR_VERSION,
+                "sample_rate": self.sample_rate,
+                "global_key_shift_semitones": self.global_key_shift_semitones,
+                "segments": [s.to_dict(curves=False) for s in self.segments],
+                "warnings": [w.to_dict() for w in self.warnings],
+                "sidecar": {
+                    "path": sidecar_path.name,
+                    "recipe_version": self.version,
+                    "warp_offsets": warp_offsets.tolist(),
+                    "pitch_offsets": pitch_offsets.tolist(),
+                },
+            }
         with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+            json.dump(data, f, indent=2, ensure_ascii=False)
 
-    _SUPPORTED_VERSIONS = {"0.1"}
+    _SUPPORTED_VERSIONS = {"0.1", SIDECAR_VERSION}
 
     @classmethod
-    def load(cls, path: str | Path) -> "Recipe":
+    def load(cls, path: str | Path, mmap: bool = False) -> "Recipe":
+        """
+        recipe.json を読み込む。
+
+        サイドカー付きの場合は mmap=True でサイドカーをメモリマップする
+        （各セグメントのカーブは読み取り専用のビューになる）。
+        """
         path = Path(path)
         try:
             with open(path, "r", encoding="utf-8") as f:
@@ -102,14 +197,33 @@ class Recipe:
                     f"未対応の recipe バージョン: {version!r}。"
                     f"対応バージョン: {cls._SUPPORTED_VERSIONS}"
                 )
+            segments = [Segment.from_dict(s) for s in data["segments"]]
+            if version == SIDECAR_VERSION:
+                _attach_sidecar(path, data["sidecar"], segments, mmap)
+                version = data["sidecar"]["recipe_version"]
             return cls(
                 version=version,
                 sample_rate=int(data["sample_rate"]),
                 global_key_shift_semitones=float(data["global_key_shift_semitones"]),
-                segments=[Segment.from_dict(s) for s in data["segments"]],
+                segments=segments,
                 warnings=[Warning.from_dict(w) for w in data.get("warnings", [])],
             )
         except KeyError as e:
             raise ValueError(
                 f"recipe.json に必須フィールドがありません: {e}\nファイル: {path}"
             ) from e
+
+
+def _attach_sidecar(path: Path, info: dict, segments: list[Segment], mmap: bool) -> None:
+    """サイドカーのカーブを各セグメントに割り当てる。"""
+    sidecar_path = path.with_name(info["path"])
+    if not sidecar_path.exists():
+        raise ValueError(f"recipe のサイドカーが見つかりません: {sidecar_path}")
+    curves = np.load(sidecar_path, mmap_mode="r" if mmap else None)
+    warp_offsets = info["warp_offsets"]
+    pitch_offsets = info["pitch_offsets"]
+    if len(warp_offsets) != len(segments) + 1 or len(pitch_offsets) != len(segments) + 1:
+        raise ValueError(f"サイドカーのオフセット数がセグメント数と一致しません: {sidecar_path}")
+    for k, seg in enumerate(segments):
+        seg.time_warp_points = curves[warp_offsets[k]:warp_offsets[k + 1]]
+        seg.pitch_target_curve = curves[pitch_offsets[k]:pitch_offsets[k + 1]]
@@ -4,24 +4,96 @@ renderer/rubberband_renderer.py — pyrubberband でタイムストレッチ・
 依存:
   brew install rubberband      # CLI バイナリ
   pip install pyrubberband     # Python ラッパー
+
+backend="librosa" を指定すると librosa の位相ボコーダでプロセス内処理する
+（一時ファイル・サブプロセスなし。rubberband バイナリ不要）。
 """
 
 from __future__ import annotations
 
+import os
 import shutil
 import numpy as np
-import pyrubberband as pyrb
 
 from ..recipe.schema import Recipe, Segment
 
-# モジュールロード時に一度だけ rubberband の存在を確認する
-if shutil.which("rubberband") is None:
-    raise RuntimeError(
-        "rubberband コマンドが見つかりません。\n"
-        "  macOS: brew install rubberband\n"
-        "  Linux: apt install rubberband-cli または pip install rubberband\n"
-        "  Windows: https://breakfastquay.com/rubberband/ からバイナリを取得してください"
-    )
+BACKENDS = ("rubberband", "librosa")
+RENDER_MODES = ("segment", "continuous")
+
+CONTEXT_SEC = 0.1      # セグメント前後に付けて処理する文脈（秒）
+CROSSFADE_SEC = 0.02   # セグメント境界のクロスフェード長（秒）
+
+_rubberband_checked = False
+
+
+def _check_rubberband() -> None:
+    """rubberband コマンドの存在を確認する（初回のみ）。"""
+    global _rubberband_checked
+    if _rubberband_checked:
+        return
+    if shutil.which("rubberband") is None:
+        raise RuntimeError(
+            "rubberband コマンドが見つかりません。\n"
+            "  macOS: brew install rubberband\n"
+            "  Linux: apt install rubberband-cli または pip install rubberband\n"
+            "  Windows: https://breakfastquay.com/rubberband/ からバイナリを取得してください\n"
+            "  （または backend=\"librosa\" でプロセス内レンダリングを使用）"
+        )
+    _rubberband_checked = True
+
+
+def _time_stretch(chunk: np.ndarray, sr: int, rate: float, backend: str) -> np.ndarray:
+    """rate は両バックエンドとも pyrubberband.time_stretch と同じ意味で解釈する。"""
+    if backend == "librosa":
+        import librosa
+        return librosa.effects.time_stretch(chunk, rate=rate)
+    import pyrubberband as pyrb
+    return pyrb.time_stretch(chunk, sr, rate=rate)
+
+
+def _pitch_shift(chunk: np.ndarray, sr: int, n_steps: float, backend: str) -> np.ndarray:
+    if backend == "librosa":
+        import librosa
+        return librosa.effects.pitch_shift(chunk, sr=sr, n_steps=n_steps)
+    import pyrubberband as pyrb
+    return pyrb.pitch_shift(chunk, sr, n_steps=n_steps)
+
+
+class RenderCache:
+    """
+    segment モードのレンダリング結果をセグメント単位で保持するキャッシュ。
+
+    render(cache=...) に同じインスタンスを渡し続けると、DSP パラメータ（範囲・伸縮率・
+    ピッチシフト量・バックエンド・グローバルキーシフト）が前回と変わらないセグメントは
+    再計算せず、変更されたセグメントだけを処理して連結し直す。
+    入力音声のバッファが変わると自動的に破棄する。
+    """
+
+    def __init__(self) -> None:
+        self._source: np.ndarray | None = None
+        self._shifted: tuple[tuple, np.ndarray] | None = None
+        self._pieces: dict[tuple, tuple[np.ndarray, int, int]] = {}
+        self.last_rendered = 0   # 直近の render で DSP を実行したセグメント数
+        self.last_total = 0      # 直近の render のセグメント数
+
+    def clear(self) -> None:
+        self._source = None
+        self._shifted = None
+        self._pieces = {}
+
+    def bind(self, audio: np.ndarray) -> None:
+        """入力音声を登録する。前回と別のバッファならキャッシュを破棄する。"""
+        if self._source is not audio:
+            self.clear()
+            self._source = audio
+
+    def shifted(self, key: tuple) -> np.ndarray | None:
+        if self._shifted is not None and self._shifted[0] == key:
+            return self._shifted[1]
+        return None
+
+    def store_shifted(self, key: tuple, audio: np.ndarray) -> None:
+        self._shifted = (key, audio)
 
 
 def render(
@@ -30,14 +102,30 @@ def render(
     recipe: Recipe,
     new_f0: np.ndarray | None = None,
     new_times: np.ndarray | None = None,
+    backend: str = "rubberband",
+    mode: str = "segment",
+    workers: int = 1,
+    cache: RenderCache | None = None,
 ) -> np.ndarray:
     """
     Recipe を新規ボーカルに適用し、補正済み音声を返す。
 
+    mode="continuous" のときは warp_renderer.render_continuous に委譲し、
+    Recipe 全体の時間写像と時変ピッチカーブを 1 パスで適用する。
+
     処理順序:
     1. グローバルキーシフト（全体に一括適用）
     2. セグメントごとのタイムストレッチ
     3. セグメントごとのピッチシフト（new_f0 が渡された場合のみ）
+    4. 各セグメントの本体を順に並べ、境界を文脈部分とクロスフェードして連結
+
+    伸縮もピッチシフトも不要なセグメント（passthrough=True の無声区間を含む）は 2・3 を行わず、
+    隣接するもの同士をまとめて入力バッファを参照したまま並べる（入力全体の型変換もしない）。
+    passthrough の無声区間の長さがワープ点と合わないときは、DSP を通さずに末尾を 0 で埋めるか
+    削って合わせる。
+
+    セグメントは前後 CONTEXT_SEC の文脈付きで独立に処理するため、
+    workers > 1 のときはプロセスプールで並列にレンダリングする。
 
     Parameters
     ----------
@@ -50,54 +138,197 @@ def render(
         新規ボーカルの F0 カーブ (Hz)。None の場合はセグメントピッチをスキップ。
     new_times : np.ndarray | None
         new_f0 の各フレーム時刻（秒）
+    backend : str
+        "rubberband"（rubberband CLI 経由）または "librosa"（プロセス内の位相ボコーダ）
+    mode : str
+        "segment"（セグメントごとに伸縮して連結）または "continuous"（1 パスの連続ワープ）
+    workers : int
+        segment モードの並列プロセス数。1 で逐次処理、0 以下で CPU コア数。
+    cache : RenderCache | None
+        segment モードで前回の結果を再利用するキャッシュ。変更のあったセグメントだけを再計算する。
 
     Returns
     -------
     np.ndarray
         補正済みモノラル音声 (samples,)
     """
-    audio = audio.astype(np.float64)  # pyrubberband は float64 を期待
+    if backend not in BACKENDS:
+        raise ValueError(f"未対応のレンダラ: {backend!r}。対応: {BACKENDS}")
+    if mode not in RENDER_MODES:
+        raise ValueError(f"未対応のレンダリングモード: {mode!r}。対応: {RENDER_MODES}")
+    if backend == "rubberband":
+        _check_rubberband()
+
+    if mode == "continuous":
+        from .warp_renderer import render_continuous
+        return render_continuous(audio, sr, recipe, new_f0, new_times, backend=backend)
+
+    if cache is not None:
+        cache.bind(audio)
 
     # --- 1. グローバルキーシフト ---
+    shift_key = (recipe.global_key_shift_semitones, backend)
     if abs(recipe.global_key_shift_semitones) > 0.01:
-        audio = pyrb.pitch_shift(audio, sr, n_steps=recipe.global_key_shift_semitones)
+        shifted = cache.shifted(shift_key) if cache is not None else None
+        if shifted is None:
+            # pyrubberband は float64 を期待
+            shifted = _pitch_shift(audio.astype(np.float64), sr,
+                                   recipe.global_key_shift_semitones, backend)
+            if cache is not None:
+                cache.store_shifted(shift_key, shifted)
+        audio = shifted
         # F0 カーブも同じだけシフト（per-segment 比較に使う）
         if new_f0 is not None:
             shift_ratio = 2.0 ** (recipe.global_key_shift_semitones / 12.0)
             new_f0 = np.where(new_f0 > 0, new_f0 * shift_ratio, 0.0)
 
     # --- 2 & 3. セグメント処理 ---
-    output_chunks: list[np.ndarray] = []
+    # 処理不要の範囲は入力バッファをそのまま参照し、DSP が必要な範囲だけを切り出す
+    ctx = int(CONTEXT_SEC * sr)
+    keys: list[tuple] = []
+    jobs: list[tuple | None] = []
+    identity: dict[tuple, tuple[np.ndarray, int, int]] = {}
+    for s_start, s_end, rate, semitones, out_len in _plan_segments(
+        recipe.segments, len(audio), sr, new_f0, new_times,
+    ):
+        if out_len is not None:
+            keys.append(("silence", s_start, s_end, out_len, shift_key))
+            jobs.append(None)
+            identity[keys[-1]] = _resize_silence(audio, s_start, s_end, out_len, ctx)
+            continue
+        if rate == 1.0 and semitones == 0.0:
+            keys.append(("identity", s_start, s_end, shift_key))
+            jobs.append(None)
+            identity[keys[-1]] = (audio, s_start, s_end)
+            continue
 
-    for seg in recipe.segments:
-        s_start = int(seg.t0 * sr)
-        s_end = min(int(seg.t1 * sr), len(audio))
-        chunk = audio[s_start:s_end]
+        # 前後に文脈を付けて処理し、境界のクロスフェードに使う
+        c_head = min(ctx, s_start)
+        c_tail = min(ctx, len(audio) - s_end)
+        chunk = audio[s_start - c_head:s_end + c_tail].astype(np.float64)
+        keys.append((s_start, s_end, c_head, c_tail, rate, semitones, shift_key))
+        jobs.append((chunk, c_head, c_tail, sr, rate, semitones, backend))
+
+    if not keys:
+        return audio.astype(np.float32)
 
-        if len(chunk) == 0:
+    cached = dict(cache._pieces) if cache is not None else {}
+    cached.update(identity)
+    dirty = [k for k, key in enumerate(keys) if key not in cached]
+    dirty_jobs = [jobs[k] for k in dirty]
+
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    if workers > 1 and len(dirty_jobs) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(dirty_jobs))) as pool:
+            rendered = list(pool.map(_render_job, dirty_jobs))
+    else:
+        rendered = [_render_job(job) for job in dirty_jobs]
+
+    fresh = dict(zip((keys[k] for k in dirty), rendered))
+    pieces = [fresh[key] if key in fresh else cached[key] for key in keys]
+    if cache is not None:
+        cache._pieces = dict(zip(keys, pieces))
+        cache.last_rendered = len(dirty)
+        cache.last_total = len(keys)
+
+    return _assemble(pieces, int(CROSSFADE_SEC * sr))
+
+
+def _plan_segments(
+    segments: list[Segment],
+    n_samples: int,
+    sr: int,
+    new_f0: np.ndarray | None,
+    new_times: np.ndarray | None,
+) -> list[tuple[int, int, float, float, int | None]]:
+    """
+    セグメントを (開始サンプル, 終了サンプル, 伸縮率, ピッチシフト量, 無声区間の出力長) の
+    範囲に変換する。
+
+    無声区間の出力長は、passthrough のセグメントの長さをワープ点に合わせて変えるときだけ
+    サンプル数が入り、それ以外は None。伸縮もピッチシフトも不要なセグメント
+    （長さの変わらない passthrough を含む）は、隣接するもの同士を 1 つの範囲にまとめる。
+    """
+    plan: list[tuple[int, int, float, float, int | None]] = []
+    for seg in segments:
+        s_start = int(seg.t0 * sr)
+        s_end = min(int(seg.t1 * sr), n_samples)
+        if s_end <= s_start:
             continue
 
-        chunk = _apply_segment(chunk, sr, seg, new_f0, new_times)
-        output_chunks.append(chunk)
+        out_len = None
+        if seg.passthrough:
+            rate, semitones = 1.0, 0.0
+            out_len = _passthrough_length(seg, s_end - s_start)
+            if out_len == s_end - s_start:
+                out_len = None
+        else:
+            rate, semitones = _segment_params(seg, new_f0, new_times)
 
-    if not output_chunks:
-        return audio.astype(np.float32)
+        identity = rate == 1.0 and semitones == 0.0 and out_len is None
+        if identity and plan and plan[-1][1] == s_start and plan[-1][2:] == (1.0, 0.0, None):
+            plan[-1] = (plan[-1][0], s_end, 1.0, 0.0, None)
+        else:
+            plan.append((s_start, s_end, rate, semitones, out_len))
+    return plan
 
-    return np.concatenate(output_chunks).astype(np.float32)
 
+def _passthrough_length(seg: Segment, n_samples: int) -> int:
+    """
+    passthrough セグメントの出力サンプル数（入力 n_samples をワープ点の伸縮率で伸ばした長さ）。
 
-def _apply_segment(
-    chunk: np.ndarray,
-    sr: int,
+    無声区間は DSP を通さず 0 埋め・切り詰めで長さを合わせるので、伸縮率はクリップしない。
+    """
+    warp = seg.time_warp_points
+    if seg.time_strength <= 0.05 or len(warp) < 2:
+        return n_samples
+    in_dur = warp[-1, 0] - warp[0, 0]
+    out_dur = warp[-1, 1] - warp[0, 1]
+    if in_dur <= 0 or out_dur < 0:
+        return n_samples
+    ratio = 1.0 + seg.time_strength * (out_dur / in_dur - 1.0)
+    return max(0, int(round(n_samples * ratio)))
+
+
+def _resize_silence(
+    audio: np.ndarray, s_start: int, s_end: int, out_len: int, ctx: int,
+) -> tuple[np.ndarray, int, int]:
+    """
+    無声区間 audio[s_start:s_end] を out_len サンプルにした (出力, 本体の開始位置, 本体の終了位置)。
+
+    長くするときは末尾を 0 で埋め、短くするときは末尾を削る。前後には入力の文脈を付け、
+    境界のクロスフェードに使う。
+    """
+    c_head = min(ctx, s_start)
+    c_tail = min(ctx, len(audio) - s_end)
+    keep = min(out_len, s_end - s_start)
+    out = np.concatenate([
+        audio[s_start - c_head:s_start + keep],
+        np.zeros(out_len - keep, dtype=audio.dtype),
+        audio[s_end:s_end + c_tail],
+    ])
+    return out, c_head, c_head + out_len
+
+
+def _segment_params(
     seg: Segment,
     new_f0: np.ndarray | None,
     new_times: np.ndarray | None,
-) -> np.ndarray:
-    """セグメント単位でタイムストレッチ + ピッチシフトを適用する。"""
+) -> tuple[float, float]:
+    """
+    セグメントに適用する (タイムストレッチ率, ピッチシフト量[セミトーン]) を求める。
+
+    タイムストレッチ率は pyrubberband.time_stretch の rate（> 1 で短く、< 1 で長く）。
+    リファレンス側の区間が長いほど出力を長くする（continuous モードの build_time_map と同じ向き）。
+    処理不要のときはそれぞれ 1.0 / 0.0 を返す。
+    """
+    rate = 1.0
 
     # ---- タイムストレッチ ----
     if seg.time_strength > 0.05 and len(seg.time_warp_points) >= 2:
-        warp = np.array(seg.time_warp_points, dtype=np.float64)
+        warp = seg.time_warp_points
         in_dur = warp[-1, 0] - warp[0, 0]
         out_dur = warp[-1, 1] - warp[0, 1]
 
@@ -108,19 +339,71 @@ def _apply_segment(
             effective_ratio = float(np.clip(effective_ratio, 0.5, 2.0))
 
             if abs(effective_ratio - 1.0) > 0.01:
-                # pyrubberband: rate > 1.0 = 遅く（長く）、rate < 1.0 = 速く（短く）
-                chunk = pyrb.time_stretch(chunk, sr, rate=effective_ratio)
+                # effective_ratio は出力長 / 入力長。pyrubberband の rate は速さなので逆数を渡す
+                # （rate > 1.0 = 速く（短く）、rate < 1.0 = 遅く（長く））
+                rate = 1.0 / effective_ratio
 
     # ---- ピッチシフト ----
     # protect_unvoiced=True のとき、無声区間（子音・ブレス）へのピッチシフトを無効化する
+    semitones_eff = 0.0
     pitch_strength_eff = 0.0 if seg.protect_unvoiced else seg.pitch_strength
     if pitch_strength_eff > 0.01:
         semitones = _compute_pitch_shift(seg, new_f0, new_times)
         semitones_eff = float(np.clip(semitones * pitch_strength_eff, -12.0, 12.0))
-        if abs(semitones_eff) > 0.05:
-            chunk = pyrb.pitch_shift(chunk, sr, n_steps=semitones_eff)
+        if abs(semitones_eff) <= 0.05:
+            semitones_eff = 0.0
+
+    return rate, semitones_eff
+
+
+def _render_job(job: tuple) -> tuple[np.ndarray, int, int]:
+    """
+    文脈付きチャンクにタイムストレッチ + ピッチシフトを適用する（プロセスプールから呼ばれる）。
+
+    Returns
+    -------
+    (出力, 本体の開始位置, 本体の終了位置)。本体の前後は文脈部分の処理結果。
+    """
+    chunk, c_head, c_tail, sr, rate, semitones, backend = job
+    out = chunk
+    if rate != 1.0:
+        out = _time_stretch(out, sr, rate, backend)
+    if semitones != 0.0:
+        out = _pitch_shift(out, sr, semitones, backend)
+
+    scale = len(out) / len(chunk)
+    core_start = int(round(c_head * scale))
+    core_end = max(core_start, len(out) - int(round(c_tail * scale)))
+    return out, core_start, core_end
+
+
+def _assemble(pieces: list[tuple[np.ndarray, int, int]], crossfade: int) -> np.ndarray:
+    """各セグメントの本体を順に並べ、境界を前後の文脈と線形クロスフェードする（float32 で返す）。"""
+    lengths = [end - start for _, start, end in pieces]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+    output = np.empty(int(offsets[-1]), dtype=np.float32)
+
+    for (out, start, end), pos in zip(pieces, offsets[:-1]):
+        output[pos:pos + end - start] = out[start:end]
+
+    for k in range(len(pieces) - 1):
+        prev_out, _, prev_end = pieces[k]
+        next_out, next_start, _ = pieces[k + 1]
+        half = min(
+            crossfade // 2,
+            len(prev_out) - prev_end, prev_end - pieces[k][1],
+            next_start, pieces[k + 1][2] - next_start,
+        )
+        if half <= 0:
+            continue
+        pos = int(offsets[k + 1])
+        fade = (np.arange(2 * half) + 0.5) / (2 * half)
+        output[pos - half:pos + half] = (
+            prev_out[prev_end - half:prev_end + half] * (1.0 - fade)
+            + next_out[next_start - half:next_start + half] * fade
+        )
 
-    return chunk
+    return output
 
 
 def _compute_pitch_shift(
@@ -133,7 +416,8 @@ def _compute_pitch_shift(
 
     目標ピッチ中央値 / 現在ピッチ中央値 から導く。
     """
-    target_hz = np.array([hz for _, hz in seg.pitch_target_curve if hz > 0])
+    curve_hz = seg.pitch_target_curve[:, 1]
+    target_hz = curve_hz[curve_hz > 0]
     if len(target_hz) == 0:
         return 0.0
 
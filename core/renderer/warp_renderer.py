@@ -0,0 +1,284 @@
+"""
+renderer/warp_renderer.py — Recipe 全体の時間写像を 1 パスで適用する連続ワープレンダラ
+
+rubberband_renderer.render（segment モード）はセグメントごとに切り出して 1 つの伸縮率で
+処理し連結するため、セグメント数ぶんのオーバーヘッドと継ぎ目のクリックが生じ、
+time_warp_points も両端の 2 点しか使わない。
+このモジュールは全セグメントのワープ点を 1 本の区分線形写像（入力サンプル → 出力サンプル）に
+まとめ、pitch_target_curve から作った時変ピッチカーブと合わせて音声全体に一度だけ適用する。
+
+  backend="rubberband": rubberband CLI を --timemap / --pitchmap 付きで 1 回だけ起動する
+  backend="librosa"   : プロセス内の時変位相ボコーダ + 可変レート再サンプリング
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+import numpy as np
+from scipy.ndimage import uniform_filter1d
+
+from ..recipe.schema import Recipe
+
+MIN_RATIO = 0.5             # 局所伸縮率の下限（segment モードと同じ）
+MAX_RATIO = 2.0             # 局所伸縮率の上限
+MAX_SEMITONES = 12.0        # 時変ピッチ補正量の上限（セミトーン）
+PITCH_SMOOTH_SEC = 0.05     # ピッチ補正カーブの平滑化窓（秒）
+
+_N_FFT = 2048
+_HOP = 512
+
+
+# ---- 写像・カーブの構築 -------------------------------------------------------
+
+def build_time_map(recipe: Recipe, n_samples: int, sr: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Recipe 全体の連続区分線形時間写像を作る。
+
+    各セグメント内のワープ点間の伸縮率 (Δref / Δnew) を time_strength で等倍とブレンドし、
+    MIN_RATIO〜MAX_RATIO にクリップしてから先頭から積分する。ワープ点のない区間・
+    time_strength が小さいセグメントは等倍。
+
+    Returns
+    -------
+    in_knots, out_knots : np.ndarray
+        入力サンプル位置と対応する出力サンプル位置 (float64)。どちらも 0 始まりで単調増加し、
+        in_knots[-1] == n_samples。
+    """
+    duration = n_samples / sr
+    knot_t: list[np.ndarray] = [np.array([0.0])]
+    slopes: list[np.ndarray] = []
+    cursor = 0.0
+
+    for seg in sorted(recipe.segments, key=lambda s: s.t0):
+        t0, t1 = max(seg.t0, cursor), min(seg.t1, duration)
+        if t1 <= t0:
+            continue
+        if t0 > cursor:   # セグメントの隙間は等倍
+            knot_t.append(np.array([t0]))
+            slopes.append(np.array([1.0]))
+
+        warp = np.asarray(seg.time_warp_points, dtype=np.float64).reshape(-1, 2)
+        if seg.time_strength > 0.05 and len(warp) >= 2:
+            x = np.clip(warp[:, 0], t0, t1)
+            d_new = np.diff(x)
+            d_ref = np.diff(warp[:, 1])
+            ratio = np.ones_like(d_new)
+            valid = (d_new > 0) & (d_ref > 0)
+            ratio[valid] = d_ref[valid] / d_new[valid]
+            ratio = np.clip(1.0 + seg.time_strength * (ratio - 1.0), MIN_RATIO, MAX_RATIO)
+            # セグメント先頭〜最初のワープ点、最後のワープ点〜末尾は等倍
+            seg_knots = np.concatenate([x, [t1]])
+            seg_slopes = np.concatenate([[1.0], ratio, [1.0]])
+        else:
+            seg_knots = np.array([t1])
+            seg_slopes = np.array([1.0])
+
+        knot_t.append(seg_knots)
+        slopes.append(seg_slopes)
+        cursor = t1
+
+    if cursor < duration:
+        knot_t.append(np.array([duration]))
+        slopes.append(np.array([1.0]))
+
+    t = np.concatenate(knot_t)
+    slope = np.concatenate(slopes) if slopes else np.zeros(0)
+    dt = np.diff(t)
+    keep = dt > 0
+    in_knots = np.concatenate([[0.0], np.cumsum(dt[keep])]) * sr
+    out_knots = np.concatenate([[0.0], np.cumsum(dt[keep] * slope[keep])]) * sr
+    in_knots[-1] = n_samples
+    return in_knots, out_knots
+
+
+def build_pitch_curve(
+    recipe: Recipe,
+    new_f0: np.ndarray | None,
+    new_times: np.ndarray | None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    入力時刻ごとのピッチシフト量（セミトーン）カーブを作る。
+
+    グローバルキーシフトに、pitch_target_curve と new_f0（キーシフト後）の差を
+    pitch_strength 倍して加える。無声フレーム・protect_unvoiced のセグメントは補正しない。
+    継ぎ目で段差が出ないよう PITCH_SMOOTH_SEC の移動平均をかける。
+
+    Returns
+    -------
+    times : np.ndarray
+        カーブの時刻（秒）
+    semitones : np.ndarray
+        各時刻のピッチシフト量（セミトーン）
+    """
+    global_shift = float(recipe.global_key_shift_semitones)
+    if new_f0 is None or new_times is None or len(new_times) == 0:
+        return np.array([0.0]), np.array([global_shift])
+
+    shift_ratio = 2.0 ** (global_shift / 12.0)
+    current = np.where(new_f0 > 0, new_f0 * shift_ratio, 0.0).astype(np.float64)
+    correction = np.zeros(len(new_times), dtype=np.float64)
+
+    for seg in recipe.segments:
+        strength = 0.0 if seg.protect_unvoiced else seg.pitch_strength
+        if strength <= 0.01:
+            continue
+        curve = np.asarray(seg.pitch_target_curve, dtype=np.float64).reshape(-1, 2)
+        voiced_pts = curve[curve[:, 1] > 0]
+        if len(voiced_pts) == 0:
+            continue
+
+        lo, hi = np.searchsorted(new_times, [seg.t0, seg.t1])
+        t = new_times[lo:hi]
+        cur = current[lo:hi]
+        target = np.interp(t, voiced_pts[:, 0], voiced_pts[:, 1])
+        target_voiced = np.interp(t, curve[:, 0], (curve[:, 1] > 0).astype(np.float64)) > 0.5
+        ok = target_voiced & (cur > 0)
+        semis = np.zeros(len(t))
+        semis[ok] = 12.0 * np.log2(target[ok] / cur[ok]) * strength
+        correction[lo:hi] = np.clip(semis, -MAX_SEMITONES, MAX_SEMITONES)
+
+    frame_period = float(np.median(np.diff(new_times))) if len(new_times) > 1 else 0.01
+    size = max(1, int(round(PITCH_SMOOTH_SEC / frame_period)))
+    correction = uniform_filter1d(correction, size=size, mode="nearest")
+    return np.asarray(new_times, dtype=np.float64), global_shift + correction
+
+
+# ---- レンダリング -------------------------------------------------------------
+
+def render_continuous(
+    audio: np.ndarray,
+    sr: int,
+    recipe: Recipe,
+    new_f0: np.ndarray | None = None,
+    new_times: np.ndarray | None = None,
+    backend: str = "rubberband",
+) -> np.ndarray:
+    """
+    Recipe 全体を 1 本の時間写像 + 時変ピッチカーブとして 1 パスで適用する。
+
+    引数は rubberband_renderer.render と同じ。グローバルキーシフトもピッチカーブに
+    含めて同じパスで適用する。
+
+    Returns
+    -------
+    np.ndarray
+        補正済みモノラル音声 (samples,) float32
+    """
+    audio = np.asarray(audio, dtype=np.float64)
+    if len(audio) == 0:
+        return audio.astype(np.float32)
+
+    in_knots, out_knots = build_time_map(recipe, len(audio), sr)
+    pitch_t, semitones = build_pitch_curve(recipe, new_f0, new_times)
+
+    is_identity = (
+        np.allclose(in_knots, out_knots, atol=1.0) and np.all(np.abs(semitones) < 0.05)
+    )
+    if is_identity:
+        return audio.astype(np.float32)
+
+    if backend == "librosa":
+        out = _phase_vocoder_render(audio, in_knots, out_knots, pitch_t * sr, semitones)
+    else:
+        out = _rubberband_render(audio, sr, in_knots, out_knots, pitch_t, semitones)
+    return out.astype(np.float32)
+
+
+def _rubberband_render(
+    audio: np.ndarray,
+    sr: int,
+    in_knots: np.ndarray,
+    out_knots: np.ndarray,
+    pitch_t: np.ndarray,
+    semitones: np.ndarray,
+) -> np.ndarray:
+    """rubberband CLI を --timemap / --pitchmap 付きで 1 回だけ呼ぶ。"""
+    import pyrubberband as pyrb
+
+    in_s = np.round(in_knots).astype(np.int64)
+    out_s = np.maximum.accumulate(np.round(out_knots).astype(np.int64))
+    time_map = list(zip(in_s.tolist(), out_s.tolist()))
+
+    # 変化量 0.01 セミトーン未満の行は間引いてファイルを小さく保つ
+    frames = np.round(pitch_t * sr).astype(np.int64)
+    keep = np.ones(len(semitones), dtype=bool)
+    keep[1:] = np.abs(np.diff(np.round(semitones, 2))) > 0
+    fd, pitchmap_path = tempfile.mkstemp(suffix=".txt")
+    try:
+        with os.fdopen(fd, "w") as f:
+            for frame, st in zip(frames[keep], semitones[keep]):
+                f.write(f"{int(frame)} {st:.3f}\n")
+        return pyrb.timemap_stretch(audio, sr, time_map, rbargs={"--pitchmap": pitchmap_path})
+    finally:
+        os.unlink(pitchmap_path)
+
+
+def _phase_vocoder_render(
+    audio: np.ndarray,
+    in_knots: np.ndarray,
+    out_knots: np.ndarray,
+    pitch_pos: np.ndarray,
+    semitones: np.ndarray,
+) -> np.ndarray:
+    """
+    時変位相ボコーダ + 可変レート再サンプリングで時間写像とピッチカーブを同時に適用する。
+
+    ピッチ比 p(t) のとき、まず局所伸縮率 f'(t)·p(t) で伸縮し（中間信号）、
+    次に中間信号を局所レート p(t) で読み出して目標の長さ・ピッチにする。
+    再サンプリングは線形補間（ピッチを上げる方向ではわずかに折り返しが出る）。
+    """
+    n = len(audio)
+    n_out = int(round(out_knots[-1]))
+
+    # 入力上の細かいグリッドで f（出力写像）と g（中間信号の写像）を求める
+    xs = np.append(np.arange(0, n, _HOP // 4, dtype=np.float64), float(n))
+    fs = np.interp(xs, in_knots, out_knots)
+    mid = 0.5 * (xs[:-1] + xs[1:])
+    p = 2.0 ** (np.interp(mid, pitch_pos, semitones) / 12.0)
+    gs = np.concatenate([[0.0], np.cumsum(np.diff(fs) * p)])
+    n_mid = int(np.ceil(gs[-1]))
+
+    # ---- 位相ボコーダ（中間信号の hop ごとに、対応する入力位置のスペクトルを合成） ----
+    window = np.hanning(_N_FFT + 1)[:-1]
+    padded = np.pad(audio, (_N_FFT // 2, _N_FFT // 2 + _HOP))
+    n_frames_in = n // _HOP + 1
+    n_syn = n_mid // _HOP + 1
+    steps = np.interp(np.arange(n_syn) * _HOP, gs, xs) / _HOP
+    steps = np.clip(steps, 0.0, max(n_frames_in - 1 - 1e-6, 0.0))
+    omega = 2.0 * np.pi * _HOP * np.arange(_N_FFT // 2 + 1) / _N_FFT
+
+    spec_cache: dict[int, np.ndarray] = {}
+
+    def spec(i: int) -> np.ndarray:
+        if i not in spec_cache:
+            if len(spec_cache) > 4:
+                spec_cache.pop(min(spec_cache))
+            spec_cache[i] = np.fft.rfft(padded[i * _HOP:i * _HOP + _N_FFT] * window)
+        return spec_cache[i]
+
+    y_mid = np.zeros(n_syn * _HOP + _N_FFT)
+    norm = np.zeros_like(y_mid)
+    win_sq = window ** 2
+    phase = None
+    for k, pos in enumerate(steps):
+        i = int(pos)
+        frac = pos - i
+        s0, s1 = spec(i), spec(i + 1)
+        mag = (1.0 - frac) * np.abs(s0) + frac * np.abs(s1)
+        if phase is None:
+            phase = np.angle(s0)
+        y_mid[k * _HOP:k * _HOP + _N_FFT] += np.fft.irfft(mag * np.exp(1j * phase), _N_FFT) * window
+        norm[k * _HOP:k * _HOP + _N_FFT] += win_sq
+        dphi = np.angle(s1) - np.angle(s0) - omega
+        dphi -= 2.0 * np.pi * np.round(dphi / (2.0 * np.pi))
+        phase = phase + omega + dphi
+
+    y_mid = y_mid / np.maximum(norm, 1e-3)
+    y_mid = y_mid[_N_FFT // 2:_N_FFT // 2 + n_mid + 1]
+
+    # ---- 可変レート再サンプリング: 出力時刻 → 入力時刻 → 中間信号の位置 ----
+    src_in = np.interp(np.arange(n_out, dtype=np.float64), out_knots, in_knots)
+    mid_pos = np.interp(src_in, xs, gs)
+    return np.interp(mid_pos, np.arange(len(y_mid), dtype=np.float64), y_mid)
@@ -0,0 +1,84 @@
+"""
+resample.py — リサンプラの共有キャッシュ
+
+torchaudio.transforms.Resample は生成時に sinc 補間カーネルを計算する。
+ここでは (入力 SR, 出力 SR, デバイス, lowpass_filter_width) ごとに 1 つだけ作って使い回す。
+Resample の forward は状態を持たないため、複数スレッドから同じインスタンスを使ってよい。
+
+torch は初回のリサンプル時に import する（サンプルレートが同じなら import しない）。
+
+F0 解析（RMVPE・torchcrepe）は 16kHz で行う。load_with_analysis() は元ファイルの
+サンプルレートから 44.1kHz（レンダリング用）と 16kHz（解析用）をそれぞれ 1 回の変換で作り、
+44.1kHz を経由した二重変換を避ける。
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import torch
+
+ANALYSIS_SR = 16000            # F0 解析器の入力サンプルレート
+ANALYSIS_LOWPASS_WIDTH = 128   # RMVPE が内部リサンプルで使っていた lowpass_filter_width
+DEFAULT_LOWPASS_WIDTH = 6      # torchaudio.functional.resample の既定値
+
+# カーネルキャッシュ: (src_sr, dst_sr, device, lowpass_filter_width) → Resample
+_kernels: dict[tuple[int, int, str, int], torch.nn.Module] = {}
+_lock = threading.Lock()
+
+
+def get_resampler(
+    src_sr: int,
+    dst_sr: int,
+    device: str = "cpu",
+    lowpass_filter_width: int = DEFAULT_LOWPASS_WIDTH,
+) -> torch.nn.Module:
+    """キャッシュ済みの Resample を返す。なければカーネルを計算してキャッシュする。"""
+    key = (int(src_sr), int(dst_sr), str(device), int(lowpass_filter_width))
+    with _lock:
+        if key not in _kernels:
+            from torchaudio.transforms import Resample
+            _kernels[key] = Resample(
+                key[0], key[1], lowpass_filter_width=key[3],
+            ).to(device)
+        return _kernels[key]
+
+
+def resample(
+    audio: np.ndarray | torch.Tensor,
+    src_sr: int,
+    dst_sr: int,
+    device: str = "cpu",
+    lowpass_filter_width: int = DEFAULT_LOWPASS_WIDTH,
+) -> np.ndarray | torch.Tensor:
+    """
+    (samples,) または (channels, samples) の音声をリサンプルする。
+
+    np.ndarray を渡すと float32 の np.ndarray を、torch.Tensor を渡すと device 上の
+    Tensor を返す。src_sr == dst_sr のときは変換しない。
+    """
+    is_numpy = isinstance(audio, np.ndarray)
+    if src_sr == dst_sr:
+        return audio.astype(np.float32, copy=False) if is_numpy else audio.to(device)
+
+    import torch
+
+    tensor = torch.from_numpy(np.ascontiguousarray(audio, dtype=np.float32)) if is_numpy else audio
+    with torch.no_grad():
+        out = get_resampler(src_sr, dst_sr, device, lowpass_filter_width)(tensor.float().to(device))
+    return out.cpu().numpy() if is_numpy else out
+
+
+def to_analysis(audio: np.ndarray, sr: int) -> np.ndarray:
+    """F0 解析用の 16kHz 信号を作る（RMVPE 内部と同じカーネル）。"""
+    return resample(audio, sr, ANALYSIS_SR, lowpass_filter_width=ANALYSIS_LOWPASS_WIDTH)
+
+
+def clear() -> None:
+    """キャッシュしたカーネルを破棄する。"""
+    with _lock:
+        _kernels.clear()
@@ -0,0 +1,178 @@
+"""
+runtime.py — 推論ランタイムの共有設定
+
+各モデルラッパー（RMVPE・torchcrepe・Demucs・beat_this）は、デバイスの選択と
+推論コンテキストをここから取る。configure() はプロセス全体に 1 つのプロファイルを設定する。
+
+- device          : "auto"（CUDA があれば CUDA、なければ CPU）/ "cpu" / "cuda" / "cuda:N" / "mps"
+- threads         : intra-op スレッド数（torch.set_num_threads）。0 は torch の既定
+- interop_threads : inter-op スレッド数（torch.set_num_interop_threads）。0 は torch の既定。
+                    torch が並列処理を始めた後は変更できないため、プロセス起動直後に設定する
+- precision       : "fp32" / "bf16" / "int8"。RMVPE のネットワーク（DeepUnet + BiGRU）にだけ
+                    適用する。bf16 は autocast、int8 は Linear / GRU の動的量子化（CPU のみ）
+- torchscript     : RMVPE を scripts/download_models.py --prepare で書き出した TorchScript で
+                    推論する
+- f0_batch_seconds: RMVPE のバッチ推論（estimate_f0_batch）で 1 回の forward にまとめる
+                    ウィンドウの合計長（秒）。F0 解析のピークメモリはこれで決まる。
+                    0 は既定（batch_size ウィンドウ分）
+
+CPU サーバーでジョブごとに使うコア数を固定したい場合は threads / interop_threads を指定する。
+Demucs の num_workers スレッドは intra-op スレッドとは別に増える点に注意。
+
+torch は使う時点で import する。既定のプロファイル（device="auto"、スレッド数指定なし）なら
+configure() は torch を import しないため、CLI は torch の import をモデルの事前ロードと一緒に
+バックグラウンドで行える（core.warmup）。
+"""
+
+from __future__ import annotations
+
+import contextlib
+import warnings
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    import torch
+
+DEVICES = ("auto", "cpu", "cuda", "mps")
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+@dataclass(frozen=True)
+class InferenceProfile:
+    device: str = "auto"
+    threads: int = 0
+    interop_threads: int = 0
+    precision: str = "fp32"
+    torchscript: bool = False
+    f0_batch_seconds: float = 0.0
+
+
+_profile = InferenceProfile()
+
+
+def configure(
+    device: str = "auto",
+    threads: int = 0,
+    interop_threads: int = 0,
+    precision: str = "fp32",
+    torchscript: bool = False,
+    f0_batch_seconds: float = 0.0,
+) -> InferenceProfile:
+    """
+    推論プロファイルを設定し、スレッド数を torch に反映する。
+
+    Returns
+    -------
+    InferenceProfile
+        設定したプロファイル
+    """
+    global _profile
+
+    if device.split(":")[0] not in DEVICES:
+        raise ValueError(f"未対応のデバイス: {device!r}。対応: {DEVICES}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"未対応の推論精度: {precision!r}。対応: {PRECISIONS}")
+    if threads < 0 or interop_threads < 0:
+        raise ValueError(f"スレッド数は 0 以上を指定してください: {threads}, {interop_threads}")
+    if f0_batch_seconds < 0:
+        raise ValueError(f"F0 バッチ長は 0 以上を指定してください: {f0_batch_seconds}")
+
+    profile = InferenceProfile(
+        device, int(threads), int(interop_threads), precision, bool(torchscript),
+        float(f0_batch_seconds),
+    )
+    if profile.device != "auto":
+        _resolve(profile.device)   # 利用できないデバイスはここで弾く
+
+    if profile.threads or profile.interop_threads:
+        import torch
+    if profile.threads:
+        torch.set_num_threads(profile.threads)
+    if profile.interop_threads and torch.get_num_interop_threads() != profile.interop_threads:
+        try:
+            torch.set_num_interop_threads(profile.interop_threads)
+        except RuntimeError as e:
+            raise ValueError(
+                "inter-op スレッド数は torch が並列処理を始める前に設定してください"
+            ) from e
+
+    _profile = profile
+    return profile
+
+
+def get_profile() -> InferenceProfile:
+    """現在の推論プロファイルを返す。"""
+    return _profile
+
+
+def resolve_device() -> str:
+    """プロファイルのデバイスを実際のデバイス名（"cpu" / "cuda" / "mps" など）に解決する。"""
+    return _resolve(_profile.device)
+
+
+def _resolve(device: str) -> str:
+    import torch
+
+    if device == "auto":
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    if device.startswith("cuda") and not torch.cuda.is_available():
+        raise ValueError(f"CUDA が利用できません: {device!r}")
+    if device == "mps" and not torch.backends.mps.is_available():
+        raise ValueError("MPS が利用できません")
+    return device
+
+
+@contextlib.contextmanager
+def inference() -> Iterator[None]:
+    """モデル推論用のコンテキスト（torch.inference_mode）。"""
+    import torch
+
+    with torch.inference_mode():
+        yield
+
+
+def prepare_model(module: torch.nn.Module, device: str) -> torch.nn.Module:
+    """
+    プロファイルの precision に合わせてモデルを変換する。
+
+    fp32 はそのまま、bf16 は forward を autocast で包んで出力を float32 に戻し、
+    int8 は Linear / GRU を動的量子化したコピーを返す（CPU 以外ではそのまま）。
+    """
+    import torch
+
+    precision = _profile.precision
+    device_type = torch.device(device).type
+    if precision == "bf16" and device_type in ("cpu", "cuda"):
+        return _autocast(module, device_type)
+    if precision == "int8" and device_type == "cpu":
+        return quantize_dynamic(module)
+    return module
+
+
+def quantize_dynamic(module: torch.nn.Module) -> torch.nn.Module:
+    """Linear / GRU の重みを int8 に動的量子化したコピーを返す（CPU 推論用）。"""
+    import torch
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")   # torch.ao.quantization の非推奨警告
+        return torch.ao.quantization.quantize_dynamic(
+            module, {torch.nn.Linear, torch.nn.GRU}, dtype=torch.qint8,
+        )
+
+
+def _autocast(module: torch.nn.Module, device_type: str) -> torch.nn.Module:
+    """forward を bfloat16 の autocast で実行し、出力を float32 で返すラッパーを作る。"""
+    import torch
+
+    class _Autocast(torch.nn.Module):
+        def __init__(self) -> None:
+            super().__init__()
+            self.module = module
+
+        def forward(self, *args, **kwargs):
+            with torch.autocast(device_type, dtype=torch.bfloat16):
+                out = self.module(*args, **kwargs)
+            return out.float()
+
+    return _Autocast()
@@ -1,33 +1,121 @@
 """
 separation/demucs_wrapper.py — Demucs v4 (htdemucs) によるボーカル分離
+
+分離の速度と品質は apply_model のパラメータで決まる。
+SEPARATION_PROFILES に名前付きの組み合わせを用意し、個別の値で上書きもできる。
+
+- segment     : 1 回の推論に渡す長さ（秒）。None でモデル既定（htdemucs は 7.8 秒）
+- overlap     : 隣接セグメントの重なり率。小さいほど推論回数が減る
+- shifts      : ランダムな時間シフトで推論して平均する回数。0 でシフトなし
+- split       : False の場合は曲全体を 1 回で推論する（メモリを大きく使う）
+- num_workers : CPU 推論時にセグメントを並列処理するスレッド数（0 で逐次）
+
+ボーカルだけが必要なので、複数モデルのバッグ（htdemucs_ft など、ソースごとに
+専用モデルを持つもの）では vocals の重みが 0 のサブモデルを推論しない。
+htdemucs 単体は 1 つのデコーダで全ソースを同時に出すため、ヘッド単位の削減はできない。
+
+長尺向けの separate_vocal_to_file は 2mix をファイルからブロック単位で読み、
+重なり部分をクロスフェードしながらボーカルを WAV に逐次書き出す（ピークメモリは曲長に依存しない）。
 """
 
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+
 import numpy as np
 import torch
-import torchaudio
+
+from core import runtime
+from core.resample import resample
 
 DEMUCS_SR = 44100
 
-# モデルキャッシュ: (model_name, device) → モデルインスタンス
-_model_cache: dict[tuple[str, str], object] = {}
+SEPARATION_PROFILES = {
+    "fast": {"segment": None, "overlap": 0.1, "shifts": 0, "split": True},
+    "standard": {"segment": None, "overlap": 0.25, "shifts": 1, "split": True},
+    "high": {"segment": None, "overlap": 0.5, "shifts": 2, "split": True},
+}
+
+STREAM_BLOCK_SEC = 60     # separate_vocal_to_file で 1 回に処理する長さ（秒）
+STREAM_OVERLAP_SEC = 10   # 隣接ブロックの重なり（秒）。この範囲をクロスフェードする
+
+# モデルキャッシュ: (model_name, device, vocals_only) → モデルインスタンス
+_model_cache: dict[tuple[str, str, bool], object] = {}
+_model_lock = threading.Lock()   # core.warmup のバックグラウンドロードと二重に読まないようにする
 
 
-def _get_model(model_name: str, device: str) -> object:
+def _get_model(model_name: str, device: str, vocals_only: bool = True) -> object:
     """キャッシュ済み Demucs モデルを返す。なければロードしてキャッシュする。"""
-    key = (model_name, device)
-    if key not in _model_cache:
-        from demucs.pretrained import get_model
-        model = get_model(model_name)
-        model.to(device)
-        model.eval()
-        _model_cache[key] = model
-    return _model_cache[key]
+    key = (model_name, device, vocals_only)
+    with _model_lock:
+        if key not in _model_cache:
+            from demucs.pretrained import get_model
+            model = get_model(model_name)
+            if vocals_only:
+                model = _prune_to_vocals(model)
+            model.to(device)
+            model.eval()
+            _model_cache[key] = model
+        return _model_cache[key]
+
+
+def _prune_to_vocals(model: object) -> object:
+    """
+    BagOfModels から vocals の重みが 0 のサブモデルを取り除く。
+
+    vocals の推定値は Σ w_i·out_i / Σ w_i なので、w_i = 0 のモデルを除いても変わらない
+    （残りのソースの推定値は使わない前提）。取り除くものがなければそのまま返す。
+    """
+    from demucs.apply import BagOfModels
+
+    if not isinstance(model, BagOfModels):
+        return model
+    vocal_idx = model.sources.index("vocals")
+    kept = [(m, w) for m, w in zip(model.models, model.weights) if w[vocal_idx] != 0]
+    if not kept or len(kept) == len(model.models):
+        return model
+    return BagOfModels([m for m, _ in kept], [w for _, w in kept])
+
+
+def separation_params(profile: str = "standard", **overrides) -> dict:
+    """
+    プロファイルの apply_model パラメータに、None 以外の上書き値を反映して返す。
+
+    Parameters
+    ----------
+    profile : str
+        SEPARATION_PROFILES のキー
+    **overrides
+        segment / overlap / shifts / split のいずれか。None は「プロファイルの値を使う」
+    """
+    if profile not in SEPARATION_PROFILES:
+        raise ValueError(
+            f"未対応の分離プロファイル: {profile!r}。対応: {tuple(SEPARATION_PROFILES)}"
+        )
+    params = dict(SEPARATION_PROFILES[profile])
+    for name, value in overrides.items():
+        if name not in params:
+            raise ValueError(f"未対応の分離パラメータ: {name!r}")
+        if value is not None:
+            params[name] = value
+    if not 0.0 <= params["overlap"] < 1.0:
+        raise ValueError(f"overlap は 0 以上 1 未満を指定してください: {params['overlap']}")
+    if params["shifts"] < 0:
+        raise ValueError(f"shifts は 0 以上を指定してください: {params['shifts']}")
+    if params["segment"] is not None and params["segment"] <= 0:
+        raise ValueError(f"segment は正の秒数を指定してください: {params['segment']}")
+    return params
 
 
 def separate_vocal(
     audio: np.ndarray,
     sr: int,
     model_name: str = "htdemucs",
+    profile: str = "standard",
+    num_workers: int = 0,
+    vocals_only: bool = True,
+    **overrides,
 ) -> np.ndarray:
     """
     Demucs で 2mix からボーカルを抽出する。
@@ -40,38 +128,147 @@ def separate_vocal(
         入力サンプルレート
     model_name : str
         使用する Demucs モデル名
+    profile : str
+        SEPARATION_PROFILES のキー。"fast" は overlap を小さくしシフトなしで推論する
+    num_workers : int
+        CPU 推論時のセグメント並列スレッド数（GPU では無視される）
+    vocals_only : bool
+        True の場合、モデルのバッグから vocals に寄与しないサブモデルを除いて推論する
+    **overrides
+        segment / overlap / shifts / split の個別指定（None はプロファイルの値）
 
     Returns
     -------
     np.ndarray
         モノラルボーカル (samples,) at 44100 Hz
     """
-    from demucs.apply import apply_model
+    params = separation_params(profile, **overrides)
+    device = runtime.resolve_device()
+    model = _get_model(model_name, device, vocals_only)
 
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    model = _get_model(model_name, device)
+    return _separate_array(model, audio, sr, device, params, num_workers)
+
+
+def _separate_array(
+    model: object,
+    audio: np.ndarray,
+    sr: int,
+    device: str,
+    params: dict,
+    num_workers: int,
+) -> np.ndarray:
+    """(samples,) または (channels, samples) の音声からモノラルボーカル (44100 Hz) を取り出す。"""
+    from demucs.apply import apply_model
 
     # (channels, samples) に正規化
     tensor = torch.from_numpy(audio).float()
     if tensor.ndim == 1:
         tensor = tensor.unsqueeze(0)  # (1, samples)
 
-    # 44100 Hz にリサンプル
-    if sr != DEMUCS_SR:
-        tensor = torchaudio.functional.resample(tensor, sr, DEMUCS_SR)
+    # 44100 Hz にリサンプル（カーネルは core.resample で共有）
+    tensor = resample(tensor, sr, DEMUCS_SR)
 
     # ステレオに変換 (Demucs は 2ch を期待)
     if tensor.shape[0] == 1:
         tensor = tensor.repeat(2, 1)
+    tensor = tensor[:2]
 
     tensor = tensor.unsqueeze(0).to(device)  # (batch=1, channels=2, samples)
 
-    with torch.no_grad():
-        sources = apply_model(model, tensor, device=device)
-    # sources: (batch, n_sources, channels, samples)
+    # apply_model のワーカースレッドには inference_mode が引き継がれない
+    # （各スレッドは no_grad で推論する）
+    with runtime.inference():
+        sources = apply_model(
+            model, tensor, device=device,
+            shifts=params["shifts"], split=params["split"], overlap=params["overlap"],
+            segment=params["segment"], num_workers=num_workers,
+        )
+        # sources: (batch, n_sources, channels, samples)
+        # vocals だけをデバイス上で取り出してモノラル化し、他のソースはホストへ転送しない
+        vocal = sources[0, model.sources.index("vocals")].mean(dim=0)   # (samples,)
+        del sources
 
-    vocal_idx = model.sources.index("vocals")
-    vocal = sources[0, vocal_idx]          # (2, samples)
-    vocal_mono = vocal.mean(dim=0).cpu().numpy()  # (samples,)
+    return vocal.cpu().numpy()
+
+
+def separate_vocal_to_file(
+    in_path: str | Path,
+    out_path: str | Path,
+    model_name: str = "htdemucs",
+    profile: str = "standard",
+    num_workers: int = 0,
+    vocals_only: bool = True,
+    block_seconds: int = STREAM_BLOCK_SEC,
+    overlap_seconds: int = STREAM_OVERLAP_SEC,
+    **overrides,
+) -> int:
+    """
+    2mix をファイルからブロック単位で読み、分離したボーカルを WAV に逐次書き出す。
+
+    ブロック k は入力の [k·block, (k+1)·block + overlap) 秒を処理し、
+    隣のブロックと重なる overlap 秒を線形クロスフェードで重ね合わせる。
+    メモリに載るのは 1 ブロック分（block_seconds + overlap_seconds 秒）だけで、
+    ピークメモリは曲の長さに依存しない。
+
+    Parameters
+    ----------
+    in_path : str | Path
+        2mix（soundfile が読める形式）
+    out_path : str | Path
+        出力 WAV（モノラル float32, 44100 Hz）
+    block_seconds, overlap_seconds : int
+        1 ブロックの長さと重なり（秒、整数）。重なりの両端はブロック端の影響を受けるため、
+        Demucs のセグメント長（数秒）程度以上を推奨
+    model_name, profile, num_workers, vocals_only, **overrides
+        separate_vocal と同じ
+
+    Returns
+    -------
+    int
+        書き出したサンプル数
+    """
+    import soundfile as sf
+
+    block_seconds, overlap_seconds = int(block_seconds), int(overlap_seconds)
+    if overlap_seconds <= 0 or block_seconds <= overlap_seconds:
+        raise ValueError(
+            f"block_seconds ({block_seconds}) は overlap_seconds ({overlap_seconds}) より"
+            "大きい正の秒数を指定してください"
+        )
+
+    params = separation_params(profile, **overrides)
+    device = runtime.resolve_device()
+    model = _get_model(model_name, device, vocals_only)
+
+    # ブロック境界を秒単位に揃え、入力・出力のサンプル位置が整数で対応するようにする
+    out_overlap = overlap_seconds * DEMUCS_SR
+    fade = ((np.arange(out_overlap) + 0.5) / out_overlap).astype(np.float32)
+    tail: np.ndarray | None = None
+    written = 0
+
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    with sf.SoundFile(str(in_path)) as src, sf.SoundFile(
+        str(out_path), "w", samplerate=DEMUCS_SR, channels=1, subtype="FLOAT",
+    ) as dst:
+        hop = block_seconds * src.samplerate
+        length = (block_seconds + overlap_seconds) * src.samplerate
+        start = 0
+        while start < src.frames:
+            src.seek(start)
+            block = src.read(length, dtype="float32", always_2d=True)   # (samples, channels)
+            last = start + len(block) >= src.frames
+            vocal = _separate_array(model, block.T, src.samplerate, device, params, num_workers)
+
+            if tail is not None:
+                n = min(len(tail), len(vocal))
+                vocal[:n] = tail[:n] * (1.0 - fade[:n]) + vocal[:n] * fade[:n]
+            if last:
+                dst.write(vocal)
+                written += len(vocal)
+                break
+            dst.write(vocal[:-out_overlap])
+            written += len(vocal) - out_overlap
+            tail = vocal[-out_overlap:].copy()
+            start += hop
 
-    return vocal_mono
+    return written
@@ -0,0 +1,119 @@
+"""
+warmup.py — import とモデルロードの事前実行
+
+lyra の処理時間のうち、torch の import・モデルの読み込み・librosa の初回呼び出し（numba の
+コンパイルなど）は入力に依存しない固定費になる。ここではそれをステージ単位で前倒しする。
+
+- Preloader : バックグラウンドスレッドでステージを順に実行する。CLI は音声の読み込みと並行して使う。
+              モデルのキャッシュは各ラッパーのロックで守られているため、本処理が先に同じモデルを
+              要求した場合はロード完了を待ってキャッシュを共有する（二重には読まない）。
+- warmup()  : 同じ処理をその場で実行する（lyra warmup）。モデルファイルの取得
+              （Demucs の重みのダウンロード）と OS のページキャッシュへの読み込みを済ませておく。
+
+ステージは STAGES（パイプラインで使う順）に並べて実行する。必要なステージだけを渡せば、
+使わないモジュール（--stem のときの demucs など）は import しない。
+torch と librosa のステージはプロセスで 1 回だけ実行する（lyra serve ではジョブごとに
+Preloader を起動するが、2 回目以降はキャッシュ済みのモデルを確認するだけになる）。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Iterable
+
+import numpy as np
+
+STAGES = ("torch", "demucs", "rmvpe", "librosa")   # パイプラインで使う順
+# プロセスで 1 回済ませればよいステージ（モデルは各ラッパーがキャッシュする）
+_ONCE = ("torch", "librosa")
+
+_warmed: set[str] = set()
+
+
+def run_stage(stage: str, sep_model: str = "htdemucs") -> None:
+    """1 つのステージを実行する（モデルは core.runtime のプロファイルでロードする）。"""
+    from core import runtime
+
+    if stage in _warmed:
+        return
+    if stage == "torch":
+        import torch  # noqa: F401
+        import torchaudio.transforms  # noqa: F401
+    elif stage == "rmvpe":
+        from core.pitch import rmvpe_wrapper
+        rmvpe_wrapper._get_model(rmvpe_wrapper._resolve_model_path(None), runtime.resolve_device())
+    elif stage == "demucs":
+        from core.separation import demucs_wrapper
+        demucs_wrapper._get_model(sep_model, runtime.resolve_device(), vocals_only=True)
+    elif stage == "librosa":
+        # 初回呼び出しで librosa のサブモジュールの import と numba のコンパイルが走る
+        from core.onset.onset_detector import detect_onsets
+        from core.onset.voiced_detector import detect_voiced
+        noise = np.random.default_rng(0).normal(0, 0.1, 22050).astype(np.float32)
+        detect_onsets(noise, 22050)
+        detect_voiced(noise, 22050)
+    else:
+        raise ValueError(f"未対応のウォームアップステージ: {stage!r}。対応: {STAGES}")
+    if stage in _ONCE:
+        _warmed.add(stage)
+
+
+def _ordered(stages: Iterable[str]) -> list[str]:
+    stages = set(stages)
+    unknown = stages - set(STAGES)
+    if unknown:
+        raise ValueError(f"未対応のウォームアップステージ: {sorted(unknown)}。対応: {STAGES}")
+    return [s for s in STAGES if s in stages]
+
+
+def warmup(stages: Iterable[str] = STAGES, sep_model: str = "htdemucs") -> dict[str, float]:
+    """
+    ステージを順に実行し、ステージごとの所要時間（秒）を返す。
+
+    失敗したステージは例外をそのまま送出する（モデルファイルがない場合など）。
+    """
+    timings = {}
+    for stage in _ordered(stages):
+        start = time.perf_counter()
+        run_stage(stage, sep_model)
+        timings[stage] = time.perf_counter() - start
+    return timings
+
+
+class Preloader:
+    """
+    warmup をバックグラウンドスレッド（daemon）で実行する。
+
+    ステージの例外は記録するだけで送出しない。本処理が同じモデルを使うときに改めて
+    ロードを試みるので、エラーはそのステージの処理中に通常どおり報告される。
+    """
+
+    def __init__(self, stages: Iterable[str], sep_model: str = "htdemucs") -> None:
+        self.stages = _ordered(stages)
+        self.sep_model = sep_model
+        self.timings: dict[str, float] = {}
+        self.errors: dict[str, Exception] = {}
+        self._thread = threading.Thread(target=self._run, name="lyra-preload", daemon=True)
+
+    def start(self) -> Preloader:
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        for stage in self.stages:
+            start = time.perf_counter()
+            try:
+                run_stage(stage, self.sep_model)
+            except Exception as e:
+                self.errors[stage] = e
+                continue
+            self.timings[stage] = time.perf_counter() - start
+
+    def done(self) -> bool:
+        return not self._thread.is_alive()
+
+    def wait(self, timeout: float | None = None) -> dict[str, float]:
+        """完了を待ち、完了したステージの所要時間を返す。"""
+        self._thread.join(timeout)
+        return dict(self.timings)
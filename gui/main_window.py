@@ -15,6 +15,7 @@ gui/main_window.py — lyra メインウィンドウ
 
 from __future__ import annotations
 
+import os
 from pathlib import Path
 
 import numpy as np
@@ -22,7 +23,7 @@ from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QFileDialog,
     QComboBox, QCheckBox, QSplitter, QProgressBar,
-    QMessageBox, QDoubleSpinBox, QGroupBox,
+    QMessageBox, QDoubleSpinBox, QSpinBox, QGroupBox,
 )
 from PySide6.QtCore import Qt
 
@@ -35,12 +36,19 @@ from .worker import PipelineWorker, RerenderWorker, ExportWorker
 PRESETS = {
     "light": {
         "description": "軽め", "confidence_low": 0.6, "confidence_high": 0.9, "band_radius": 0.08,
+        "align_mode": "band", "separation": "standard",
     },
     "standard": {
         "description": "標準", "confidence_low": 0.5, "confidence_high": 0.8, "band_radius": 0.10,
+        "align_mode": "band", "separation": "standard",
     },
     "strong": {
         "description": "強め", "confidence_low": 0.4, "confidence_high": 0.7, "band_radius": 0.12,
+        "align_mode": "band", "separation": "standard",
+    },
+    "long": {
+        "description": "長尺", "confidence_low": 0.5, "confidence_high": 0.8, "band_radius": 0.10,
+        "align_mode": "multiscale", "separation": "fast",
     },
 }
 
@@ -55,6 +63,8 @@ class MainWindow(QMainWindow):
         self._worker: PipelineWorker | None = None
         self._rerender_worker: RerenderWorker | None = None
         self._export_worker: ExportWorker | None = None
+        self._render_cache = None    # RenderCache（Run ごとに作り直す）
+        self._analysis_cache = None  # AnalysisCache（初回 Run で作成し、以降使い回す）
 
         self._setup_ui()
 
@@ -144,6 +154,58 @@ class MainWindow(QMainWindow):
         self._preset_combo.setCurrentIndex(1)  # standard
         layout.addWidget(self._preset_combo)
 
+        # 分離プロファイル
+        layout.addWidget(QLabel("分離:"))
+        self._separation_combo = QComboBox()
+        self._separation_combo.addItem("プリセット", None)
+        self._separation_combo.addItem("fast (高速)", "fast")
+        self._separation_combo.addItem("standard", "standard")
+        self._separation_combo.addItem("high (高品質)", "high")
+        self._separation_combo.setToolTip(
+            "Demucs の overlap / shifts の組み合わせ。"
+            "fast は overlap を小さくしシフトなしで推論する"
+        )
+        layout.addWidget(self._separation_combo)
+
+        self._sep_workers_spin = QSpinBox()
+        self._sep_workers_spin.setRange(0, os.cpu_count() or 1)
+        self._sep_workers_spin.setPrefix("スレッド ")
+        self._sep_workers_spin.setToolTip(
+            "CPU 分離時にセグメントを並列処理するスレッド数（0 で逐次）"
+        )
+        layout.addWidget(self._sep_workers_spin)
+
+        # 推論プロファイル（core.runtime）
+        layout.addWidget(QLabel("推論:"))
+        self._device_combo = QComboBox()
+        self._device_combo.addItem("自動", "auto")
+        self._device_combo.addItem("CPU", "cpu")
+        self._device_combo.addItem("CUDA", "cuda")
+        layout.addWidget(self._device_combo)
+
+        self._precision_combo = QComboBox()
+        self._precision_combo.addItem("fp32", "fp32")
+        self._precision_combo.addItem("bf16", "bf16")
+        self._precision_combo.addItem("int8 (CPU)", "int8")
+        self._precision_combo.setToolTip(
+            "RMVPE の推論精度。bf16 は autocast、int8 は BiGRU / 全結合層の動的量子化（CPU のみ）"
+        )
+        layout.addWidget(self._precision_combo)
+
+        self._torchscript_chk = QCheckBox("TorchScript")
+        self._torchscript_chk.setToolTip(
+            "RMVPE を TorchScript で推論する"
+            "（scripts/download_models.py --prepare で事前に書き出す）"
+        )
+        layout.addWidget(self._torchscript_chk)
+
+        self._threads_spin = QSpinBox()
+        self._threads_spin.setRange(0, os.cpu_count() or 1)
+        self._threads_spin.setPrefix("コア ")
+        self._threads_spin.setSpecialValueText("コア 自動")
+        self._threads_spin.setToolTip("torch の intra-op スレッド数（0 で torch の既定）")
+        layout.addWidget(self._threads_spin)
+
         # キーシフト
         layout.addWidget(QLabel("キーシフト:"))
         self._keyshift_spin = QDoubleSpinBox()
@@ -155,6 +217,16 @@ class MainWindow(QMainWindow):
         self._keyshift_spin.setFixedWidth(72)
         layout.addWidget(self._keyshift_spin)
 
+        # レンダラ
+        layout.addWidget(QLabel("レンダラ:"))
+        self._renderer_combo = QComboBox()
+        self._renderer_combo.addItem("rubberband", "rubberband")
+        self._renderer_combo.addItem("librosa (高速)", "librosa")
+        self._renderer_combo.setToolTip(
+            "librosa はプロセス内で処理するため再レンダリングが速い（音質は rubberband が上）"
+        )
+        layout.addWidget(self._renderer_combo)
+
         layout.addStretch()
 
         # Run ボタン
@@ -214,12 +286,27 @@ class MainWindow(QMainWindow):
         self._pitch_view.clear()
         self._warp_view.clear()
 
+        from core.renderer.rubberband_renderer import RenderCache
+        self._render_cache = RenderCache()
+        if self._analysis_cache is None:
+            from core.analysis_cache import AnalysisCache
+            self._analysis_cache = AnalysisCache()
+
         self._worker = PipelineWorker(
             ref_path=ref,
             vocal_path=vocal,
             is_stem=self._stem_chk.isChecked(),
             preset=preset,
             key_shift_override=key_shift,
+            separation=self._separation_combo.currentData() or preset["separation"],
+            separation_workers=self._sep_workers_spin.value(),
+            device=self._device_combo.currentData(),
+            threads=self._threads_spin.value(),
+            precision=self._precision_combo.currentData(),
+            torchscript=self._torchscript_chk.isChecked(),
+            render_backend=self._renderer_combo.currentData(),
+            render_cache=self._render_cache,
+            analysis_cache=self._analysis_cache,
         )
         self._worker.progress.connect(self._on_progress)
         self._worker.finished.connect(self._on_finished)
@@ -279,6 +366,8 @@ class MainWindow(QMainWindow):
             recipe=self._result.recipe,
             new_f0=self._result.new_f0,
             new_times=self._result.new_times,
+            render_backend=self._renderer_combo.currentData(),
+            render_cache=self._render_cache,
         )
         self._rerender_worker.finished.connect(self._on_rerender_done)
         self._rerender_worker.error.connect(self._on_error)
@@ -288,7 +377,13 @@ class MainWindow(QMainWindow):
         self._result.output_audio = output_audio
         self._rerender_worker = None  # 参照を解放
         self._segment_panel._rerender_btn.setEnabled(True)
-        self._status_label.setText("再レンダリング完了")
+        cache = self._render_cache
+        if cache is not None and cache.last_total:
+            self._status_label.setText(
+                f"再レンダリング完了（{cache.last_rendered}/{cache.last_total} セグメントを再計算）"
+            )
+        else:
+            self._status_label.setText("再レンダリング完了")
         # ピッチ補正後曲線を再描画
         self._pitch_view.set_corrected_from_recipe(self._result.recipe)
 
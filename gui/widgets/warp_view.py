@@ -40,12 +40,12 @@ class WarpView(QWidget):
 
         layout.addWidget(self._plot)
 
-    def set_warp_map(self, warp_map: list[tuple[float, float]], duration: float) -> None:
-        if not warp_map:
+    def set_warp_map(self, warp_map: np.ndarray, duration: float) -> None:
+        warp_map = np.asarray(warp_map, dtype=np.float32).reshape(-1, 2)
+        if len(warp_map) == 0:
             return
 
-        new_t = np.array([p[0] for p in warp_map], dtype=np.float32)
-        ref_t = np.array([p[1] for p in warp_map], dtype=np.float32)
+        new_t, ref_t = warp_map[:, 0], warp_map[:, 1]
 
         # 対角線
         d = np.array([0.0, duration], dtype=np.float32)
@@ -44,6 +44,15 @@ class PipelineWorker(QThread):
         is_stem: bool,
         preset: dict,
         key_shift_override: float | None,
+        render_backend: str = "rubberband",
+        render_cache=None,
+        analysis_cache=None,
+        separation: str = "standard",
+        separation_workers: int = 0,
+        device: str = "auto",
+        threads: int = 0,
+        precision: str = "fp32",
+        torchscript: bool = False,
         parent=None,
     ) -> None:
         super().__init__(parent)
@@ -52,6 +61,17 @@ class PipelineWorker(QThread):
         self.is_stem = is_stem
         self.preset = preset
         self.key_shift_override = key_shift_override
+        self.render_backend = render_backend
+        self.render_cache = render_cache   # core.renderer.rubberband_renderer.RenderCache
+        # core.analysis_cache.AnalysisCache（None でキャッシュなし）
+        self.analysis_cache = analysis_cache
+        self.separation = separation   # core.separation.demucs_wrapper.SEPARATION_PROFILES のキー
+        self.separation_workers = separation_workers
+        # core.runtime の推論プロファイル
+        self.device = device
+        self.threads = threads
+        self.precision = precision
+        self.torchscript = torchscript
 
     def run(self) -> None:
         try:
@@ -61,23 +81,36 @@ class PipelineWorker(QThread):
             self.error.emit(f"{type(e).__name__}: {e}\n\n{traceback.format_exc()}")
 
     def _run_pipeline(self) -> None:
-        from core.audio_io import load
-        from core.separation.demucs_wrapper import separate_vocal
-        from core.pitch.rmvpe_wrapper import estimate_f0
-        from core.onset.onset_detector import detect_onsets
-        from core.onset.voiced_detector import detect_voiced
+        from core.audio_io import load, load_with_analysis
+        from core.resample import ANALYSIS_SR, to_analysis
+        from core.analysis_cache import (
+            cached_detect_onsets,
+            cached_detect_voiced,
+            cached_estimate_f0_batch,
+            cached_separate_vocal,
+        )
         from core.key_detector import detect_key_shift
         from core.alignment.dtw_aligner import align
         from core.recipe.generator import generate
         from core.renderer.rubberband_renderer import render
+        from core import runtime
 
         TOTAL = 7
         TARGET_SR = 44100
 
+        runtime.configure(
+            device=self.device, threads=self.threads,
+            precision=self.precision, torchscript=self.torchscript,
+        )
+
         # Step 1
         self.progress.emit(1, TOTAL, "音声ファイルを読み込んでいます…")
-        ref_audio, _ = load(self.ref_path, target_sr=TARGET_SR)
-        new_audio, _ = load(self.vocal_path, target_sr=TARGET_SR)
+        # F0 解析用の 16kHz 信号は元ファイルから直接作る（44.1kHz を経由しない）
+        if self.is_stem:
+            ref_audio, ref_16k = load_with_analysis(self.ref_path, TARGET_SR)
+        else:
+            ref_audio, _ = load(self.ref_path, target_sr=TARGET_SR)
+        new_audio, new_16k = load_with_analysis(self.vocal_path, TARGET_SR)
 
         # Step 2
         if self.is_stem:
@@ -85,18 +118,23 @@ class PipelineWorker(QThread):
             ref_vocal = ref_audio
         else:
             self.progress.emit(2, TOTAL, "ボーカル分離中 (Demucs)…")
-            ref_vocal = separate_vocal(ref_audio, TARGET_SR)
+            ref_vocal = cached_separate_vocal(
+                self.analysis_cache, ref_audio, TARGET_SR,
+                profile=self.separation, num_workers=self.separation_workers,
+            )
+            ref_16k = to_analysis(ref_vocal, TARGET_SR)
 
         # Step 3
         self.progress.emit(3, TOTAL, "F0 解析中 (RMVPE)…")
-        ref_f0, ref_times = estimate_f0(ref_vocal, TARGET_SR)
-        new_f0, new_times = estimate_f0(new_audio, TARGET_SR)
+        (ref_f0, ref_times), (new_f0, new_times) = cached_estimate_f0_batch(
+            self.analysis_cache, [ref_16k, new_16k], ANALYSIS_SR
+        )
 
         # Step 4
         self.progress.emit(4, TOTAL, "オンセット・有声区間検出中…")
-        ref_onsets = detect_onsets(ref_vocal, TARGET_SR)
-        new_onsets = detect_onsets(new_audio, TARGET_SR)
-        voiced_mask = detect_voiced(new_audio, TARGET_SR)
+        ref_onsets = cached_detect_onsets(self.analysis_cache, ref_vocal, TARGET_SR)
+        new_onsets = cached_detect_onsets(self.analysis_cache, new_audio, TARGET_SR)
+        voiced_mask = cached_detect_voiced(self.analysis_cache, new_audio, TARGET_SR)
 
         # Step 5
         self.progress.emit(5, TOTAL, "キーシフト推定中…")
@@ -111,6 +149,7 @@ class PipelineWorker(QThread):
             ref_f0=ref_f0, ref_times=ref_times, ref_onsets=ref_onsets,
             new_f0=new_f0, new_times=new_times, new_onsets=new_onsets,
             band_radius=self.preset["band_radius"],
+            mode=self.preset.get("align_mode", "band"),
         )
 
         # Step 7
@@ -129,7 +168,9 @@ class PipelineWorker(QThread):
         )
 
         output_audio = render(new_audio, TARGET_SR, recipe,
-                              new_f0=new_f0, new_times=new_times)
+                              new_f0=new_f0, new_times=new_times,
+                              backend=self.render_backend,
+                              cache=self.render_cache)
 
         result = PipelineResult(
             ref_f0=ref_f0, ref_times=ref_times,
@@ -147,6 +188,7 @@ class RerenderWorker(QThread):
     """
     セグメントスライダー変更後の再レンダリング専用 Worker。
     recipe は既にスライダー値が反映済みの状態で渡す。
+    render_cache を渡すと、パラメータが変わったセグメントだけを再計算する。
     """
 
     finished = Signal(object)   # np.ndarray (output audio)
@@ -154,6 +196,8 @@ class RerenderWorker(QThread):
 
     def __init__(self, new_audio: np.ndarray, sample_rate: int,
                  recipe, new_f0: np.ndarray, new_times: np.ndarray,
+                 render_backend: str = "rubberband",
+                 render_cache=None,
                  parent=None) -> None:
         super().__init__(parent)
         self.new_audio = new_audio
@@ -161,12 +205,16 @@ class RerenderWorker(QThread):
         self.recipe = recipe
         self.new_f0 = new_f0
         self.new_times = new_times
+        self.render_backend = render_backend
+        self.render_cache = render_cache
 
     def run(self) -> None:
         try:
             from core.renderer.rubberband_renderer import render
             output = render(self.new_audio, self.sample_rate, self.recipe,
-                            new_f0=self.new_f0, new_times=self.new_times)
+                            new_f0=self.new_f0, new_times=self.new_times,
+                            backend=self.render_backend,
+                            cache=self.render_cache)
             self.finished.emit(output)
         except Exception as e:
             import traceback
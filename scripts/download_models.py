@@ -2,8 +2,13 @@
 scripts/download_models.py — モデルファイルのダウンロード
 
 使い方:
-  python scripts/download_models.py          # 全モデル
-  python scripts/download_models.py --rmvpe  # RMVPE のみ
+  python scripts/download_models.py                      # 全モデル
+  python scripts/download_models.py --rmvpe              # RMVPE のみ
+  python scripts/download_models.py --prepare            # RMVPE を TorchScript に書き出す
+  python scripts/download_models.py --prepare --quantize # int8 量子化版も書き出す
+
+--prepare で書き出したモデルは lyra run / batch の --torchscript で使う。
+書き出し後に合成音で fp32 のモデルと F0 を比べ、基準を満たさないものは削除する。
 """
 
 from __future__ import annotations
@@ -13,7 +18,8 @@ import sys
 import urllib.request
 from pathlib import Path
 
-MODELS_DIR = Path(__file__).parent.parent / "models"
+ROOT_DIR = Path(__file__).parent.parent
+MODELS_DIR = ROOT_DIR / "models"
 
 MODELS = {
     "rmvpe": {
@@ -55,10 +61,35 @@ def download(name: str, force: bool = False) -> None:
         sys.exit(1)
 
 
+def prepare(quantize: bool = False) -> None:
+    """RMVPE を TorchScript（と int8 量子化版）に書き出し、精度を確認する。"""
+    if str(ROOT_DIR) not in sys.path:
+        sys.path.insert(0, str(ROOT_DIR))
+    from core.pitch.rmvpe_wrapper import check_torchscript, export_torchscript
+
+    for quantized in ([False, True] if quantize else [False]):
+        label = "rmvpe (int8)" if quantized else "rmvpe"
+        print(f"  {label}: TorchScript に書き出し中")
+        out = export_torchscript(MODELS["rmvpe"]["dest"], quantize=quantized)
+        result = check_torchscript(MODELS["rmvpe"]["dest"], quantized=quantized)
+        print(f"    → {out}")
+        print(f"    精度: 最大 {result['max_cents']:.2f} cent  "
+              f"99%点 {result['p99_cents']:.2f} cent  "
+              f"有声判定一致 {result['voicing_agreement'] * 100:.1f}%")
+        if not result["passed"]:
+            out.unlink()
+            print(f"  ERROR: {label} の精度が基準を満たさないため削除しました")
+            sys.exit(1)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="lyra モデルダウンロード")
     parser.add_argument("--rmvpe", action="store_true", help="RMVPE のみダウンロード")
     parser.add_argument("--force", action="store_true", help="既存ファイルを上書き")
+    parser.add_argument("--prepare", action="store_true",
+                        help="ダウンロード後に RMVPE を TorchScript に書き出す")
+    parser.add_argument("--quantize", action="store_true",
+                        help="--prepare で int8 動的量子化版も書き出す（CPU 推論用）")
     args = parser.parse_args()
 
     targets = ["rmvpe"] if args.rmvpe else list(MODELS.keys())
@@ -70,6 +101,9 @@ def main() -> None:
     for name in targets:
         download(name, force=args.force)
 
+    if args.prepare:
+        prepare(quantize=args.quantize)
+
     print("\n完了")
 
 
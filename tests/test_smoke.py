@@ -45,6 +45,22 @@ def test_audio_io_resample(tmp_path):
     assert loaded.shape[0] == pytest.approx(22050 * DURATION, abs=10)
 
 
+def test_audio_io_load_with_analysis(tmp_path):
+    from core.audio_io import load, load_with_analysis, save
+    from core.resample import ANALYSIS_SR, get_resampler, to_analysis
+
+    audio = _sine(sr=48000)
+    path = tmp_path / "test.wav"
+    save(str(path), audio, 48000, subtype="FLOAT")
+
+    full, analysis = load_with_analysis(str(path), SR)
+    assert np.array_equal(full, load(str(path), target_sr=SR)[0])
+    # 16kHz は元の 48kHz から 1 回で作る（44.1kHz を経由しない）
+    assert analysis.shape[0] == ANALYSIS_SR * DURATION
+    assert np.array_equal(analysis, to_analysis(audio, 48000))
+    assert get_resampler(48000, SR) is get_resampler(48000, SR)
+
+
 # ---- key_detector ----------------------------------------------------------
 
 def test_key_detector_unison():
@@ -107,6 +123,73 @@ def test_recipe_roundtrip(tmp_path):
     assert loaded.warnings[0].reason == "low_confidence"
 
 
+def test_recipe_sidecar_roundtrip_mmap(tmp_path):
+    import json
+    from core.recipe.schema import SIDECAR_VERSION, Recipe, Segment
+
+    segments = [
+        Segment(t0=float(k), t1=float(k + 1),
+                time_warp_points=[(k, k), (k + 0.5, k + 0.6), (k + 1, k + 1)],
+                pitch_target_curve=np.column_stack(
+                    [np.linspace(k, k + 1, 50), np.full(50, 220.0 + k)]
+                ),
+                confidence=0.9, pitch_strength=1.0, time_strength=1.0)
+        for k in range(3)
+    ]
+    recipe = Recipe(version="0.1", sample_rate=44100, global_key_shift_semitones=0.0,
+                    segments=segments)
+    assert segments[0].time_warp_points.shape == (3, 2)
+
+    path = tmp_path / "recipe.json"
+    recipe.save(path, sidecar=True)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["segments"][0]["pitch_target_curve"] == []
+    # カーブが空の JSON をサイドカーを知らない読み手が 0.1 として読まないようにする
+    assert data["version"] == SIDECAR_VERSION
+    sidecar_path = tmp_path / data["sidecar"]["path"]
+    assert sidecar_path.exists()
+
+    loaded = Recipe.load(path, mmap=True)
+    assert isinstance(loaded.segments[1].pitch_target_curve.base, np.memmap)
+    assert loaded == recipe
+
+    # サイドカーなしの JSON と同じ内容に書き戻せる
+    loaded.save(tmp_path / "plain.json")
+    assert Recipe.load(tmp_path / "plain.json") == recipe
+
+    # サイドカーなしで上書きすると古いサイドカーは削除される
+    Recipe.load(tmp_path / "plain.json").save(path)
+    assert not sidecar_path.exists()
+    assert json.loads(path.read_text(encoding="utf-8"))["version"] == "0.1"
+    assert Recipe.load(path) == recipe
+
+
+def test_recipe_schema_matches_saved_files(tmp_path):
+    jsonschema = pytest.importorskip("jsonschema")
+    import json
+    from pathlib import Path
+    from core.recipe.schema import Recipe, Segment
+
+    schema = json.loads(
+        (Path(__file__).parent.parent / "schemas" / "recipe.v1.json").read_text(encoding="utf-8")
+    )
+    seg = Segment(t0=0.0, t1=1.0, time_warp_points=[(0.0, 0.0), (1.0, 1.1)],
+                  pitch_target_curve=[(0.0, 220.0)], confidence=0.9,
+                  pitch_strength=1.0, time_strength=1.0)
+    recipe = Recipe(version="0.1", sample_rate=44100, global_key_shift_semitones=0.0,
+                    segments=[seg])
+    for sidecar in (False, True):
+        path = tmp_path / f"recipe_{sidecar}.json"
+        recipe.save(path, sidecar=sidecar)
+        jsonschema.validate(json.loads(path.read_text(encoding="utf-8")), schema)
+
+    # Recipe.load が必要とするフィールドはスキーマでも必須
+    data = json.loads(path.read_text(encoding="utf-8"))
+    del data["sidecar"]["recipe_version"]
+    with pytest.raises(jsonschema.ValidationError):
+        jsonschema.validate(data, schema)
+
+
 # ---- recipe/generator ------------------------------------------------------
 
 def test_generator_basic():
@@ -139,6 +222,94 @@ def test_generator_basic():
         assert 0.0 <= seg.pitch_strength <= 1.0
 
 
+def test_generator_segment_stats_and_full_resolution():
+    from core.recipe.generator import MAX_WARP_POINTS, generate
+
+    duration = 6.0
+    times = np.arange(600, dtype=np.float32) * 0.01
+    ref_f0 = (220.0 + times * 10).astype(np.float32)
+    confidence = np.repeat([1.0, 0.2, 0.6], 200).astype(np.float32)
+    warp_map = np.column_stack([times, times + 0.5]).astype(np.float32)
+    kwargs = dict(
+        new_audio_duration=duration, sample_rate=SR, global_key_shift_semitones=0.0,
+        alignment={"warp_map": warp_map, "confidence_per_frame": confidence, "new_times": times},
+        ref_f0=ref_f0, ref_times=times, new_f0=ref_f0, new_times=times,
+        voiced_mask=np.repeat([True, False, True], 200),
+    )
+
+    recipe = generate(**kwargs)
+    assert [round(s.confidence, 3) for s in recipe.segments] == [1.0, 0.2, 0.6]
+    assert [s.protect_unvoiced for s in recipe.segments] == [False, True, False]
+    assert [w.t0 for w in recipe.warnings] == [2.0]
+    assert all(len(s.pitch_target_curve) == MAX_WARP_POINTS for s in recipe.segments)
+
+    # ワープマップ経由で 0.5 秒先のリファレンス F0 が目標になる
+    curve = generate(**kwargs, full_resolution_pitch=True).segments[1].pitch_target_curve
+    assert curve.shape == (200, 2)
+    assert np.allclose(curve[:, 1], 220.0 + (curve[:, 0] + 0.5) * 10, atol=1e-3)
+
+
+def test_generator_adaptive_passthrough_and_render():
+    from core.recipe.generator import generate
+    from core.renderer.rubberband_renderer import RenderCache, render
+
+    duration = 10.0
+    times = np.arange(1000, dtype=np.float32) * 0.01
+    voiced = np.ones(1000, dtype=bool)
+    voiced[200:300] = False   # 2.0〜3.0 秒が無声
+    recipe = generate(
+        new_audio_duration=duration, sample_rate=SR, global_key_shift_semitones=0.0,
+        alignment={"warp_map": np.column_stack([times, times]).astype(np.float32),
+                   "confidence_per_frame": np.ones(1000, dtype=np.float32), "new_times": times},
+        ref_f0=np.full(1000, 440.0, dtype=np.float32), ref_times=times,
+        new_f0=np.full(1000, 220.0, dtype=np.float32), new_times=times,
+        voiced_mask=voiced, segmentation="adaptive", onsets=np.array([6.3]),
+    )
+    bounds = [(round(s.t0, 2), round(s.t1, 2), s.passthrough) for s in recipe.segments]
+    # 無声区間はパススルー（前後に余白を残す）、7 秒のフレーズはオンセット位置を含めて分割される
+    assert bounds[:2] == [(0.0, 2.05, False), (2.05, 2.95, True)]
+    assert 6.3 in [t0 for t0, _, _ in bounds] and bounds[-1][1] == duration
+    assert all(t1 - t0 <= 4.0 for t0, t1, _ in bounds)
+
+    audio = _sine(duration=duration)
+    cache = RenderCache()
+    out = render(audio, SR, recipe, backend="librosa",
+                 new_f0=np.full(1000, 220.0), new_times=times, cache=cache)
+    assert cache.last_rendered == cache.last_total - 1
+    # パススルー区間（クロスフェード部分を除く）は入力と同一、前後はピッチシフトされる
+    body = slice(int(2.1 * SR), int(2.9 * SR))
+    assert np.array_equal(out[body], audio[body])
+    assert not np.allclose(out[:SR], audio[:SR], atol=1e-3)
+
+
+def test_passthrough_follows_warp_across_silence():
+    from core.recipe.generator import generate
+    from core.renderer.rubberband_renderer import render
+
+    # リファレンス: フレーズ A 0〜2 秒、無音 0.6 秒、フレーズ B 2.6〜5 秒
+    # 新規テイク  : 無音が 1.0 秒あり、フレーズ B が 3.0 秒から始まる
+    times = np.arange(540, dtype=np.float32) * 0.01
+    voiced = (times < 2.0) | (times >= 3.0)
+    # 無音の内側（前後 0.05 秒の余白を除く 0.9 秒）を 0.5 秒に写すワープ
+    ref_at = np.interp(times, [0.0, 2.05, 2.95, 5.4], [0.0, 2.05, 2.55, 5.0])
+    audio = np.where(np.repeat(voiced, SR // 100), _sine(duration=5.4), 0.0).astype(np.float32)
+    f0 = np.where(voiced, 440.0, 0.0).astype(np.float32)
+    recipe = generate(
+        new_audio_duration=5.4, sample_rate=SR, global_key_shift_semitones=0.0,
+        alignment={"warp_map": np.column_stack([times, ref_at]).astype(np.float32),
+                   "confidence_per_frame": np.ones(540, dtype=np.float32), "new_times": times},
+        ref_f0=f0, ref_times=times, new_f0=f0, new_times=times,
+        voiced_mask=voiced, segmentation="adaptive",
+    )
+    assert [s.passthrough for s in recipe.segments].count(True) == 1
+
+    out = render(audio, SR, recipe, backend="librosa", new_f0=f0, new_times=times)
+    # 無音の長さがリファレンスに揃い、フレーズ B がリファレンスと同じ時刻から始まる
+    onset_b = (int(2.2 * SR) + np.argmax(np.abs(out[int(2.2 * SR):]) > 0.1)) / SR
+    assert abs(onset_b - 2.6) < 0.03
+    assert abs(len(out) / SR - 5.0) < 0.03
+
+
 # ---- voiced_detector -------------------------------------------------------
 
 def test_voiced_detector_silence():
@@ -155,3 +326,776 @@ def test_voiced_detector_sine():
     audio = _sine(440.0)
     mask = detect_voiced(audio, SR)
     assert mask.mean() > 0.5  # 大半のフレームが有声と判定されること
+
+
+# ---- rmvpe (チャンク推論) --------------------------------------------------
+
+@pytest.fixture(scope="module")
+def rmvpe_random(tmp_path_factory):
+    """ランダム重みの RMVPE（推論経路の検証用。学習済みモデルは不要）。"""
+    import torch
+    import core.pitch.rmvpe_wrapper  # noqa: F401  rmvpe_src を sys.path に追加する
+    from src.inference import RMVPE
+    from src.model import E2E0
+
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("rmvpe") / "rmvpe_random.pt"
+    torch.save(E2E0(4, 1, (2, 2)).state_dict(), path)
+    return RMVPE(model_path=str(path))
+
+
+def test_rmvpe_chunked_inference(rmvpe_random):
+    audio = _sine(220.0, sr=16000, duration=3.0)
+    full = rmvpe_random.infer_from_audio(audio, 16000, device="cpu")
+
+    def assert_close(f0):
+        assert f0.shape == full.shape
+        assert ((f0 > 0) == (full > 0)).mean() >= 0.95
+        both = (f0 > 0) & (full > 0)
+        assert np.median(np.abs(1200 * np.log2(f0[both] / full[both]))) < 5.0
+
+    assert_close(rmvpe_random.infer_from_audio_chunked(
+        audio, 16000, device="cpu", chunk_frames=96, overlap_frames=16
+    ))
+
+    # ウィンドウが入力より長いときは一括推論と一致すること
+    single = rmvpe_random.infer_from_audio_chunked(audio, 16000, device="cpu", chunk_frames=4096)
+    assert np.array_equal(single, full)
+
+    # 重なり 1 フレームで最終ウィンドウが 2 フレームだけになる長さ（317 = 63 * 5 + 2 フレーム）
+    short_tail = _sine(220.0, sr=16000, duration=316 * 160 / 16000)
+    full = rmvpe_random.infer_from_audio(short_tail, 16000, device="cpu")
+    assert_close(rmvpe_random.infer_from_audio_chunked(
+        short_tail, 16000, device="cpu", chunk_frames=64, overlap_frames=0
+    ))
+
+
+def test_rmvpe_batch_inference(rmvpe_random, monkeypatch):
+    audios = [
+        _sine(220.0, sr=16000, duration=3.0),
+        _sine(330.0, sr=16000, duration=1.2),
+        _sine(440.0, sr=16000, duration=0.5),
+    ]
+    shapes = []
+    forward = rmvpe_random.model.forward
+    monkeypatch.setattr(rmvpe_random.model, "forward",
+                        lambda mel: shapes.append(mel.shape) or forward(mel))
+    # 1 回の forward の合計フレーム数は max_batch_frames まで
+    rmvpe_random.infer_batch(audios, 16000, device="cpu", chunk_frames=96, overlap_frames=16,
+                             max_batch_frames=96)
+    assert max(s[0] * s[-1] for s in shapes) <= 96
+
+    shapes.clear()
+    batched = rmvpe_random.infer_batch(
+        audios, 16000, device="cpu", chunk_frames=96, overlap_frames=16, batch_size=4,
+        max_batch_frames=192,
+    )
+    assert len(batched) == len(audios)
+    assert max(s[0] * s[-1] for s in shapes) <= 192
+    assert any(s[0] > 1 for s in shapes)   # 短いウィンドウはまとめて推論する
+
+    # バッチ推論はファイル単位のチャンク推論と同じ結果になること
+    for audio, f0 in zip(audios, batched):
+        single = rmvpe_random.infer_from_audio_chunked(
+            audio, 16000, device="cpu", chunk_frames=96, overlap_frames=16
+        )
+        assert f0.shape == single.shape
+        # ランダム重みでは argmax がほぼ同点のフレームがあるため、ごく一部の不一致は許容する
+        cents_diff = np.abs(1200.0 * np.log2((f0 + 1e-6) / (single + 1e-6)))
+        assert (cents_diff < 1.0).mean() > 0.95
+
+
+def test_rmvpe_batch_default_budget_stacks_full_windows(rmvpe_random, monkeypatch):
+    import torch
+
+    # 32 秒のテイク 2 本（3201 フレーム = 3200 フレームのウィンドウ + 短い最終ウィンドウ）
+    audios = [np.zeros(32 * 16000, dtype=np.float32) for _ in range(2)]
+    shapes = []
+
+    def forward(mel):
+        shapes.append(mel.shape)
+        return torch.zeros(mel.shape[0], mel.shape[-1], 360)
+
+    monkeypatch.setattr(rmvpe_random.model, "forward", forward)
+    rmvpe_random.infer_batch(audios, 16000, device="cpu", max_batch_frames=3200)
+    one_window = len(shapes)   # 以前の既定（1 回の forward は 1 ウィンドウ分まで）
+
+    shapes.clear()
+    f0_list = rmvpe_random.infer_batch(audios, 16000, device="cpu")
+    assert [len(f0) for f0 in f0_list] == [3201, 3201]
+    assert len(shapes) < one_window
+    assert any(s[0] == 2 and s[-1] == 3200 for s in shapes)   # 全長のウィンドウをまとめる
+
+
+def test_rmvpe_banded_viterbi_matches_librosa(monkeypatch):
+    import librosa
+    import torch
+    import core.pitch.rmvpe_wrapper  # noqa: F401  rmvpe_src を sys.path に追加する
+    from src import utils
+    from src.utils import to_local_average_cents, to_viterbi_cents, viterbi_band
+
+    # 緩やかに動くピークに、帯の外へ跳ぶ区間とノイズを加えた salience
+    rng = np.random.default_rng(0)
+    n_frames, n_bins = 400, 360
+    center = np.clip(np.cumsum(rng.normal(0, 4, n_frames)), -150, 150) + 180
+    bins = np.arange(n_bins)
+    salience = np.exp(-0.5 * ((bins[None, :] - center[:, None]) / 3) ** 2).astype(np.float32)
+    salience[100:150] = np.roll(salience[100:150], 150, axis=1)
+    salience += rng.random((n_frames, n_bins)).astype(np.float32) * 0.02
+
+    xx, yy = np.meshgrid(bins, bins)
+    transition = np.maximum(30 - abs(xx - yy), 0)
+    transition = transition / transition.sum(axis=1, keepdims=True)
+    prob = salience / salience.sum(axis=1, keepdims=True)
+    expected = librosa.sequence.viterbi(prob.T, transition)
+    assert np.array_equal(viterbi_band(torch.from_numpy(prob)), expected)
+    # バックポインタを CPU に移す区切りがフレーム数の約数でなくても同じ経路になる
+    monkeypatch.setattr(utils, "VITERBI_PTR_CHUNK", 7)
+    assert np.array_equal(viterbi_band(torch.from_numpy(prob)), expected)
+
+    # 一括計算はフレームごとの計算と一致すること
+    per_frame = [to_local_average_cents(salience[i], int(expected[i])) for i in range(n_frames)]
+    assert np.allclose(to_viterbi_cents(salience), per_frame, atol=0.01)
+    per_frame = [to_local_average_cents(salience[i], None, 0.5) for i in range(n_frames)]
+    assert np.allclose(to_local_average_cents(salience, None, 0.5), per_frame, atol=0.01)
+
+
+def test_runtime_profile(rmvpe_random):
+    import torch
+    from core import runtime
+
+    threads = torch.get_num_threads()
+    mel = torch.randn(1, 128, 64)
+    with runtime.inference():
+        expected = rmvpe_random.model(mel)
+    try:
+        profile = runtime.configure(device="cpu", threads=1, precision="int8")
+        assert torch.get_num_threads() == 1
+        assert runtime.resolve_device() == "cpu"
+
+        # int8 は量子化したコピーを返し、元のモデルは変えない
+        quantized = runtime.prepare_model(rmvpe_random.model, "cpu")
+        assert quantized is not rmvpe_random.model
+        with runtime.inference():
+            out = quantized(mel)
+        assert out.dtype == torch.float32
+        assert (out - expected).abs().max() < 0.05
+
+        runtime.configure(device="cpu", threads=1, precision="bf16")
+        with runtime.inference():
+            out = runtime.prepare_model(rmvpe_random.model, "cpu")(mel)
+        assert out.dtype == torch.float32
+        assert (out - expected).abs().max() < 0.05
+        assert profile.precision == "int8"
+    finally:
+        runtime.configure()
+        torch.set_num_threads(threads)
+
+    with pytest.raises(ValueError):
+        runtime.configure(precision="fp8")
+    with pytest.raises(ValueError):
+        runtime.configure(device="tpu")
+
+
+def test_warmup_stages_and_lazy_imports():
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    from core.warmup import Preloader, warmup
+
+    with pytest.raises(ValueError):
+        warmup(["tensorflow"])
+    timings = warmup(["torch"])
+    assert list(timings) == ["torch"] and timings["torch"] >= 0
+
+    preloader = Preloader(["rmvpe", "torch"], sep_model="htdemucs")
+    assert preloader.stages == ["torch", "rmvpe"]   # パイプラインで使う順に並べ替える
+
+    # CLI の import と既定プロファイルの設定では torch / Demucs を読まない
+    code = (
+        "import sys, cli.main\n"
+        "from core import runtime\n"
+        "runtime.configure()\n"
+        "heavy = ('torch', 'demucs', 'librosa', 'pyrubberband')\n"
+        "print(sorted(m for m in heavy if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         check=True, cwd=Path(__file__).parent.parent)
+    assert out.stdout.strip() == "[]"
+
+
+def test_job_server_accepts_and_reports_jobs(tmp_path, monkeypatch):
+    import json
+    import sys
+    import threading
+    import urllib.error
+    import urllib.request
+
+    from cli.server import make_server
+
+    # サーバーはジョブの出力を取り込むために sys.stdout / sys.stderr を置き換える
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    monkeypatch.setattr(sys, "stderr", sys.stderr)
+    server = make_server(port=0, workers=2)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def request(path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        with urllib.request.urlopen(urllib.request.Request(base + path, data=data)) as res:
+            return res.status, json.loads(res.read())
+
+    try:
+        args = ["--ref", "missing.wav", "--vocal", "v.wav", "--stem"]
+        status, job = request("/jobs", {"command": "run", "cwd": str(tmp_path), "args": args})
+        assert status == 202 and job["status"] in ("queued", "running", "failed")
+        _, job = request(f"/jobs/{job['id']}?wait=30")
+        assert job["status"] == "failed" and job["exit_code"] == 1
+        assert str(tmp_path / "missing.wav") in job["log"]   # 相対パスは cwd 基準
+
+        for payload in ({"command": "run", "args": ["--ref", "r.wav"]},
+                        {"command": "warmup", "args": []},
+                        {"command": "run", "args": ["--ref", "r.wav", "--vocal", "v.wav",
+                                                    "--precision", "int8"]}):
+            with pytest.raises(urllib.error.HTTPError) as e:
+                request("/jobs", payload)
+            assert e.value.code == 400
+
+        _, health = request("/health")
+        assert health["workers"] == 2 and health["jobs"]["failed"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.queue.shutdown()
+
+
+def test_rmvpe_torchscript_export(tmp_path):
+    import torch
+    from core import runtime
+    from core.pitch import rmvpe_wrapper
+    from src.model import E2E0
+
+    torch.manual_seed(0)
+    path = tmp_path / "rmvpe.pt"
+    torch.save(E2E0(4, 1, (2, 2)).state_dict(), path)
+
+    out = rmvpe_wrapper.export_torchscript(path)
+    assert out == tmp_path / "rmvpe.ts.pt"
+    result = rmvpe_wrapper.check_torchscript(path)
+    assert result["passed"], result
+
+    # torchscript を有効にすると _get_model は書き出したモデルを読み込む
+    try:
+        runtime.configure(device="cpu", torchscript=True)
+        model = rmvpe_wrapper._get_model(path, "cpu")
+        assert isinstance(model.model, torch.jit.ScriptModule)
+        with pytest.raises(FileNotFoundError):
+            runtime.configure(device="cpu", precision="int8", torchscript=True)
+            rmvpe_wrapper._get_model(path, "cpu")
+    finally:
+        runtime.configure()
+        rmvpe_wrapper._model_cache.clear()
+
+
+def test_rmvpe_quantized_export_removed_when_check_fails(tmp_path, monkeypatch):
+    import torch
+    from core import runtime
+    from core.pitch import rmvpe_wrapper
+    from scripts import download_models
+    from src.model import E2E0
+
+    torch.manual_seed(0)
+    path = tmp_path / "rmvpe.pt"
+    torch.save(E2E0(4, 1, (2, 2)).state_dict(), path)
+    monkeypatch.setitem(download_models.MODELS["rmvpe"], "dest", path)
+
+    def torchscript_exists(quantized):
+        return rmvpe_wrapper.torchscript_path(path, quantized).exists()
+
+    # int8 版の確認だけ基準を満たさないようにする（基準値を下回る誤差はあり得ない）
+    check = rmvpe_wrapper.check_torchscript
+    checked = []
+
+    def failing_int8_check(model_path=None, quantized=False):
+        checked.append((quantized, torchscript_exists(quantized)))
+        if quantized:
+            monkeypatch.setattr(rmvpe_wrapper, "CHECK_MAX_CENTS", -1.0)
+        return check(model_path, quantized=quantized)
+
+    monkeypatch.setattr(rmvpe_wrapper, "check_torchscript", failing_int8_check)
+    with pytest.raises(SystemExit) as e:
+        download_models.prepare(quantize=True)
+    assert e.value.code == 1
+    assert checked == [(False, True), (True, True)]   # 両方とも書き出してから確認した
+    assert (tmp_path / "rmvpe.ts.pt").exists()
+    assert not (tmp_path / "rmvpe.int8.ts.pt").exists()
+
+    # 削除された量子化版は読み込まない
+    try:
+        runtime.configure(device="cpu", precision="int8", torchscript=True)
+        with pytest.raises(FileNotFoundError):
+            rmvpe_wrapper._get_model(path, "cpu")
+    finally:
+        runtime.configure()
+        rmvpe_wrapper._model_cache.clear()
+
+
+# ---- renderer (librosa バックエンド) ----------------------------------------
+
+def _identity_recipe(global_shift: float = 0.0, duration: float = DURATION):
+    from core.recipe.schema import Recipe, Segment
+
+    seg = Segment(
+        t0=0.0, t1=duration,
+        time_warp_points=[(0.0, 0.0), (duration, duration)],
+        pitch_target_curve=[(0.0, 440.0), (duration, 440.0)],
+        confidence=1.0,
+        pitch_strength=0.0,
+        time_strength=0.0,
+        protect_unvoiced=True,
+    )
+    return Recipe(
+        version="0.1", sample_rate=SR,
+        global_key_shift_semitones=global_shift, segments=[seg],
+    )
+
+
+def test_renderer_librosa_backend():
+    from core.renderer.rubberband_renderer import render
+
+    audio = _sine()
+    out = render(audio, SR, _identity_recipe(), backend="librosa")
+    assert np.allclose(out, audio, atol=1e-6)
+
+    shifted = render(audio, SR, _identity_recipe(global_shift=3.0), backend="librosa")
+    assert abs(len(shifted) - len(audio)) < SR * 0.1
+    assert not np.isnan(shifted).any()
+
+
+def test_renderer_unknown_backend():
+    from core.renderer.rubberband_renderer import render
+
+    with pytest.raises(ValueError):
+        render(_sine(), SR, _identity_recipe(), backend="sox")
+
+
+# ---- renderer (continuous モード) -------------------------------------------
+
+def _peak_hz(audio: np.ndarray, sr: int = SR) -> float:
+    spectrum = np.abs(np.fft.rfft(audio))
+    return float(np.argmax(spectrum)) * sr / len(audio)
+
+
+def test_warp_renderer_phase_vocoder_identity():
+    from core.renderer.warp_renderer import _phase_vocoder_render
+
+    audio = _sine().astype(np.float64)
+    knots = np.array([0.0, len(audio)])
+    out = _phase_vocoder_render(audio, knots, knots, np.array([0.0]), np.array([0.0]))
+    assert len(out) == len(audio)
+    assert np.allclose(out[2048:-2048], audio[2048:-2048], atol=1e-3)
+
+
+def test_render_continuous_time_and_pitch():
+    from core.recipe.schema import Recipe, Segment
+    from core.renderer.rubberband_renderer import render
+
+    audio = _sine(440.0)
+    times = np.arange(0, DURATION, 0.01, dtype=np.float32)
+    new_f0 = np.full(len(times), 440.0, dtype=np.float32)
+    target = 440.0 * 2 ** (2 / 12)
+    seg = Segment(
+        t0=0.0, t1=DURATION,
+        time_warp_points=[(0.0, 0.0), (DURATION, DURATION * 1.1)],
+        pitch_target_curve=[(0.0, target), (DURATION, target)],
+        confidence=1.0,
+        pitch_strength=1.0,
+        time_strength=1.0,
+        protect_unvoiced=False,
+    )
+    recipe = Recipe(version="0.1", sample_rate=SR, global_key_shift_semitones=0.0, segments=[seg])
+
+    out = render(audio, SR, recipe, new_f0=new_f0, new_times=times,
+                 backend="librosa", mode="continuous")
+    assert abs(len(out) - DURATION * 1.1 * SR) < SR * 0.01
+    mid = out[SR // 2:SR // 2 + SR]
+    assert abs(_peak_hz(mid) - target) < 5.0
+
+
+def _stretch_recipe(n_segments: int = 3):
+    from core.recipe.schema import Recipe, Segment
+
+    seg_dur = DURATION / n_segments
+    segments = []
+    for k in range(n_segments):
+        t0, t1 = k * seg_dur, (k + 1) * seg_dur
+        segments.append(Segment(
+            t0=t0, t1=t1,
+            time_warp_points=[(t0, t0), (t1, t0 + seg_dur * (1.0 + 0.1 * (k % 2)))],
+            pitch_target_curve=[(t0, 440.0), (t1, 440.0)],
+            confidence=1.0, pitch_strength=0.0, time_strength=1.0,
+            protect_unvoiced=True,
+        ))
+    return Recipe(version="0.1", sample_rate=SR, global_key_shift_semitones=0.0,
+                  segments=segments)
+
+
+def test_render_modes_stretch_in_same_direction():
+    from core.recipe.schema import Recipe, Segment
+    from core.renderer.rubberband_renderer import render
+
+    audio = _sine(440.0)
+    for factor in (1.2, 0.8):   # リファレンス側の区間が長い / 短い
+        seg = Segment(
+            t0=0.0, t1=DURATION,
+            time_warp_points=[(0.0, 0.0), (DURATION, DURATION * factor)],
+            pitch_target_curve=[(0.0, 440.0), (DURATION, 440.0)],
+            confidence=1.0, pitch_strength=0.0, time_strength=1.0,
+        )
+        recipe = Recipe(version="0.1", sample_rate=SR, global_key_shift_semitones=0.0,
+                        segments=[seg])
+        for mode in ("segment", "continuous"):
+            out = render(audio, SR, recipe, backend="librosa", mode=mode)
+            assert abs(len(out) / len(audio) - factor) < 0.02, (mode, factor, len(out))
+
+
+def test_renderer_parallel_matches_serial():
+    from core.renderer.rubberband_renderer import render
+
+    audio = _sine()
+    recipe = _stretch_recipe()
+    serial = render(audio, SR, recipe, backend="librosa", workers=1)
+    parallel = render(audio, SR, recipe, backend="librosa", workers=2)
+    assert np.array_equal(serial, parallel)
+    assert not np.isnan(serial).any()
+
+
+def test_renderer_cache_rerenders_dirty_segments_only():
+    from core.renderer.rubberband_renderer import RenderCache, render
+
+    audio = _sine()
+    recipe = _stretch_recipe()
+    cache = RenderCache()
+
+    first = render(audio, SR, recipe, backend="librosa", cache=cache)
+    # 等倍の [0] [2] は DSP を通さない
+    assert (cache.last_rendered, cache.last_total) == (1, 3)
+
+    again = render(audio, SR, recipe, backend="librosa", cache=cache)
+    assert cache.last_rendered == 0
+    assert np.array_equal(first, again)
+
+    recipe.segments[1].time_strength = 0.5
+    partial = render(audio, SR, recipe, backend="librosa", cache=cache)
+    assert cache.last_rendered == 1
+    assert np.array_equal(partial, render(audio, SR, recipe, backend="librosa"))
+
+
+def test_renderer_merges_identity_segments():
+    from core.renderer.rubberband_renderer import RenderCache, render
+
+    audio = _sine()
+    recipe = _stretch_recipe(6)   # 偶数番目は等倍、奇数番目は 1.1 倍
+    recipe.segments[3].time_strength = 0.0
+    cache = RenderCache()
+    out = render(audio, SR, recipe, backend="librosa", cache=cache)
+    # [0] [1] [2-4] [5] の 4 範囲にまとまり、DSP は 2 範囲だけ
+    assert (cache.last_rendered, cache.last_total) == (2, 4)
+    assert out.dtype == np.float32
+    body = int(DURATION / 6 * SR) - SR // 100
+    assert np.array_equal(out[:body], audio[:body])
+
+
+# ---- analysis_cache --------------------------------------------------------
+
+def test_analysis_cache_hit_miss_and_eviction(tmp_path):
+    from core.analysis_cache import AnalysisCache, cached_detect_onsets
+
+    cache = AnalysisCache(tmp_path)
+    audio = _sine()
+
+    first = cached_detect_onsets(cache, audio, SR)
+    again = cached_detect_onsets(cache, audio, SR)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert np.array_equal(first, again)
+
+    # 内容が変われば別エントリ
+    cached_detect_onsets(cache, _sine(220.0), SR)
+    assert cache.misses == 2
+
+    # fetch_many はキャッシュにない入力だけを計算する
+    calls = []
+
+    def compute_many(audios):
+        calls.append(len(audios))
+        return [(a[:10], a[10:20]) for a in audios]
+
+    audios = [audio, _sine(330.0)]
+    cache.fetch_many("pair", audios[:1], SR, compute_many, version="v1")
+    out = cache.fetch_many("pair", audios, SR, compute_many, version="v1")
+    assert calls == [1, 1]
+    assert np.array_equal(out[0][1], audio[10:20])
+
+    # 上限を超えたら古いエントリから削除
+    cache.max_bytes = cache.size_bytes() // 2
+    cache.evict()
+    assert 0 < cache.size_bytes() <= cache.max_bytes
+
+    cache.clear()
+    assert cache.size_bytes() == 0
+
+
+def test_analysis_cache_concurrent_writes(tmp_path):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from core.analysis_cache import AnalysisCache
+
+    cache = AnalysisCache(tmp_path)
+    audio = _sine()
+    expected = np.arange(1_000_000, dtype=np.float32)
+    barrier = threading.Barrier(8)
+
+    # 同じキーを複数スレッドから同時に計算・保存しても一時ファイルが衝突しない
+    def fetch(_):
+        def compute():
+            barrier.wait()
+            return expected.copy()
+        return cache.fetch("same", audio, SR, compute, version="v1")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(fetch, range(8)))
+    assert all(np.array_equal(r, expected) for r in results)
+    assert (cache.hits, cache.misses) == (0, 8)
+    assert not list(tmp_path.glob("*/*.tmp.npz"))
+    assert np.array_equal(cache.fetch("same", audio, SR, None, version="v1"), expected)
+
+
+# ---- cli -------------------------------------------------------------------
+
+def test_batch_collect_takes(tmp_path):
+    from cli.main import _collect_takes
+
+    for name in ("b.wav", "a.flac", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "c.wav").write_bytes(b"")
+
+    takes = _collect_takes(
+        [str(tmp_path), str(tmp_path / "*.wav"), str(tmp_path / "sub" / "c.wav")]
+    )
+    assert [p.name for p in takes] == ["a.flac", "b.wav", "c.wav"]
+    assert _collect_takes([str(tmp_path / "missing*.wav")]) == []
+
+
+def test_batch_rejects_same_named_takes(tmp_path):
+    from cli.main import _cmd_batch, build_parser
+
+    for sub in ("a", "b"):
+        (tmp_path / sub).mkdir()
+        (tmp_path / sub / "take1.wav").write_bytes(b"")
+    out_dir = tmp_path / "out"
+    args = build_parser().parse_args([
+        "batch", "--ref", str(tmp_path / "ref.wav"),
+        "--takes", str(tmp_path / "a"), str(tmp_path / "b"), "--out-dir", str(out_dir),
+    ])
+    # 出力が上書きし合わないよう、処理を始める前にエラーで止める
+    with pytest.raises(SystemExit) as e:
+        _cmd_batch(args)
+    assert e.value.code == 1
+    assert not out_dir.exists()
+
+
+def test_batch_f0_groups_isolate_failing_take():
+    from pathlib import Path
+
+    from cli.main import _estimate_takes_f0
+
+    takes = [Path(f"take{k}.wav") for k in range(5)]
+    calls = []
+
+    def load_analysis(take):
+        if take.name == "take4.wav":
+            raise ValueError("読み込めません")
+        return take.name
+
+    def estimate(signals):
+        calls.append(list(signals))
+        if "take1.wav" in signals:
+            raise RuntimeError("F0 失敗")
+        return [(s, None) for s in signals]
+
+    take_f0, take_errors = _estimate_takes_f0(takes, 2, load_analysis, estimate)
+    # --jobs 件ずつまとめて推論し、失敗したグループだけ 1 件ずつやり直す
+    assert calls == [["take0.wav", "take1.wav"], ["take0.wav"], ["take1.wav"],
+                     ["take2.wav", "take3.wav"]]
+    assert sorted(p.name for p in take_f0) == ["take0.wav", "take2.wav", "take3.wav"]
+    assert {p.name: type(e) for p, e in take_errors.items()} == {
+        "take1.wav": RuntimeError, "take4.wav": ValueError,
+    }
+
+
+def test_demucs_prune_to_vocals():
+    pytest.importorskip("demucs")
+    import torch
+    from demucs.apply import BagOfModels, apply_model
+    from demucs.demucs import Demucs
+    from core.separation.demucs_wrapper import _prune_to_vocals
+
+    torch.manual_seed(0)
+    sources = ["drums", "bass", "other", "vocals"]
+    models = [Demucs(sources, channels=4, depth=2, lstm_layers=0, segment=1).eval()
+              for _ in sources]
+    bag = BagOfModels(models, np.eye(4).tolist())   # ソースごとの専用モデル（htdemucs_ft 型）
+    pruned = _prune_to_vocals(bag)
+    assert len(pruned.models) == 1
+
+    mix = torch.randn(1, 2, 44100)
+    with torch.no_grad():
+        full = apply_model(bag, mix, shifts=0)[0, 3]
+        vocal = apply_model(pruned, mix, shifts=0)[0, 3]
+    assert torch.equal(full, vocal)
+
+
+def test_demucs_streaming_matches_in_memory(tmp_path, monkeypatch):
+    pytest.importorskip("demucs")
+    import soundfile as sf
+    import torch
+    from demucs.apply import BagOfModels
+    from demucs.demucs import Demucs
+    from core.separation import demucs_wrapper
+
+    torch.manual_seed(0)
+    bag = BagOfModels([Demucs(["drums", "bass", "other", "vocals"],
+                              channels=4, depth=2, lstm_layers=0, segment=1).eval()])
+    monkeypatch.setitem(demucs_wrapper._model_cache, ("tiny", "cpu", True), bag)
+    monkeypatch.setattr(torch.cuda, "is_available", lambda: False)
+
+    sr = 48000
+    mix = (np.random.default_rng(0).standard_normal((sr * 7, 2)) * 0.1).astype(np.float32)
+    sf.write(tmp_path / "mix.wav", mix, sr, subtype="FLOAT")
+    full = demucs_wrapper.separate_vocal(mix.T.copy(), sr, model_name="tiny", profile="fast")
+    n = demucs_wrapper.separate_vocal_to_file(
+        tmp_path / "mix.wav", tmp_path / "vocal.wav", model_name="tiny", profile="fast",
+        block_seconds=3, overlap_seconds=1,
+    )
+    streamed, out_sr = sf.read(tmp_path / "vocal.wav", dtype="float32")
+    assert out_sr == demucs_wrapper.DEMUCS_SR
+    assert n == len(streamed) == len(full)
+    # ブロック境界付近以外はほぼ一致する
+    assert np.sqrt(np.mean((streamed - full) ** 2)) < 0.1 * np.sqrt(np.mean(full ** 2))
+
+
+def test_separation_profiles_from_cli():
+    from cli.main import PRESETS, _separation_kwargs, build_parser
+    from core.separation.demucs_wrapper import separation_params
+
+    args = build_parser().parse_args(
+        ["run", "--ref", "r.wav", "--vocal", "v.wav", "--preset", "long", "--sep-shifts", "2"]
+    )
+    kwargs = _separation_kwargs(args, PRESETS[args.preset])
+    assert kwargs["profile"] == "fast"
+    params = separation_params(kwargs["profile"], **{
+        k: v for k, v in kwargs.items() if k not in ("model_name", "profile", "num_workers")
+    })
+    assert params == {"segment": None, "overlap": 0.1, "shifts": 2, "split": True}
+
+    with pytest.raises(ValueError):
+        separation_params("ultra")
+    with pytest.raises(ValueError):
+        separation_params("fast", overlap=1.0)
+
+
+# ---- alignment -------------------------------------------------------------
+
+def test_banded_dtw_matches_dtw_python():
+    from dtw import dtw
+    from core.alignment.banded_dtw import banded_dtw
+
+    rng = np.random.default_rng(0)
+    for n, m, w in [(120, 140, 30), (80, 80, 10)]:
+        x = rng.normal(size=(n, 2))
+        y = rng.normal(size=(m, 2))
+        ref = dtw(x, y, window_type="sakoechiba", window_args={"window_size": w})
+        out = banded_dtw(x, y, w)
+        assert np.isclose(out.distance, ref.distance)
+        assert np.isclose(out.normalized_distance, ref.normalizedDistance)
+        assert np.array_equal(out.index1, ref.index1)
+        assert np.array_equal(out.index2, ref.index2)
+
+
+def test_align_native_matches_dtw_python():
+    from core.alignment.dtw_aligner import align
+
+    times = np.arange(300, dtype=np.float32) * 0.01
+    ref_f0 = np.where(times < 1.5, 220.0, 330.0).astype(np.float32)
+    new_f0 = np.where(times < 1.7, 220.0, 330.0).astype(np.float32)
+    onsets = np.array([0.2, 1.5])
+    kwargs = dict(ref_f0=ref_f0, ref_times=times, ref_onsets=onsets,
+                  new_f0=new_f0, new_times=times, new_onsets=onsets + 0.2)
+
+    native = align(**kwargs)
+    reference = align(**kwargs, engine="dtw-python")
+    assert np.array_equal(native["warp_map"], reference["warp_map"])
+    assert np.allclose(native["confidence_per_frame"], reference["confidence_per_frame"], atol=1e-5)
+
+
+def test_multiscale_dtw_follows_band_path():
+    from core.alignment.banded_dtw import banded_dtw, multiscale_dtw
+
+    t = np.linspace(0, 20, 2000)
+    ref = np.sin(t) + 0.3 * np.sin(3.1 * t)
+    new = np.interp(t + 0.5 * np.sin(t / 3), t, ref)[:1900]
+
+    band = banded_dtw(new, ref, 300)
+    multi = multiscale_dtw(new, ref, radius=10, window_size=300, min_size=128)
+    assert np.isclose(multi.distance, band.distance, rtol=1e-3)
+    assert multi.index1[0] == 0 and multi.index2[-1] == len(ref) - 1
+    assert np.all(np.diff(multi.index1) >= 0) and np.all(np.diff(multi.index2) >= 0)
+
+
+def test_align_warp_map_array_and_list_view():
+    from core.alignment.dtw_aligner import align
+
+    times = np.arange(200, dtype=np.float32) * 0.01
+    f0 = np.where(times < 1.0, 220.0, 330.0).astype(np.float32)
+    result = align(ref_f0=f0, ref_times=times, ref_onsets=np.array([1.0]),
+                   new_f0=f0, new_times=times, new_onsets=np.array([1.0]))
+
+    warp_map = result["warp_map"]
+    assert warp_map.shape == (200, 2) and warp_map.dtype == np.float32
+    assert np.array_equal(warp_map[:, 0], times)
+
+    points = result["warp_points"]
+    assert len(points) == 200
+    assert points[3] == (float(times[3]), float(times[3]))
+    assert points == [tuple(p) for p in warp_map.tolist()]
+    assert (result["confidence_per_frame"] > 0.99).all()
+
+
+def test_online_aligner_tracks_warped_take():
+    from core.alignment.dtw_aligner import align
+    from core.alignment.online_aligner import OnlineAligner
+
+    rng = np.random.default_rng(1)
+    times = np.arange(2000, dtype=np.float32) * 0.01
+    ref_f0 = np.repeat(220.0 * 2 ** (rng.integers(0, 12, size=40) / 12), 50).astype(np.float32)
+    new_times = times[:1800]
+    warp = new_times * 1.05 + 0.2 * np.sin(new_times / 3)   # new 時刻 → ref 時刻
+    new_f0 = np.interp(warp, times, ref_f0).astype(np.float32)
+    ref_onsets = np.arange(0.0, 20.0, 0.5)
+
+    aligner = OnlineAligner(ref_f0, times, ref_onsets, lag=20)
+    points = [aligner.push(new_f0[s:s + 64], new_times[s:s + 64]) for s in range(0, 1800, 64)]
+    points.append(aligner.flush())
+    points = np.concatenate(points)
+
+    assert points.shape == (1800, 2)
+    assert np.all(np.diff(points[:, 1]) >= 0)
+    assert np.abs(points[:, 1] - warp).mean() < 0.3
+
+    result = align(ref_f0=ref_f0, ref_times=times, ref_onsets=ref_onsets,
+                   new_f0=new_f0, new_times=new_times, new_onsets=np.array([]), mode="online")
+    assert result["warp_map"].shape == (1800, 2)
+    assert result["confidence_per_frame"].shape == (1800,)